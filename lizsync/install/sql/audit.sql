@@ -79,7 +79,7 @@ COMMENT ON COLUMN audit.logged_actions.action IS 'Action type; I = insert, D = d
 COMMENT ON COLUMN audit.logged_actions.row_data IS 'Record value. Null for statement-level trigger. For INSERT this is the new tuple. For DELETE and UPDATE it is the old tuple.';
 COMMENT ON COLUMN audit.logged_actions.changed_fields IS 'New values of fields changed by UPDATE. Null except for row-level UPDATE events.';
 COMMENT ON COLUMN audit.logged_actions.statement_only IS '''t'' if audit event is from an FOR EACH STATEMENT trigger, ''f'' for FOR EACH ROW';
-COMMENT ON COLUMN audit.logged_actions.sync_data IS 'Data used by the sync tool. origin = db name of the change, replayed_by = list of db name where the audit item has already been replayed, sync_id=id of the synchronization item';
+COMMENT ON COLUMN audit.logged_actions.sync_data IS 'Data used by the sync tool. origin = db name of the change, replayed_by = list of db name where the audit item has already been replayed, sync_id=id of the synchronization item, action_tstamp_tx = original timestamp of the action replayed from a clone';
 
 CREATE INDEX logged_actions_relid_idx ON audit.logged_actions(relid);
 CREATE INDEX logged_actions_action_tstamp_tx_stm_idx ON audit.logged_actions(action_tstamp_stm);
@@ -103,6 +103,10 @@ DECLARE
     h_old hstore;
     h_new hstore;
     excluded_cols text[] = ARRAY[]::text[];
+    compact_cols text[];
+    coalesce_cols text[];
+    previous_event_id bigint;
+    previous_log audit.logged_actions;
 BEGIN
     --RAISE WARNING '[audit.if_modified_func] start with TG_ARGV[0]: % ; TG_ARGV[1] : %, TG_OP: %, TG_LEVEL : %, TG_WHEN: % ', TG_ARGV[0], TG_ARGV[1], TG_OP, TG_LEVEL, TG_WHEN;
 
@@ -143,6 +147,14 @@ BEGIN
         )
     );
 
+    -- Original timestamp of the replayed action, set by lizsync.apply_clone_logs
+    IF NULLIF(current_setting('lizsync.action_tstamp_tx', true), '') IS NOT NULL THEN
+        audit_row.sync_data = audit_row.sync_data || jsonb_build_object(
+            'action_tstamp_tx',
+            current_setting('lizsync.action_tstamp_tx', true)
+        );
+    END IF;
+
     IF NOT TG_ARGV[0]::boolean IS DISTINCT FROM 'f'::boolean THEN
         audit_row.client_query = NULL;
         RAISE WARNING '[audit.if_modified_func] - Trigger func triggered with no client_query tracking';
@@ -151,7 +163,42 @@ BEGIN
 
     IF TG_ARGV[1] IS NOT NULL THEN
         excluded_cols = TG_ARGV[1]::text[];
-        RAISE WARNING '[audit.if_modified_func] - Trigger func triggered with excluded_cols: %',TG_ARGV[1];
+    END IF;
+
+    IF NULLIF(TG_ARGV[2], '') IS NOT NULL THEN
+        compact_cols = TG_ARGV[2]::text[];
+    END IF;
+
+    IF TG_ARGV[3] IS NOT NULL THEN
+        coalesce_cols = TG_ARGV[3]::text[];
+    END IF;
+
+    -- Find the log of the same row made previously in this transaction.
+    -- The last INSERT or UPDATE log of each row is kept in a temporary table
+    -- dropped at the end of the transaction, indexed by the identifiers of the row,
+    -- so that each change only reads one log
+    IF coalesce_cols IS NOT NULL AND TG_LEVEL = 'ROW' THEN
+        IF to_regclass('pg_temp.audit_coalesced_logs') IS NULL THEN
+            CREATE TEMPORARY TABLE audit_coalesced_logs (
+                relid oid NOT NULL,
+                sync_data text NOT NULL,
+                row_key text NOT NULL,
+                event_id bigint NOT NULL,
+                PRIMARY KEY (relid, sync_data, row_key)
+            ) ON COMMIT DROP;
+        ELSIF TG_OP IN ('UPDATE', 'DELETE') THEN
+            SELECT c.event_id INTO previous_event_id
+            FROM pg_temp.audit_coalesced_logs AS c
+            WHERE c.relid = TG_RELID
+            AND c.sync_data = audit_row.sync_data::text
+            AND c.row_key = slice(hstore(OLD.*), coalesce_cols)::text;
+
+            IF previous_event_id IS NOT NULL THEN
+                SELECT la.* INTO previous_log
+                FROM audit.logged_actions AS la
+                WHERE la.event_id = previous_event_id;
+            END IF;
+        END IF;
     END IF;
 
     IF (TG_OP = 'UPDATE' AND TG_LEVEL = 'ROW') THEN
@@ -165,17 +212,81 @@ BEGIN
             RAISE WARNING '[audit.if_modified_func] - Trigger detected NULL hstore. ending';
             RETURN NULL;
         END IF;
-  INSERT INTO audit.logged_actions VALUES (audit_row.*);
+
+        -- Compact log: only keep the identifier columns of the old row
+        IF compact_cols IS NOT NULL THEN
+            audit_row.row_data = slice(h_old, compact_cols);
+        END IF;
+
+        -- Merge into the previous log of the row
+        IF previous_log.event_id IS NOT NULL THEN
+            UPDATE audit.logged_actions SET
+                row_data = CASE WHEN action = 'I' THEN h_new ELSE row_data END,
+                changed_fields = CASE WHEN action = 'I' THEN NULL ELSE changed_fields || audit_row.changed_fields END,
+                action_tstamp_stm = audit_row.action_tstamp_stm,
+                action_tstamp_clk = audit_row.action_tstamp_clk
+            WHERE event_id = previous_log.event_id;
+        ELSE
+            INSERT INTO audit.logged_actions VALUES (audit_row.*);
+        END IF;
+
+        -- The log of the row is found with its new identifiers
+        IF coalesce_cols IS NOT NULL THEN
+            DELETE FROM pg_temp.audit_coalesced_logs AS c
+            WHERE c.relid = TG_RELID
+            AND c.sync_data = audit_row.sync_data::text
+            AND c.row_key = slice(hstore(OLD.*), coalesce_cols)::text;
+            INSERT INTO pg_temp.audit_coalesced_logs (relid, sync_data, row_key, event_id)
+            VALUES (
+                TG_RELID, audit_row.sync_data::text, slice(hstore(NEW.*), coalesce_cols)::text,
+                Coalesce(previous_log.event_id, audit_row.event_id)
+            )
+            ON CONFLICT (relid, sync_data, row_key)
+            DO UPDATE SET event_id = EXCLUDED.event_id;
+        END IF;
   RETURN NEW;
 
     ELSIF (TG_OP = 'DELETE' AND TG_LEVEL = 'ROW') THEN
         audit_row.row_data = hstore(OLD.*) - excluded_cols;
+        IF compact_cols IS NOT NULL THEN
+            audit_row.row_data = slice(audit_row.row_data, compact_cols);
+        END IF;
+
+        -- A row inserted in this transaction is not logged anymore.
+        -- A row updated in this transaction is logged as deleted,
+        -- with its values before the transaction
+        IF previous_log.event_id IS NOT NULL THEN
+            DELETE FROM pg_temp.audit_coalesced_logs AS c
+            WHERE c.relid = TG_RELID
+            AND c.sync_data = audit_row.sync_data::text
+            AND c.row_key = slice(hstore(OLD.*), coalesce_cols)::text;
+        END IF;
+        IF previous_log.event_id IS NOT NULL AND previous_log.action = 'I' THEN
+            DELETE FROM audit.logged_actions
+            WHERE event_id = previous_log.event_id;
+            RETURN OLD;
+        ELSIF previous_log.event_id IS NOT NULL THEN
+            UPDATE audit.logged_actions SET
+                action = 'D',
+                row_data = row_data || slice(audit_row.row_data, coalesce_cols),
+                changed_fields = NULL,
+                action_tstamp_stm = audit_row.action_tstamp_stm,
+                action_tstamp_clk = audit_row.action_tstamp_clk
+            WHERE event_id = previous_log.event_id;
+            RETURN OLD;
+        END IF;
   INSERT INTO audit.logged_actions VALUES (audit_row.*);
         RETURN OLD;
 
     ELSIF (TG_OP = 'INSERT' AND TG_LEVEL = 'ROW') THEN
         audit_row.row_data = hstore(NEW.*) - excluded_cols;
   INSERT INTO audit.logged_actions VALUES (audit_row.*);
+        IF coalesce_cols IS NOT NULL THEN
+            INSERT INTO pg_temp.audit_coalesced_logs (relid, sync_data, row_key, event_id)
+            VALUES (TG_RELID, audit_row.sync_data::text, slice(hstore(NEW.*), coalesce_cols)::text, audit_row.event_id)
+            ON CONFLICT (relid, sync_data, row_key)
+            DO UPDATE SET event_id = EXCLUDED.event_id;
+        END IF;
         RETURN NEW;
 
     ELSIF (TG_LEVEL = 'STATEMENT' AND TG_OP IN ('INSERT','UPDATE','DELETE','TRUNCATE')) THEN
@@ -218,6 +329,20 @@ param 1: text[], columns to ignore in updates. Default [].
          that do not exist in the target table. This lets you specify
          a standard set of ignored columns.
 
+param 2: text[], columns kept in the row data of the UPDATE and DELETE
+         logs. Default NULL, to keep the whole row.
+
+         With these columns, the log of an UPDATE only contains the
+         identifiers of the row and the changed fields, and the log of
+         a DELETE only contains the identifiers of the row.
+
+         An empty string can be given to keep the whole row with the
+         next parameter.
+
+param 3: text[], unique identifier columns used to coalesce the changes
+         of the same row made in a transaction into a single log.
+         Default NULL, to log each change.
+
 There is no parameter to disable logging of values. Add this trigger as
 a 'FOR EACH STATEMENT' rather than 'FOR EACH ROW' trigger if you do not
 want to log row values.
@@ -228,27 +353,270 @@ of the audit trigger its self.
 $body$;
 
 
+CREATE OR REPLACE FUNCTION audit.if_modified_transition_func() RETURNS TRIGGER AS $body$
+DECLARE
+    _client_query text;
+    _excluded_cols text[] = ARRAY[]::text[];
+    _uid_cols text[] = ARRAY[]::text[];
+    _compact_cols text[];
+    _sync_data jsonb;
+BEGIN
+    IF NOT (TG_WHEN = 'AFTER' AND TG_LEVEL = 'STATEMENT') THEN
+        RAISE EXCEPTION 'audit.if_modified_transition_func() may only run as an AFTER FOR EACH STATEMENT trigger';
+    END IF;
 
-CREATE OR REPLACE FUNCTION audit.audit_table(target_table regclass, audit_rows boolean, audit_query_text boolean, ignored_cols text[]) RETURNS void AS $body$
+    _client_query = current_query();
+    IF NOT TG_ARGV[0]::boolean IS DISTINCT FROM 'f'::boolean THEN
+        _client_query = NULL;
+    END IF;
+
+    IF TG_ARGV[1] IS NOT NULL THEN
+        _excluded_cols = TG_ARGV[1]::text[];
+    END IF;
+
+    IF TG_ARGV[2] IS NOT NULL THEN
+        _uid_cols = TG_ARGV[2]::text[];
+    END IF;
+
+    IF TG_ARGV[3] IS NOT NULL THEN
+        _compact_cols = TG_ARGV[3]::text[];
+    END IF;
+
+    _sync_data = jsonb_build_object(
+        'origin', current_setting('lizsync.server_from', true),
+        'replayed_by',
+        CASE
+            WHEN current_setting('lizsync.server_to', true) IS NOT NULL
+            AND current_setting('lizsync.sync_id', true) IS NOT NULL
+                THEN jsonb_build_object(
+                    current_setting('lizsync.server_to', true),
+                    current_setting('lizsync.sync_id', true)
+                )
+            ELSE jsonb_build_object()
+        END
+    );
+
+    -- Original timestamp of the replayed action, set by lizsync.apply_clone_logs
+    IF NULLIF(current_setting('lizsync.action_tstamp_tx', true), '') IS NOT NULL THEN
+        _sync_data = _sync_data || jsonb_build_object(
+            'action_tstamp_tx',
+            current_setting('lizsync.action_tstamp_tx', true)
+        );
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO audit.logged_actions (
+            schema_name, table_name, relid, session_user_name,
+            action_tstamp_tx, action_tstamp_stm, action_tstamp_clk, transaction_id,
+            application_name, client_addr, client_port, client_query,
+            action, row_data, changed_fields, statement_only, sync_data
+        )
+        SELECT
+            TG_TABLE_SCHEMA::text, TG_TABLE_NAME::text, TG_RELID, session_user::text,
+            current_timestamp, statement_timestamp(), clock_timestamp(), txid_current(),
+            current_setting('application_name'), inet_client_addr(), inet_client_port(), _client_query,
+            'I', hstore(n.*) - _excluded_cols, NULL, 'f', _sync_data
+        FROM new_rows AS n;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO audit.logged_actions (
+            schema_name, table_name, relid, session_user_name,
+            action_tstamp_tx, action_tstamp_stm, action_tstamp_clk, transaction_id,
+            application_name, client_addr, client_port, client_query,
+            action, row_data, changed_fields, statement_only, sync_data
+        )
+        SELECT
+            TG_TABLE_SCHEMA::text, TG_TABLE_NAME::text, TG_RELID, session_user::text,
+            current_timestamp, statement_timestamp(), clock_timestamp(), txid_current(),
+            current_setting('application_name'), inet_client_addr(), inet_client_port(), _client_query,
+            'D',
+            CASE
+                WHEN _compact_cols IS NULL THEN hstore(o.*) - _excluded_cols
+                ELSE slice(hstore(o.*) - _excluded_cols, _compact_cols)
+            END,
+            NULL, 'f', _sync_data
+        FROM old_rows AS o;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF array_length(_uid_cols, 1) IS NULL THEN
+            RAISE EXCEPTION '[audit.if_modified_transition_func] - No unique identifier column given for %.%', TG_TABLE_SCHEMA, TG_TABLE_NAME;
+        END IF;
+
+        -- The old and new rows are matched with the unique identifier columns.
+        -- A row whose identifier has been modified is logged as a DELETE and an INSERT
+        INSERT INTO audit.logged_actions (
+            schema_name, table_name, relid, session_user_name,
+            action_tstamp_tx, action_tstamp_stm, action_tstamp_clk, transaction_id,
+            application_name, client_addr, client_port, client_query,
+            action, row_data, changed_fields, statement_only, sync_data
+        )
+        SELECT
+            TG_TABLE_SCHEMA::text, TG_TABLE_NAME::text, TG_RELID, session_user::text,
+            current_timestamp, statement_timestamp(), clock_timestamp(), txid_current(),
+            current_setting('application_name'), inet_client_addr(), inet_client_port(), _client_query,
+            CASE
+                WHEN r.h_new IS NULL THEN 'D'
+                WHEN r.h_old IS NULL THEN 'I'
+                ELSE 'U'
+            END,
+            CASE
+                WHEN r.h_old IS NULL THEN r.h_new
+                WHEN _compact_cols IS NULL THEN r.h_old
+                ELSE slice(r.h_old, _compact_cols)
+            END,
+            r.h_new - r.h_old,
+            'f', _sync_data
+        FROM (
+            SELECT o.h - _excluded_cols AS h_old, n.h - _excluded_cols AS h_new
+            FROM (
+                SELECT hstore(t.*) AS h
+                FROM old_rows AS t
+            ) AS o
+            FULL JOIN (
+                SELECT hstore(t.*) AS h
+                FROM new_rows AS t
+            ) AS n
+                ON slice(o.h, _uid_cols)::text = slice(n.h, _uid_cols)::text
+        ) AS r
+        WHERE r.h_old IS NULL OR r.h_new IS NULL
+        -- All changed fields are ignored: skip this update
+        OR r.h_new - r.h_old != hstore('')
+        ORDER BY r.h_new IS NOT NULL;
+
+    ELSE
+        RAISE EXCEPTION '[audit.if_modified_transition_func] - Trigger func added as trigger for unhandled case: %, %',TG_OP, TG_LEVEL;
+    END IF;
+
+    RETURN NULL;
+END;
+$body$
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = pg_catalog, public;
+
+
+COMMENT ON FUNCTION audit.if_modified_transition_func() IS $body$
+Track the row changes made by a statement, using its transition tables.
+All the rows changed by the statement are logged with one INSERT, and the
+logged rows are the same as the ones logged by audit.if_modified_func() on
+row level.
+
+It must be added as an AFTER INSERT, UPDATE or DELETE FOR EACH STATEMENT
+trigger, with the transition tables OLD TABLE AS old_rows and/or
+NEW TABLE AS new_rows. Use audit.audit_table() with the 'statement' mode.
+
+Parameters to trigger in CREATE TRIGGER call:
+
+param 0: boolean, whether to log the query text.
+
+param 1: text[], columns to ignore in updates.
+
+param 2: text[], unique identifier columns, used to match the old and new
+         rows of an UPDATE. A row whose identifier has been modified is
+         logged as a DELETE followed by an INSERT.
+
+param 3: text[], columns kept in the row data of the UPDATE and DELETE
+         logs. Default NULL, to keep the whole row.
+$body$;
+
+
+
+CREATE OR REPLACE FUNCTION audit.audit_table(target_table regclass, audit_rows boolean, audit_query_text boolean, ignored_cols text[], audit_mode text, compact_cols text[], coalesce_logs boolean) RETURNS void AS $body$
 DECLARE
   stm_targets text = 'INSERT OR UPDATE OR DELETE OR TRUNCATE';
   _q_txt text;
   _ignored_cols_snip text = '';
+  _compact_cols_snip text = '';
+  _coalesce_cols_snip text = '';
+  _uid_cols text[];
+  _trigger record;
 BEGIN
 
+    IF audit_mode NOT IN ('row', 'statement') THEN
+        RAISE EXCEPTION 'Unknown audit mode: %. Use row or statement', audit_mode;
+    END IF;
+
+    IF coalesce_logs AND audit_mode != 'row' THEN
+        RAISE EXCEPTION 'The logs can only be coalesced with the row audit mode';
+    END IF;
+
+    SELECT array_agg(a.attname::text) INTO _uid_cols
+      from pg_index i
+      join pg_attribute a on a.attrelid = i.indrelid
+                         and a.attnum = any(i.indkey)
+     where i.indrelid = target_table::regclass
+       and i.indisprimary;
+
+    -- The primary key is always kept in the compact logs
+    IF compact_cols IS NOT NULL THEN
+        SELECT array_agg(DISTINCT c) INTO compact_cols
+        FROM unnest(Coalesce(_uid_cols, ARRAY[]::text[]) || compact_cols) AS c;
+        _compact_cols_snip = ', ' || quote_literal(compact_cols);
+
+        -- The attribute filters of the clones are evaluated on the whole rows of the logs
+        IF to_regclass('lizsync.subscription_filters') IS NOT NULL AND EXISTS (
+            SELECT 1
+            FROM lizsync.subscription_filters AS f
+            WHERE to_regclass(format('%I.%I', f.table_schema, f.table_name)) = target_table
+            AND nullif(trim(f.attribute_filter), '') IS NOT NULL
+        ) THEN
+            RAISE EXCEPTION 'The logs of the table % cannot be compact: it has attribute filters in lizsync.subscription_filters', target_table::TEXT;
+        END IF;
+    END IF;
+
+    -- The logs of the same row are found with the primary key
+    IF coalesce_logs THEN
+        IF _uid_cols IS NULL THEN
+            RAISE EXCEPTION 'The coalescing of the logs needs a primary key on the table %', target_table::TEXT;
+        END IF;
+        _coalesce_cols_snip = ', ' || quote_literal(_uid_cols);
+        IF compact_cols IS NULL THEN
+            _compact_cols_snip = ', ' || quote_literal('');
+        END IF;
+    END IF;
+
     EXECUTE 'DROP TRIGGER IF EXISTS audit_trigger_row ON ' || target_table::TEXT;
     EXECUTE 'DROP TRIGGER IF EXISTS audit_trigger_stm ON ' || target_table::TEXT;
+    EXECUTE 'DROP TRIGGER IF EXISTS audit_trigger_ins ON ' || target_table::TEXT;
+    EXECUTE 'DROP TRIGGER IF EXISTS audit_trigger_upd ON ' || target_table::TEXT;
+    EXECUTE 'DROP TRIGGER IF EXISTS audit_trigger_del ON ' || target_table::TEXT;
+
 
+    IF audit_rows AND audit_mode = 'statement' THEN
+        -- The primary key is used to match the old and new rows of an UPDATE
+        IF _uid_cols IS NULL THEN
+            RAISE EXCEPTION 'The statement audit mode needs a primary key on the table %', target_table::TEXT;
+        END IF;
 
-    IF audit_rows THEN
-        IF array_length(ignored_cols,1) > 0 THEN
-            _ignored_cols_snip = ', ' || quote_literal(ignored_cols);
+        -- A trigger with transition tables can only have one event
+        FOR _trigger IN
+            SELECT *
+            FROM (VALUES
+                ('audit_trigger_ins', 'INSERT', 'NEW TABLE AS new_rows'),
+                ('audit_trigger_upd', 'UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                ('audit_trigger_del', 'DELETE', 'OLD TABLE AS old_rows')
+            ) AS t(trigger_name, trigger_event, transition_tables)
+        LOOP
+            _q_txt = 'CREATE TRIGGER ' || _trigger.trigger_name || ' AFTER ' || _trigger.trigger_event || ' ON ' ||
+                     target_table::TEXT ||
+                     ' REFERENCING ' || _trigger.transition_tables ||
+                     ' FOR EACH STATEMENT EXECUTE PROCEDURE audit.if_modified_transition_func(' ||
+                     quote_literal(audit_query_text) || ', ' ||
+                     quote_literal(Coalesce(ignored_cols, ARRAY[]::text[])) || ', ' ||
+                     quote_literal(_uid_cols) || _compact_cols_snip || ');';
+            RAISE NOTICE '%',_q_txt;
+            EXECUTE _q_txt;
+        END LOOP;
+        stm_targets = 'TRUNCATE';
+    ELSIF audit_rows THEN
+        IF array_length(ignored_cols,1) > 0 OR _compact_cols_snip != '' THEN
+            _ignored_cols_snip = ', ' || quote_literal(Coalesce(ignored_cols, ARRAY[]::text[]));
         END IF;
         _q_txt = 'CREATE TRIGGER audit_trigger_row AFTER INSERT OR UPDATE OR DELETE ON ' ||
                  target_table::TEXT ||
 
                  ' FOR EACH ROW EXECUTE PROCEDURE audit.if_modified_func(' ||
-                 quote_literal(audit_query_text) || _ignored_cols_snip || ');';
+                 quote_literal(audit_query_text) || _ignored_cols_snip || _compact_cols_snip || _coalesce_cols_snip || ');';
         RAISE NOTICE '%',_q_txt;
         EXECUTE _q_txt;
         stm_targets = 'TRUNCATE';
@@ -277,9 +645,69 @@ END;
 $body$
 language 'plpgsql';
 
-COMMENT ON FUNCTION audit.audit_table(regclass, boolean, boolean, text[]) IS $body$
+COMMENT ON FUNCTION audit.audit_table(regclass, boolean, boolean, text[], text, text[], boolean) IS $body$
 Add auditing support to a table.
 
+Arguments:
+   target_table:     Table name, schema qualified if not on search_path
+   audit_rows:       Record each row change, or only audit at a statement level
+   audit_query_text: Record the text of the client query that triggered the audit event?
+   ignored_cols:     Columns to exclude from update diffs, ignore updates that change only ignored cols.
+   audit_mode:       How the row changes are recorded: 'row' with one trigger call per row,
+                     or 'statement' with one trigger call per statement using its
+                     transition tables, which is faster for statements changing many rows.
+                     The 'statement' mode needs a primary key.
+   compact_cols:     Columns kept with the primary key in the row data of the UPDATE and DELETE
+                     logs, for example the uid column used by the synchronization. The other
+                     old values are not logged, which reduces the size of the logs, but these
+                     UPDATE and DELETE cannot be rolled back with audit.rollback_event,
+                     and the table cannot have attribute filters in lizsync.subscription_filters.
+                     NULL to log the whole old row.
+   coalesce_logs:    Coalesce the changes of the same row made in a transaction into a single
+                     log: the UPDATE are merged into the previous INSERT or UPDATE, and a DELETE
+                     removes the log of a previous INSERT or replaces the log of a previous UPDATE.
+                     Only available with the 'row' mode, and needs a primary key.
+$body$;
+
+CREATE OR REPLACE FUNCTION audit.audit_table(target_table regclass, audit_rows boolean, audit_query_text boolean, ignored_cols text[], audit_mode text, compact_cols text[]) RETURNS void AS $body$
+SELECT audit.audit_table($1, $2, $3, $4, $5, $6, False);
+$body$ LANGUAGE SQL;
+
+COMMENT ON FUNCTION audit.audit_table(regclass, boolean, boolean, text[], text, text[]) IS $body$
+Add auditing support to a table, with one log for each change of a row.
+
+Arguments:
+   target_table:     Table name, schema qualified if not on search_path
+   audit_rows:       Record each row change, or only audit at a statement level
+   audit_query_text: Record the text of the client query that triggered the audit event?
+   ignored_cols:     Columns to exclude from update diffs, ignore updates that change only ignored cols.
+   audit_mode:       How the row changes are recorded: 'row' or 'statement'.
+   compact_cols:     Columns kept with the primary key in the row data of the UPDATE and DELETE
+                     logs, or NULL to log the whole old row.
+$body$;
+
+CREATE OR REPLACE FUNCTION audit.audit_table(target_table regclass, audit_rows boolean, audit_query_text boolean, ignored_cols text[], audit_mode text) RETURNS void AS $body$
+SELECT audit.audit_table($1, $2, $3, $4, $5, NULL);
+$body$ LANGUAGE SQL;
+
+COMMENT ON FUNCTION audit.audit_table(regclass, boolean, boolean, text[], text) IS $body$
+Add auditing support to a table, logging the whole old row of the UPDATE and DELETE.
+
+Arguments:
+   target_table:     Table name, schema qualified if not on search_path
+   audit_rows:       Record each row change, or only audit at a statement level
+   audit_query_text: Record the text of the client query that triggered the audit event?
+   ignored_cols:     Columns to exclude from update diffs, ignore updates that change only ignored cols.
+   audit_mode:       How the row changes are recorded: 'row' or 'statement'.
+$body$;
+
+CREATE OR REPLACE FUNCTION audit.audit_table(target_table regclass, audit_rows boolean, audit_query_text boolean, ignored_cols text[]) RETURNS void AS $body$
+SELECT audit.audit_table($1, $2, $3, $4, 'row');
+$body$ LANGUAGE SQL;
+
+COMMENT ON FUNCTION audit.audit_table(regclass, boolean, boolean, text[]) IS $body$
+Add auditing support to a table, with one trigger call per changed row.
+
 Arguments:
    target_table:     Table name, schema qualified if not on search_path
    audit_rows:       Record each row change, or only audit at a statement level
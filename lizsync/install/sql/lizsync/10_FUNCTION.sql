@@ -54,8 +54,6 @@ DECLARE
     p_min_event_id bigint;
     p_max_event_id bigint;
     p_max_action_tstamp_tx timestamp with time zone;
-    central_ids_to_keep integer[];
-    clone_ids_to_keep integer[];
 BEGIN
 
     -- Store all central ids before the analyse and removal of rejected logs
@@ -78,48 +76,19 @@ BEGIN
         ;
     END IF;
 
-    -- Get the list of ids to keep from each log
-    -- We use DISTINCT ON to remove consecutive UPDATE on the same ident, uid and field for each source.
-    -- Last is kept
+    -- Reduce the logs of each object to their net effect
+    -- INSERT + UPDATE => INSERT, INSERT + DELETE => nothing,
+    -- UPDATE + DELETE => DELETE, and consecutive UPDATE of the same field => last UPDATE
     -- central
     IF central_count > 0 THEN
-        WITH
-        ce AS (
-            SELECT
-            DISTINCT ON (ident, action_type, updated_field, uid)
-            tid
-            FROM temp_central_audit
-            ORDER BY ident, action_type, updated_field, uid, event_id DESC
-        )
-        SELECT array_agg(tid)
-        FROM ce
-        INTO central_ids_to_keep
-        ;
+        PERFORM lizsync.compact_audit_logs('temp_central_audit', 'uid');
     END IF;
     -- clone
-    WITH
-    cl AS (
-        SELECT
-        DISTINCT ON (ident, action_type, updated_field, uid)
-        tid
-        FROM temp_clone_audit
-        ORDER BY ident, action_type, updated_field, uid, event_id DESC
-    )
-    SELECT array_agg(tid)
-    FROM cl
-    INTO clone_ids_to_keep
-    ;
+    PERFORM lizsync.compact_audit_logs('temp_clone_audit', 'uid');
 
-    -- DELETE removed lines from temp audit tables
-    IF central_count > 0 THEN
-        DELETE FROM temp_central_audit
-        WHERE tid != ALL (central_ids_to_keep)
-        ;
-    END IF;
-
-    DELETE FROM temp_clone_audit
-    WHERE tid != ALL (clone_ids_to_keep)
-    ;
+    -- Update the statistics of the compacted logs for the conflicts analysis
+    ANALYZE temp_central_audit;
+    ANALYZE temp_clone_audit;
 
     -- Compare logs
     -- And get conflicts
@@ -156,24 +125,50 @@ BEGIN
     ORDER BY ce.event_id
     ;
 
+    -- Remove the rejected fields from the clone audit log
+    -- so that a later synchronization does not send them to the central server.
+    -- This is needed when the central logs are replayed in several chunks
+    WITH rejected AS (
+        SELECT a.event_id, array_agg(DISTINCT cl.updated_field) AS fields
+        FROM temp_conflicts AS c
+        INNER JOIN temp_clone_audit AS cl
+            ON cl.tid = c.clone_tid
+        INNER JOIN audit.logged_actions AS a
+            ON concat(a.schema_name, '.', a.table_name) = cl.ident
+            AND (a.row_data->'uid')::uuid = cl.uid
+            AND a.action = 'U'
+            AND a.event_id <= cl.event_id
+        WHERE c.rejected = 'clone'
+        GROUP BY a.event_id
+    )
+    UPDATE audit.logged_actions AS a
+    SET changed_fields = a.changed_fields - r.fields
+    FROM rejected AS r
+    WHERE a.event_id = r.event_id
+    ;
+    DELETE FROM audit.logged_actions
+    WHERE action = 'U'
+    AND changed_fields = ''::public.hstore
+    ;
+
     -- DELETE rejected tid from audit temp tables
     -- central
-    DELETE FROM temp_central_audit
-    WHERE tid IN (
-        SELECT central_tid
-        FROM temp_conflicts
-        WHERE rejected = 'central'
-    )
+    DELETE FROM temp_central_audit AS t
+    USING temp_conflicts AS c
+    WHERE c.rejected = 'central'
+    AND t.tid = c.central_tid
     ;
     -- clone
-    DELETE FROM temp_clone_audit
-    WHERE tid IN (
-        SELECT clone_tid
-        FROM temp_conflicts
-        WHERE rejected = 'clone'
-    )
+    DELETE FROM temp_clone_audit AS t
+    USING temp_conflicts AS c
+    WHERE c.rejected = 'clone'
+    AND t.tid = c.clone_tid
     ;
 
+    -- Merge the remaining UPDATE of each object into one UPDATE
+    PERFORM lizsync.merge_update_logs('temp_central_audit', 'uid');
+    PERFORM lizsync.merge_update_logs('temp_clone_audit', 'uid');
+
     -- Return data
     RETURN QUERY
     SELECT p_ids, p_min_event_id, p_max_event_id, p_max_action_tstamp_tx;
@@ -182,228 +177,358 @@ $$;
 
 
 -- FUNCTION analyse_audit_logs()
-COMMENT ON FUNCTION lizsync.analyse_audit_logs() IS 'Get audit logs from the central database and the clone since the last synchronization. Compare the logs to find and resolved UPDATE conflicts (same table, feature, column): last modified object wins. This function store the resolved conflicts into the table lizsync.conflicts in the central database. Returns central server event ids, minimum event id, maximum event id, maximum action timestamp.';
+COMMENT ON FUNCTION lizsync.analyse_audit_logs() IS 'Get audit logs from the central database and the clone since the last synchronization. Reduce the logs of each object to their net effect, then compare the logs to find and resolved UPDATE conflicts (same table, feature, column): last modified object wins. The remaining UPDATE of each object are then merged. This function store the resolved conflicts into the table lizsync.conflicts in the central database. Returns central server event ids, minimum event id, maximum event id, maximum action timestamp.';
 
 
--- compare_tables(text, text)
-CREATE FUNCTION lizsync.compare_tables(p_schema_name text, p_table_name text) RETURNS TABLE(uid uuid, status text, clone_table_values public.hstore, central_table_values public.hstore)
+-- apply_audit_logs(text, text)
+CREATE FUNCTION lizsync.apply_audit_logs(p_temporary_table text, p_uid_field text) RETURNS integer
     LANGUAGE plpgsql
     AS $_$
 DECLARE
-    pkeys text[];
     sqltemplate text;
+    p_table text;
+    p_columns text;
+    p_values text;
+    p_counter integer;
+    rec record;
 BEGIN
-
-    -- Get array of primary key field(s)
-    SELECT array_agg(uid_column) as pkey_fields
-    INTO pkeys
-    FROM audit.logged_relations r
-    WHERE relation_name = (quote_ident(p_schema_name) || '.' || quote_ident(p_table_name))
-    ;
-
-    -- Compare data
+    -- Group the consecutive logs of each table with the same action and modified columns
+    -- The tables are processed in the order of their first log,
+    -- and the groups of each table in the order of the logs,
+    -- so that the unique constraints, which are still checked in replica mode,
+    -- see the same successive values as in the original database
+    -- An object can only have a DELETE followed by an INSERT after lizsync.compact_audit_logs
     sqltemplate = '
-    SELECT
-        coalesce(t1.uid, t2.uid) AS uid,
-        CASE
-            WHEN t1.uid IS NULL THEN ''not in table 1''
-            WHEN t2.uid IS NULL THEN ''not in table 2''
-            ELSE ''table 1 != table 2''
-        END AS status,
-        (hstore(t1.*) - ''%1$s''::text[]) - (hstore(t2) - ''%1$s''::text[]) AS values_in_table_1,
-        (hstore(t2.*) - ''%1$s''::text[]) - (hstore(t1) - ''%1$s''::text[]) AS values_in_table_2
-    FROM "%2$s"."%3$s" AS t1
-    FULL JOIN "central_%2$s"."%3$s" AS t2
-        ON t1.uid = t2.uid
-    WHERE
-        ((hstore(t1.*) - ''%1$s''::text[]) != (hstore(t2.*) - ''%1$s''::text[]))
-        OR (t1.uid IS NULL)
-        OR (t2.uid IS NULL)
+    WITH
+    logs AS (
+        SELECT
+            tid, ident, action_type,
+            CASE WHEN action_type = ''D'' THEN NULL ELSE akeys(action_data) END AS columns
+        FROM %1$I
+        WHERE action_type = ''D'' OR action_data IS NOT NULL
+    ),
+    runs AS (
+        SELECT
+            l.*,
+            row_number() OVER (PARTITION BY l.ident ORDER BY l.tid)
+            - row_number() OVER (PARTITION BY l.ident, l.action_type, l.columns ORDER BY l.tid) AS run
+        FROM logs AS l
+    ),
+    groups AS (
+        SELECT
+            ident, action_type, columns,
+            array_agg(tid ORDER BY tid) AS tids
+        FROM runs
+        GROUP BY ident, action_type, columns, run
+    ),
+    tables AS (
+        SELECT ident, min(tid) AS first_tid
+        FROM %1$I
+        GROUP BY ident
+    )
+    SELECT g.*
+    FROM groups AS g
+    INNER JOIN tables AS t
+        ON t.ident = g.ident
+    ORDER BY t.first_tid, g.tids[1]
     ';
 
-    RETURN QUERY
-    EXECUTE format(sqltemplate,
-        pkeys,
-        p_schema_name,
-        p_table_name
-    );
+    p_counter = 0;
+    FOR rec IN
+        EXECUTE format(sqltemplate, p_temporary_table)
+    LOOP
+        p_table = format(
+            '%1$I.%2$I',
+            split_part(rec.ident, '.', 1),
+            substr(rec.ident, strpos(rec.ident, '.') + 1)
+        );
+
+        -- The values are read with their column type from the action_data hstore
+        IF rec.action_type = 'D' THEN
+            EXECUTE format('
+                DELETE FROM %1$s AS x
+                USING unnest($1) AS u(tid)
+                INNER JOIN %2$I AS t
+                    ON t.tid = u.tid
+                WHERE x.%3$I = t.uid
+                ',
+                p_table, p_temporary_table, p_uid_field
+            )
+            USING rec.tids;
+
+        ELSIF rec.action_type = 'I' THEN
+            SELECT
+                string_agg(quote_ident(c), ', '),
+                string_agg('r.' || quote_ident(c), ', ')
+            FROM unnest(rec.columns) AS c
+            INTO p_columns, p_values;
+
+            -- Objects already inserted by an interrupted synchronization are skipped
+            -- so that the same logs can be replayed again
+            EXECUTE format('
+                INSERT INTO %1$s (%3$s)
+                SELECT %4$s
+                FROM unnest($1) AS u(tid)
+                INNER JOIN %2$I AS t
+                    ON t.tid = u.tid,
+                populate_record(NULL::%1$s, t.action_data) AS r
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM %1$s AS x
+                    WHERE x.%5$I = t.uid
+                )
+                ORDER BY t.tid
+                ',
+                p_table, p_temporary_table, p_columns, p_values, p_uid_field
+            )
+            USING rec.tids;
+
+        ELSIF rec.action_type = 'U' THEN
+            SELECT string_agg(format('%1$I = r.%1$I', c), ', ')
+            FROM unnest(rec.columns) AS c
+            INTO p_values;
+
+            EXECUTE format('
+                UPDATE %1$s AS x
+                SET %4$s
+                FROM unnest($1) AS u(tid)
+                INNER JOIN %2$I AS t
+                    ON t.tid = u.tid,
+                populate_record(NULL::%1$s, t.action_data) AS r
+                WHERE x.%3$I = t.uid
+                ',
+                p_table, p_temporary_table, p_uid_field, p_values
+            )
+            USING rec.tids;
+        END IF;
 
+        p_counter = p_counter + array_length(rec.tids, 1);
+    END LOOP;
+
+    RETURN p_counter;
 END;
 $_$;
 
 
--- create_central_server_fdw(text, smallint, text, text, text)
-CREATE FUNCTION lizsync.create_central_server_fdw(p_central_host text, p_central_port smallint, p_central_database text, p_central_username text, p_central_password text) RETURNS boolean
+-- FUNCTION apply_audit_logs(p_temporary_table text, p_uid_field text)
+COMMENT ON FUNCTION lizsync.apply_audit_logs(p_temporary_table text, p_uid_field text) IS 'Apply the logs stored in a temporary audit table with one query per table and group of consecutive logs with the same action and modified columns, in the order of the logs of each table. The values are read from the action_data column with the type of the target columns. Parameters: temporary table name and uid column name. It returns the number of applied logs.';
+
+
+-- apply_clone_logs(text, jsonb, bigint)
+CREATE FUNCTION lizsync.apply_clone_logs(p_clone_id text, p_logs jsonb, p_max_event_id bigint) RETURNS TABLE(sync_id uuid, replay_count integer)
     LANGUAGE plpgsql
-    AS $_$
+    AS $$
 DECLARE
-    sqltemplate text;
+    p_central_id text;
+    p_sync_id uuid;
+    p_counter integer;
+    p_last_clone_event_id bigint;
+    rec record;
 BEGIN
-    -- Create extension
-    CREATE EXTENSION IF NOT EXISTS postgres_fdw;
+    -- Get the last clone event id already replayed
+    -- The lock prevents two synchronizations of the same clone from running together
+    SELECT c.last_clone_event_id INTO p_last_clone_event_id
+    FROM lizsync.clone_cursors AS c
+    WHERE c.clone_id = p_clone_id::uuid
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'No cursor found in lizsync.clone_cursors for the clone %', p_clone_id;
+    END IF;
 
-    -- Create server
-    DROP SERVER IF EXISTS central_server CASCADE;
-    sqltemplate = '
-    CREATE SERVER central_server
-    FOREIGN DATA WRAPPER postgres_fdw
-    OPTIONS (
-        host ''%1$s'',
-        port ''%2$s'',
-        dbname ''%3$s'',
-        connect_timeout ''5''
-    );
-    ';
-    EXECUTE format(sqltemplate,
-        p_central_host,
-        p_central_port,
-        p_central_database
-    );
+    -- Do nothing if the logs have already been replayed
+    -- This happens when the clone has not received the answer of a previous call
+    IF p_last_clone_event_id >= p_max_event_id THEN
+        RAISE NOTICE 'Clone logs up to event % have already been replayed', p_max_event_id;
+        RETURN QUERY
+        SELECT NULL::uuid, 0;
+        RETURN;
+    END IF;
 
-    -- User mapping
-    sqltemplate = '
-    CREATE USER MAPPING FOR CURRENT_USER
-    SERVER central_server
-    OPTIONS (
-        user ''%1$s'',
-        password ''%2$s''
+    -- Get central server id
+    SELECT server_id::text INTO p_central_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+
+    -- New synchronization id
+    p_sync_id = md5(random()::text || clock_timestamp()::text)::uuid;
+
+    -- The settings are used by the audit trigger function
+    -- to fill the sync_data field. They are local to the transaction
+    PERFORM set_config('lizsync.server_from', p_clone_id, true);
+    PERFORM set_config('lizsync.server_to', p_central_id, true);
+    PERFORM set_config('lizsync.sync_id', p_sync_id::text, true);
+
+    -- Replay the clone actions in their original order
+    -- Before each action, set the original clone timestamp so that
+    -- the audit trigger stores it for the events created by this action
+    p_counter = 0;
+    FOR rec IN
+        SELECT l.value->>'action' AS action, l.value->>'action_tstamp_tx' AS action_tstamp_tx
+        FROM jsonb_array_elements(p_logs) WITH ORDINALITY AS l(value, ordinality)
+        ORDER BY l.ordinality
+    LOOP
+        PERFORM set_config('lizsync.action_tstamp_tx', rec.action_tstamp_tx, true);
+        EXECUTE trim(rec.action);
+        p_counter = p_counter + 1;
+    END LOOP;
+    PERFORM set_config('lizsync.action_tstamp_tx', '', true);
+
+    -- Add a new item in the history table
+    INSERT INTO lizsync.history (
+        sync_id, sync_time,
+        server_from, server_to,
+        min_event_id, max_event_id, max_action_tstamp_tx,
+        sync_type, sync_status
     )
-    ';
-    EXECUTE format(sqltemplate,
-        p_central_username,
-        p_central_password
+    VALUES (
+        p_sync_id, now(),
+        p_clone_id, ARRAY[p_central_id],
+        NULL, NULL, NULL,
+        'partial', 'done'
     );
 
-    -- Create local schemas
-    CREATE SCHEMA IF NOT EXISTS central_audit;
-    CREATE SCHEMA IF NOT EXISTS central_lizsync;
+    -- Store the last replayed clone event id in the same transaction
+    UPDATE lizsync.clone_cursors
+    SET last_clone_event_id = p_max_event_id
+    WHERE clone_id = p_clone_id::uuid
+    ;
 
-    -- Import foreign tables
-    -- audit
-    IMPORT FOREIGN SCHEMA audit
-    FROM SERVER central_server
-    INTO central_audit;
+    RETURN QUERY
+    SELECT p_sync_id, p_counter;
+END;
+$$;
 
-    -- lizsync
-    IMPORT FOREIGN SCHEMA lizsync
-    FROM SERVER central_server
-    INTO central_lizsync;
 
-    -- Manually create modified conflicts table
-    -- with no id column to avoid issues
-    -- https://stackoverflow.com/a/53361066/13220524
-    CREATE FOREIGN TABLE central_lizsync.conflicts_bis(
-        object_table text,
-        object_uid uuid,
-        clone_id uuid,
-        central_event_id bigint,
-        central_event_timestamp timestamp with time zone,
-        central_sql text,
-        clone_sql text,
-        rejected text,
-        rule_applied text
-     )
-    SERVER central_server
-    OPTIONS (
-        schema_name 'lizsync',
-        table_name 'conflicts'
-    );
+-- FUNCTION apply_clone_logs(p_clone_id text, p_logs jsonb, p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.apply_clone_logs(p_clone_id text, p_logs jsonb, p_max_event_id bigint) IS 'Replay in the central database a batch of clone logs, sent as a JSON array of objects with the keys action and action_tstamp_tx, in the array order and in a single transaction. The original clone timestamp of each action is stored by the audit trigger in the sync_data of the created events. A new item is also created in the lizsync.history table, and the maximum clone event id of the batch is stored in the lizsync.clone_cursors table. The batch is ignored if this event id has already been replayed. Parameters: clone server id, logs and maximum clone event id of the logs. It returns the synchronization id and the number of replayed actions.';
 
-    RETURN True;
+
+-- build_event_sql(text, text, text, public.hstore, public.hstore, text[], text, text[])
+CREATE FUNCTION lizsync.build_event_sql(p_action text, p_schema_name text, p_table_name text, p_row_data public.hstore, p_changed_fields public.hstore, p_pkey_fields text[], p_uid_column text, p_excluded_columns text[]) RETURNS text
+    LANGUAGE plpgsql IMMUTABLE
+    AS $$
+BEGIN
+    IF p_excluded_columns IS NULL THEN
+        p_excluded_columns:= '{}'::text[];
+    END IF;
+
+    RETURN
+        CASE
+            WHEN p_action = 'I' THEN
+                'INSERT INTO "' || p_schema_name || '"."' || p_table_name || '"' ||
+                ' (' || (
+                    SELECT string_agg(
+                        '"' || key || '"',
+                        ','
+                    )
+                    FROM each(p_row_data)
+                    WHERE True
+                    AND key != ALL(p_pkey_fields)
+                    AND key != ALL(p_excluded_columns)
+                )
+                || ') VALUES ( ' ||
+                (
+                    SELECT string_agg(
+                        CASE WHEN value IS NULL THEN 'NULL' ELSE quote_literal(value) END,
+                        ','
+                    )
+                    FROM EACH(p_row_data)
+                    WHERE True
+                    AND key != ALL(p_pkey_fields)
+                    AND key != ALL(p_excluded_columns)
+                )
+                || ')'
+
+            WHEN p_action = 'D' THEN
+                'DELETE FROM "' || p_schema_name || '"."' || p_table_name || '"' ||
+                ' WHERE ' || '"' || p_uid_column || '" = ' || quote_literal(p_row_data->p_uid_column)
+
+            WHEN p_action = 'U' THEN
+                'UPDATE "' || p_schema_name || '"."' || p_table_name || '"' ||
+                ' SET ' || (
+                    SELECT string_agg(
+                        '"' || key || '"' || ' = ' ||
+                        CASE
+                            WHEN value IS NULL
+                                THEN 'NULL'
+                            ELSE quote_literal(value)
+                        END,
+                        ','
+                    ) FROM each(p_changed_fields)
+                    WHERE True
+                    AND key != ALL(p_pkey_fields)
+                    AND key != ALL(p_excluded_columns)
+                ) ||
+                ' WHERE ' || '"' || p_uid_column || '" = ' || quote_literal(p_row_data->p_uid_column)
+        END
+    ;
 END;
-$_$;
+$$;
 
 
--- FUNCTION create_central_server_fdw(p_central_host text, p_central_port smallint, p_central_database text, p_central_username text, p_central_password text)
-COMMENT ON FUNCTION lizsync.create_central_server_fdw(p_central_host text, p_central_port smallint, p_central_database text, p_central_username text, p_central_password text) IS 'Create foreign server, needed central_audit and central_lizsync schemas, and import all central database tables as foreign tables. This will allow the clone to connect to the central databse';
+-- FUNCTION build_event_sql(p_action text, p_schema_name text, p_table_name text, p_row_data public.hstore, p_changed_fields public.hstore, p_pkey_fields text[], p_uid_column text, p_excluded_columns text[])
+COMMENT ON FUNCTION lizsync.build_event_sql(p_action text, p_schema_name text, p_table_name text, p_row_data public.hstore, p_changed_fields public.hstore, p_pkey_fields text[], p_uid_column text, p_excluded_columns text[]) IS 'Build the SQL to use for replay from the values of an audit log event, without reading any table. It is used to get the SQL of many logs in one query. Parameters: action (I, U or D), schema name, table name, row data, changed fields, primary key fields, uid column name and excluded columns';
 
 
--- create_temporary_table(text, text)
-CREATE FUNCTION lizsync.create_temporary_table(temporary_table text, table_type text) RETURNS boolean
+-- check_subscription_filter()
+CREATE FUNCTION lizsync.check_subscription_filter() RETURNS trigger
     LANGUAGE plpgsql
     AS $$
-DECLARE
-    sqltemplate text;
 BEGIN
-    -- Drop table if exists
-    EXECUTE 'DROP TABLE IF EXISTS ' || quote_ident(temporary_table);
-    -- Create temporary table
-    IF table_type = 'audit' THEN
-        EXECUTE 'CREATE TEMP TABLE ' || quote_ident(temporary_table) || ' (
-            tid                       serial,
-            event_id                  bigint,
-            action_tstamp_tx          timestamp with time zone,
-            action_tstamp_epoch       integer,
-            ident                     text,
-            action_type               text,
-            origine                   text,
-            action                    text,
-            updated_field             text,
-            uid                       uuid,
-            original_action_tstamp_tx integer
-        )
-        --ON COMMIT DROP
-        ';
-    END IF;
-    IF table_type = 'conflict' THEN
-        EXECUTE 'CREATE TEMP TABLE ' || quote_ident(temporary_table) || ' (
-            tid                     serial                   ,
-            conflict_time           timestamp with time zone ,
-            object_table            text                     ,
-            object_uid              uuid                     ,
-            central_tid             integer                  ,
-            clone_tid               integer                  ,
-            central_event_id        integer                  ,
-            central_event_timestamp timestamp with time zone ,
-            central_sql             text                     ,
-            clone_sql               text                     ,
-            rejected                text                     ,
-            rule_applied            text
-        )
-        --ON COMMIT DROP
-        ';
+    -- The attribute filter is evaluated on the row data of the audit logs
+    IF nullif(trim(NEW.attribute_filter), '') IS NOT NULL
+    AND lizsync.get_audit_compact_columns(
+        to_regclass(format('%I.%I', NEW.table_schema, NEW.table_name))
+    ) IS NOT NULL
+    THEN
+        RAISE EXCEPTION 'The attribute filter of the table %.% cannot be used with its compact audit logs. Audit the table without compact columns first', NEW.table_schema, NEW.table_name;
     END IF;
 
-    RETURN True;
+    RETURN NEW;
 END;
 $$;
 
 
--- FUNCTION create_temporary_table(temporary_table text, table_type text)
-COMMENT ON FUNCTION lizsync.create_temporary_table(temporary_table text, table_type text) IS 'Create temporary table used during database bidirectionnal synchronization. Parameters: temporary table name, and table type (audit or conflit)';
+-- FUNCTION check_subscription_filter()
+COMMENT ON FUNCTION lizsync.check_subscription_filter() IS 'Trigger function refusing the attribute filters of lizsync.subscription_filters on the tables with compact audit logs, which do not contain all the columns of the rows needed to evaluate the filter.';
 
 
--- get_central_audit_logs(text, text[])
-CREATE FUNCTION lizsync.get_central_audit_logs(p_uid_field text, p_excluded_columns text[]) RETURNS TABLE(event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer, ident text, action_type text, origine text, action text, updated_field text, uid uuid, original_action_tstamp_tx integer)
+-- compare_tables(text, text)
+CREATE FUNCTION lizsync.compare_tables(p_schema_name text, p_table_name text) RETURNS TABLE(uid uuid, status text, clone_table_values public.hstore, central_table_values public.hstore)
     LANGUAGE plpgsql
     AS $_$
 DECLARE
-    p_clone_id text;
-    p_excluded_columns_text text;
+    pkeys text[];
     sqltemplate text;
-    sqltext text;
+    prefixes uuid[];
+    p_clone_id text;
+    p_condition text;
+    excluded_columns text[];
     dblink_connection_name text;
     dblink_msg text;
 BEGIN
 
-    IF p_excluded_columns IS NULL THEN
-        p_excluded_columns_text = '';
-    ELSE
-        p_excluded_columns_text = array_to_string(p_excluded_columns, '@');
-    END IF;
+    -- Get array of primary key field(s)
+    SELECT array_agg(uid_column) as pkey_fields
+    INTO pkeys
+    FROM audit.logged_relations r
+    WHERE relation_name = (quote_ident(p_schema_name) || '.' || quote_ident(p_table_name))
+    ;
 
     -- Get clone server id
     SELECT server_id::text INTO p_clone_id
     FROM lizsync.server_metadata
     LIMIT 1;
 
-    IF p_clone_id IS NULL THEN
-        RETURN QUERY
-        SELECT
-            NULL, NULL, NULL, NULL,
-            NULL, NULL, NULL, NULL, NULL, NULL
-        LIMIT 0;
-    END IF;
+    -- The columns not sent to the clone are empty in the clone and not compared,
+    -- as the primary key, which can differ between the databases
+    SELECT pkeys || lizsync.get_excluded_columns(f.table_schema, f.table_name, f.column_names)
+    INTO excluded_columns
+    FROM lizsync.subscription_filters AS f
+    WHERE f.server_id = p_clone_id::uuid
+    AND f.table_schema = p_schema_name
+    AND f.table_name = p_table_name
+    ;
+    excluded_columns = Coalesce(excluded_columns, pkeys);
 
     -- Create dblink connection
     dblink_connection_name = (md5(((random())::text || (clock_timestamp())::text)))::text;
@@ -413,156 +538,1280 @@ BEGIN
     )
     INTO dblink_msg;
 
-    sqltemplate = '
-
-        WITH
-        cid AS (
-            SELECT server_id::text AS p_central_id
-            FROM lizsync.server_metadata
-            LIMIT 1
-        ),
-        last_sync AS (
-            SELECT
-                max_action_tstamp_tx,
-                max_event_id
-            FROM lizsync.history
-            WHERE True
-            AND server_from = (SELECT p_central_id FROM cid)
-            AND ''%1$s'' = ANY (server_to)
-            AND sync_status = ''done''
-            ORDER BY sync_time DESC
-            LIMIT 1
-        ),
-        tables AS (
-            SELECT sync_tables
-            FROM lizsync.synchronized_tables
-            WHERE server_id = ''%1$s''::uuid
-            LIMIT 1
+    -- Only the rows matching the subscription of the clone are compared,
+    -- since the other central rows are not sent to the clone.
+    -- The rows of the area of interest are kept in the central transaction
+    PERFORM dblink_exec(dblink_connection_name, 'BEGIN');
+    SELECT c.condition
+    INTO p_condition
+    FROM dblink(
+        dblink_connection_name,
+        format(
+            'SELECT lizsync.get_subscription_condition(%L::uuid, %L, %L)',
+            p_clone_id, p_schema_name, p_table_name
+        )
+    ) AS c(condition text)
+    ;
+
+    -- The same rows of the area are used in the clone
+    PERFORM lizsync.create_temporary_table('temp_subscription_area', 'area');
+    INSERT INTO temp_subscription_area (ident, uid, from_area)
+    SELECT k.ident, k.uid, k.from_area
+    FROM dblink(
+        dblink_connection_name,
+        format(
+            'SELECT k.ident, k.uid, k.from_area FROM temp_subscription_area AS k WHERE k.ident = %L',
+            quote_ident(p_schema_name) || '.' || quote_ident(p_table_name)
         )
+    ) AS k(ident text, uid uuid, from_area boolean)
+    ;
+
+    SELECT lizsync.get_different_uids(
+        dblink_connection_name, p_schema_name, p_table_name,
+        excluded_columns, p_condition, p_condition
+    )
+    INTO prefixes
+    ;
+
+    -- Disconnect dblink
+    SELECT dblink_disconnect(dblink_connection_name)
+    INTO dblink_msg;
+
+    -- The tables are the same
+    IF prefixes IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Compare the values of the different rows only
+    sqltemplate = '
+    SELECT
+        coalesce(t1.uid, t2.uid) AS uid,
+        CASE
+            WHEN t1.uid IS NULL THEN ''not in table 1''
+            WHEN t2.uid IS NULL THEN ''not in table 2''
+            ELSE ''table 1 != table 2''
+        END AS status,
+        (hstore(t1.r) - ''%1$s''::text[]) - (hstore(t2.r) - ''%1$s''::text[]) AS values_in_table_1,
+        (hstore(t2.r) - ''%1$s''::text[]) - (hstore(t1.r) - ''%1$s''::text[]) AS values_in_table_2
+    FROM (
+        SELECT t.uid, t AS r
+        FROM "%2$s"."%3$s" AS t
+        WHERE t.uid = ANY (%4$L::uuid[])
+        AND (%5$s)
+    ) AS t1
+    FULL JOIN (
+        SELECT t.uid, t AS r
+        FROM "central_%2$s"."%3$s" AS t
+        WHERE t.uid = ANY (%4$L::uuid[])
+        AND (%5$s)
+    ) AS t2
+        ON t1.uid = t2.uid
+    WHERE
+        ((hstore(t1.r) - ''%1$s''::text[]) != (hstore(t2.r) - ''%1$s''::text[]))
+        OR (t1.uid IS NULL)
+        OR (t2.uid IS NULL)
+    ';
+
+    RETURN QUERY
+    EXECUTE format(sqltemplate,
+        excluded_columns,
+        p_schema_name,
+        p_table_name,
+        prefixes,
+        Coalesce(p_condition, 'True')
+    );
+
+END;
+$_$;
+
+
+-- FUNCTION compare_tables(p_schema_name text, p_table_name text)
+COMMENT ON FUNCTION lizsync.compare_tables(p_schema_name text, p_table_name text) IS 'Compare the data of a table in the clone and in the central database. The uid of the different rows are found with lizsync.get_different_uids, which compares the hashes of the blocks of rows computed in each database. The values of the different rows are then read from the central foreign table. Only the rows matching the subscription filters of the clone, and the columns sent to the clone, are compared. Parameters: schema name and table name. It returns the uid, the status, and the different values in the clone and in the central database';
+
+
+-- compact_audit_logs(text, text)
+CREATE FUNCTION lizsync.compact_audit_logs(p_temporary_table text, p_uid_field text) RETURNS integer
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    sqltemplate text;
+    p_count_before integer;
+    p_count_after integer;
+BEGIN
+    -- Temporary tables are not analysed by autovacuum
+    EXECUTE format('ANALYZE %1$I', p_temporary_table);
+    EXECUTE format('SELECT count(*) FROM %1$I', p_temporary_table)
+    INTO p_count_before;
+
+    -- Remove UPDATE logs with nothing to replay
+    -- (only primary keys or excluded columns have been modified)
+    sqltemplate = '
+    DELETE FROM %1$I
+    WHERE action_type = ''U''
+    AND (action_data IS NULL OR action_data = ''''::hstore)
+    ';
+    EXECUTE format(sqltemplate, p_temporary_table);
+
+    -- Remove the logs before the last INSERT or DELETE of each object
+    -- INSERT followed by a DELETE: nothing to replay
+    -- DELETE then INSERT of the same uid: keep the DELETE before the INSERT
+    sqltemplate = '
+    WITH
+    chain AS (
         SELECT
-            a.event_id,
-            a.action_tstamp_tx AS action_tstamp_tx,
-            extract(epoch from a.action_tstamp_tx)::integer AS action_tstamp_epoch,
-            concat(a.schema_name, ''.'', a.table_name) AS ident,
-            a.action AS action_type,
-            CASE
-                WHEN a.sync_data->>''origin'' IS NULL THEN ''central''
-                ELSE ''clone''
-            END AS origine,
-            Coalesce(
-                lizsync.get_event_sql(
-                    a.event_id,
-                    ''%2$s''::text,
-                    array_cat(
-                        string_to_array(''%3$s'',''@''),
-                        array_remove(akeys(a.changed_fields), s)
-                    )
+            ident, uid,
+            (array_agg(action_type ORDER BY tid))[1] AS first_action,
+            max(tid) FILTER (WHERE action_type IN (''I'', ''D'')) AS last_tid,
+            max(tid) FILTER (WHERE action_type = ''D'') AS last_delete_tid
+        FROM %1$I
+        GROUP BY ident, uid
+    ),
+    last_action AS (
+        SELECT c.*, t.action_type AS last_action
+        FROM chain AS c
+        INNER JOIN %1$I AS t
+            ON t.tid = c.last_tid
+    )
+    DELETE FROM %1$I AS t
+    USING last_action AS l
+    WHERE True
+    AND t.ident = l.ident
+    AND t.uid = l.uid
+    AND (
+        (l.last_action = ''D'' AND l.first_action = ''I'')
+        OR (
+            t.tid < l.last_tid
+            AND NOT (
+                l.last_action = ''I''
+                AND l.first_action != ''I''
+                AND t.tid = l.last_delete_tid
+            )
+        )
+    )
+    ';
+    EXECUTE format(sqltemplate, p_temporary_table);
+
+    -- Merge the UPDATE logs following an INSERT into this INSERT
+    -- The last value of each field is kept
+    sqltemplate = '
+    WITH
+    last_updates AS (
+        SELECT DISTINCT ON (u.ident, u.uid, u.updated_field)
+            u.ident, u.uid, u.action_data
+        FROM %1$I AS u
+        INNER JOIN %1$I AS i
+            ON i.ident = u.ident
+            AND i.uid = u.uid
+            AND i.action_type = ''I''
+        WHERE u.action_type = ''U''
+        ORDER BY u.ident, u.uid, u.updated_field, u.tid DESC
+    ),
+    merged AS (
+        SELECT
+            l.ident, l.uid,
+            hstore(array_agg(e.key), array_agg(e.value)) AS action_data
+        FROM last_updates AS l,
+        each(l.action_data) AS e
+        GROUP BY l.ident, l.uid
+    ),
+    inserts AS (
+        UPDATE %1$I AS i
+        SET
+            action_data = i.action_data || m.action_data,
+            action = Coalesce(
+                lizsync.build_event_sql(
+                    ''I'',
+                    split_part(i.ident, ''.'', 1),
+                    substr(i.ident, strpos(i.ident, ''.'') + 1),
+                    i.action_data || m.action_data,
+                    NULL,
+                    ''{}''::text[],
+                    %2$L,
+                    NULL
                 ),
                 ''''
-            ) AS action,
-            s AS updated_field,
-            (a.row_data->''%2$s'')::uuid AS uid,
-            CASE
-                WHEN a.sync_data->>''action_tstamp_tx'' IS NOT NULL
-                AND a.sync_data->>''origin'' IS NOT NULL
-                    THEN extract(epoch from Cast(a.sync_data->>''action_tstamp_tx'' AS TIMESTAMP WITH TIME ZONE))::integer
-                ELSE extract(epoch from a.action_tstamp_tx)::integer
-            END AS original_action_tstamp_tx
-        FROM audit.logged_actions AS a
-        -- Create as many lines as there are changed fields in UPDATE
-        LEFT JOIN skeys(a.changed_fields) AS s ON TRUE,
-        last_sync, tables
+            )
+        FROM merged AS m
+        WHERE True
+        AND i.action_type = ''I''
+        AND i.ident = m.ident
+        AND i.uid = m.uid
+        RETURNING i.ident, i.uid
+    )
+    DELETE FROM %1$I AS u
+    USING inserts AS i
+    WHERE True
+    AND u.action_type = ''U''
+    AND u.ident = i.ident
+    AND u.uid = i.uid
+    ';
+    EXECUTE format(sqltemplate, p_temporary_table, p_uid_field);
 
+    -- Keep only the last UPDATE of each field
+    sqltemplate = '
+    DELETE FROM %1$I AS t
+    WHERE t.action_type = ''U''
+    AND EXISTS (
+        SELECT 1
+        FROM %1$I AS n
         WHERE True
+        AND n.action_type = ''U''
+        AND n.ident = t.ident
+        AND n.uid = t.uid
+        AND n.updated_field = t.updated_field
+        AND n.tid > t.tid
+    )
+    ';
+    EXECUTE format(sqltemplate, p_temporary_table);
 
-        -- modifications do not come from clone database
-        AND (a.sync_data->>''origin'' != ''%1$s'' OR a.sync_data->>''origin'' IS NULL)
+    EXECUTE format('SELECT count(*) FROM %1$I', p_temporary_table)
+    INTO p_count_after;
 
-        -- modifications have not yet been replayed in the clone database
-        AND (NOT (a.sync_data->''replayed_by'' ? ''%1$s'') OR a.sync_data->''replayed_by'' = jsonb_build_object() )
+    RETURN p_count_before - p_count_after;
+END;
+$_$;
 
-        -- modifications after the last synchronization
-        -- MAX_ACTION_TSTAMP_TX Par ex: 2019-04-20 12:00:00+02
-        AND a.action_tstamp_tx > last_sync.max_action_tstamp_tx
 
-        -- Event ID is bigger than last sync event id
-        -- MAX_EVENT_ID
-        AND a.event_id > last_sync.max_event_id
+-- FUNCTION compact_audit_logs(p_temporary_table text, p_uid_field text)
+COMMENT ON FUNCTION lizsync.compact_audit_logs(p_temporary_table text, p_uid_field text) IS 'Reduce the logs of each object stored in a temporary audit table to their net effect: an INSERT followed by a DELETE is removed, the UPDATE following an INSERT are merged into the INSERT, the logs before a DELETE are removed, and only the last UPDATE of each field is kept. Parameters: temporary table name and uid column name. It returns the number of removed logs.';
 
-        -- only for tables synchronized by the clone server ID
-        AND sync_tables ? concat(''"'', a.schema_name, ''"."'', a.table_name, ''"'')
 
-        ORDER BY a.event_id
+-- create_audit_partition(bigint, bigint)
+CREATE FUNCTION lizsync.create_audit_partition(p_from_event_id bigint, p_to_event_id bigint) RETURNS text
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    p_partition_name text;
+    sqltemplate text;
+BEGIN
+    -- The partition is named after its first event id
+    p_partition_name = concat('logged_actions_p', p_from_event_id);
+
+    -- Create the partition and its indexes
+    sqltemplate = '
+        CREATE TABLE audit.%1$I
+        PARTITION OF audit.logged_actions
+        FOR VALUES FROM (%2$s) TO (%3$s);
+        ALTER TABLE audit.%1$I ADD PRIMARY KEY (event_id);
+        CREATE INDEX ON audit.%1$I (relid);
+        CREATE INDEX ON audit.%1$I (action_tstamp_stm);
+        CREATE INDEX ON audit.%1$I (action);
+        REVOKE ALL ON audit.%1$I FROM public;
+    ';
+    EXECUTE format(sqltemplate,
+        p_partition_name,
+        p_from_event_id,
+        Coalesce(p_to_event_id::text, 'MAXVALUE')
+    );
+
+    RETURN p_partition_name;
+END;
+$_$;
+
+
+-- FUNCTION create_audit_partition(p_from_event_id bigint, p_to_event_id bigint)
+COMMENT ON FUNCTION lizsync.create_audit_partition(p_from_event_id bigint, p_to_event_id bigint) IS 'Create a partition of the partitioned table audit.logged_actions, with the same indexes as the original table. Parameters: first event id, event id after the last event id of the partition (NULL for no upper limit). It returns the partition name';
+
+
+-- create_audit_partitions(bigint)
+CREATE FUNCTION lizsync.create_audit_partitions(p_partition_size bigint) RETURNS integer
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    p_sequence_name text;
+    p_last_event_id bigint;
+    p_tail record;
+    p_tail_max_event_id bigint;
+    p_from_event_id bigint;
+    p_count integer;
+BEGIN
+    p_count = 0;
+
+    -- Check parameters
+    IF p_partition_size IS NULL OR p_partition_size < 1 THEN
+        RAISE EXCEPTION 'The partition size must be greater than 0';
+    END IF;
+    IF NOT (
+        SELECT c.relkind = 'p'
+        FROM pg_catalog.pg_class AS c
+        WHERE c.oid = 'audit.logged_actions'::regclass
+    ) THEN
+        RAISE EXCEPTION 'The table audit.logged_actions is not partitioned. Use the function lizsync.partition_audit_logs first';
+    END IF;
+
+    -- Get the last event id and the last partition,
+    -- which has no upper limit and should stay empty
+    p_sequence_name = pg_get_serial_sequence('audit.logged_actions', 'event_id');
+    EXECUTE format('SELECT last_value FROM %s', p_sequence_name)
+    INTO p_last_event_id;
+    SELECT p.* INTO p_tail
+    FROM lizsync.get_audit_partitions() AS p
+    WHERE p.to_event_id IS NULL;
+
+    -- Nothing to do if the next partitions can store more than the given number of events
+    IF p_last_event_id + p_partition_size < p_tail.from_event_id THEN
+        RETURN p_count;
+    END IF;
+
+    -- Lock the table to stop the audit triggers during the change
+    LOCK TABLE audit.logged_actions IN ACCESS EXCLUSIVE MODE;
+    EXECUTE format('SELECT last_value FROM %s', p_sequence_name)
+    INTO p_last_event_id;
+    SELECT p.* INTO p_tail
+    FROM lizsync.get_audit_partitions() AS p
+    WHERE p.to_event_id IS NULL;
+
+    -- Detach the last partition
+    EXECUTE format('SELECT max(event_id) FROM audit.%I', p_tail.partition_name)
+    INTO p_tail_max_event_id;
+    EXECUTE format('ALTER TABLE audit.logged_actions DETACH PARTITION audit.%I', p_tail.partition_name);
+    IF p_tail_max_event_id IS NULL THEN
+        -- It is empty: drop it
+        EXECUTE format('DROP TABLE audit.%I', p_tail.partition_name);
+        p_from_event_id = p_tail.from_event_id;
+    ELSE
+        -- It already contains events: attach it again with its last event id as upper limit
+        -- This needs a scan of the partition
+        p_from_event_id = p_tail_max_event_id + 1;
+        EXECUTE format(
+            'ALTER TABLE audit.logged_actions ATTACH PARTITION audit.%I FOR VALUES FROM (%s) TO (%s)',
+            p_tail.partition_name,
+            p_tail.from_event_id,
+            p_from_event_id
+        );
+    END IF;
+
+    -- Create the partitions for the next events
+    WHILE p_from_event_id <= p_last_event_id + p_partition_size LOOP
+        PERFORM lizsync.create_audit_partition(p_from_event_id, p_from_event_id + p_partition_size);
+        p_from_event_id = p_from_event_id + p_partition_size;
+        p_count = p_count + 1;
+    END LOOP;
+
+    -- Create the last partition with no upper limit
+    PERFORM lizsync.create_audit_partition(p_from_event_id, NULL);
+
+    RETURN p_count;
+END;
+$_$;
+
+
+-- FUNCTION create_audit_partitions(p_partition_size bigint)
+COMMENT ON FUNCTION lizsync.create_audit_partitions(p_partition_size bigint) IS 'Create the next partitions of the partitioned table audit.logged_actions, so that the partitions can store at least the given number of new events before the last partition with no upper limit. Parameters: number of events of each partition. It returns the number of created partitions';
+
+
+-- create_central_server_fdw(text, smallint, text, text, text)
+CREATE FUNCTION lizsync.create_central_server_fdw(p_central_host text, p_central_port smallint, p_central_database text, p_central_username text, p_central_password text) RETURNS boolean
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    sqltemplate text;
+BEGIN
+    -- Create extension
+    CREATE EXTENSION IF NOT EXISTS postgres_fdw;
+
+    -- Create server
+    DROP SERVER IF EXISTS central_server CASCADE;
+    sqltemplate = '
+    CREATE SERVER central_server
+    FOREIGN DATA WRAPPER postgres_fdw
+    OPTIONS (
+        host ''%1$s'',
+        port ''%2$s'',
+        dbname ''%3$s'',
+        connect_timeout ''5''
+    );
+    ';
+    EXECUTE format(sqltemplate,
+        p_central_host,
+        p_central_port,
+        p_central_database
+    );
+
+    -- User mapping
+    sqltemplate = '
+    CREATE USER MAPPING FOR CURRENT_USER
+    SERVER central_server
+    OPTIONS (
+        user ''%1$s'',
+        password ''%2$s''
+    )
+    ';
+    EXECUTE format(sqltemplate,
+        p_central_username,
+        p_central_password
+    );
+
+    -- Create local schemas
+    CREATE SCHEMA IF NOT EXISTS central_audit;
+    CREATE SCHEMA IF NOT EXISTS central_lizsync;
+
+    -- Import foreign tables
+    -- audit
+    IMPORT FOREIGN SCHEMA audit
+    FROM SERVER central_server
+    INTO central_audit;
+
+    -- lizsync
+    IMPORT FOREIGN SCHEMA lizsync
+    FROM SERVER central_server
+    INTO central_lizsync;
+
+    -- Manually create modified conflicts table
+    -- with no id column to avoid issues
+    -- https://stackoverflow.com/a/53361066/13220524
+    CREATE FOREIGN TABLE central_lizsync.conflicts_bis(
+        object_table text,
+        object_uid uuid,
+        clone_id uuid,
+        central_event_id bigint,
+        central_event_timestamp timestamp with time zone,
+        central_sql text,
+        clone_sql text,
+        rejected text,
+        rule_applied text
+     )
+    SERVER central_server
+    OPTIONS (
+        schema_name 'lizsync',
+        table_name 'conflicts'
+    );
+
+    RETURN True;
+END;
+$_$;
+
+
+-- FUNCTION create_central_server_fdw(p_central_host text, p_central_port smallint, p_central_database text, p_central_username text, p_central_password text)
+COMMENT ON FUNCTION lizsync.create_central_server_fdw(p_central_host text, p_central_port smallint, p_central_database text, p_central_username text, p_central_password text) IS 'Create foreign server, needed central_audit and central_lizsync schemas, and import all central database tables as foreign tables. This will allow the clone to connect to the central databse';
+
+
+-- create_temporary_table(text, text)
+CREATE FUNCTION lizsync.create_temporary_table(temporary_table text, table_type text) RETURNS boolean
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    sqltemplate text;
+BEGIN
+    -- The temporary tables are created once per session, and emptied
+    -- at the end of each transaction. They are only truncated here
+    -- so that each synchronization does not create and drop them in the catalog
+    IF to_regclass('pg_temp.' || quote_ident(temporary_table)) IS NOT NULL THEN
+        EXECUTE 'TRUNCATE ' || quote_ident(temporary_table) || ' RESTART IDENTITY';
+        RETURN True;
+    END IF;
+
+    -- Create temporary table
+    IF table_type = 'audit' THEN
+        EXECUTE 'CREATE TEMP TABLE ' || quote_ident(temporary_table) || ' (
+            tid                       serial PRIMARY KEY,
+            event_id                  bigint,
+            action_tstamp_tx          timestamp with time zone,
+            action_tstamp_epoch       integer,
+            ident                     text,
+            action_type               text,
+            origine                   text,
+            action                    text,
+            updated_field             text,
+            uid                       uuid,
+            original_action_tstamp_tx integer,
+            action_data               public.hstore
+        )
+        ON COMMIT DELETE ROWS
+        ';
+        -- Index used by the compaction of the logs and the conflicts analysis
+        EXECUTE 'CREATE INDEX ON ' || quote_ident(temporary_table) || ' (ident, uid, updated_field)';
+    END IF;
+    IF table_type = 'conflict' THEN
+        EXECUTE 'CREATE TEMP TABLE ' || quote_ident(temporary_table) || ' (
+            tid                     serial PRIMARY KEY       ,
+            conflict_time           timestamp with time zone ,
+            object_table            text                     ,
+            object_uid              uuid                     ,
+            central_tid             integer                  ,
+            clone_tid               integer                  ,
+            central_event_id        integer                  ,
+            central_event_timestamp timestamp with time zone ,
+            central_sql             text                     ,
+            clone_sql               text                     ,
+            rejected                text                     ,
+            rule_applied            text
+        )
+        ON COMMIT DELETE ROWS
+        ';
+    END IF;
+    IF table_type = 'area' THEN
+        EXECUTE 'CREATE TEMP TABLE ' || quote_ident(temporary_table) || ' (
+            ident     text,
+            uid       uuid,
+            from_area boolean,
+            PRIMARY KEY (ident, uid)
+        )
+        ON COMMIT DELETE ROWS
+        ';
+    END IF;
+
+    RETURN True;
+END;
+$$;
+
+
+-- FUNCTION create_temporary_table(temporary_table text, table_type text)
+COMMENT ON FUNCTION lizsync.create_temporary_table(temporary_table text, table_type text) IS 'Create temporary table used during database bidirectionnal synchronization, with its indexes. The table is created once per session and emptied at the end of each transaction: if it already exists, it is only truncated. Parameters: temporary table name, and table type (audit, conflit or area)';
+
+
+-- fill_area_of_interest(regclass[], text)
+CREATE FUNCTION lizsync.fill_area_of_interest(p_tables regclass[], p_area text) RETURNS regclass[]
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    v_spatial regclass[];
+    v_filtered regclass[];
+    v_new regclass[];
+    v_condition text;
+    v_added bigint;
+    v_count bigint;
+    rec record;
+    fk record;
+BEGIN
+    -- Rows kept for each filtered table
+    PERFORM lizsync.create_temporary_table('temp_area_of_interest', 'area');
+
+    -- The spatial tables are filtered by the area
+    v_spatial := ARRAY[]::regclass[];
+    FOR rec IN
+        SELECT c.oid::regclass AS rel, n.nspname::text AS schema_name, c.relname::text AS rel_name
+        FROM pg_catalog.pg_class AS c
+        INNER JOIN pg_catalog.pg_namespace AS n
+            ON n.oid = c.relnamespace
+        WHERE c.oid = ANY (p_tables)
+        AND p_area IS NOT NULL
+    LOOP
+        v_condition := lizsync.get_area_of_interest_condition(rec.schema_name, rec.rel_name, p_area, 't');
+        CONTINUE WHEN v_condition IS NULL;
+        v_spatial := v_spatial || rec.rel;
+        EXECUTE format('
+            INSERT INTO temp_area_of_interest (ident, uid, from_area)
+            SELECT %1$L, t.uid, True
+            FROM %2$s AS t
+            WHERE %3$s
+            ON CONFLICT DO NOTHING
+            ',
+            rec.rel::text, rec.rel, v_condition
+        );
+    END LOOP;
+
+    -- The tables referencing a filtered table are also filtered,
+    -- so that their foreign keys are still valid in the clone
+    v_filtered := v_spatial;
+    LOOP
+        SELECT array_agg(DISTINCT c.conrelid::regclass)
+        INTO v_new
+        FROM pg_catalog.pg_constraint AS c
+        WHERE c.contype = 'f'
+        AND c.conrelid = ANY (p_tables)
+        AND c.confrelid = ANY (v_filtered)
+        AND NOT c.conrelid = ANY (v_filtered)
+        ;
+        EXIT WHEN v_new IS NULL;
+        v_filtered := v_filtered || v_new;
+    END LOOP;
+
+    -- Keep the rows of the non spatial tables which do not reference any filtered row
+    FOR rec IN
+        SELECT c.conrelid::regclass AS rel,
+        string_agg(
+            '(' || (
+                SELECT string_agg(format('t.%I IS NULL', a.attname), ' OR ')
+                FROM pg_catalog.pg_attribute AS a
+                WHERE a.attrelid = c.conrelid
+                AND a.attnum = ANY (c.conkey)
+            ) || ')',
+            ' AND '
+        ) AS null_condition
+        FROM pg_catalog.pg_constraint AS c
+        WHERE c.contype = 'f'
+        AND c.conrelid = ANY (v_filtered)
+        AND c.confrelid = ANY (v_filtered)
+        AND NOT c.conrelid = ANY (v_spatial)
+        GROUP BY c.conrelid
+    LOOP
+        EXECUTE format('
+            INSERT INTO temp_area_of_interest (ident, uid, from_area)
+            SELECT %1$L, t.uid, True
+            FROM %2$s AS t
+            WHERE %3$s
+            ON CONFLICT DO NOTHING
+            ',
+            rec.rel::text, rec.rel, rec.null_condition
+        );
+    END LOOP;
+
+    -- Add the rows of the non spatial tables referencing the rows of the area,
+    -- for example the observations of the kept features
+    LOOP
+        v_count := 0;
+        FOR fk IN
+            SELECT c.conrelid::regclass AS child, c.confrelid::regclass AS parent,
+            string_agg(format('ch.%I = pa.%I', ca.attname, pa.attname), ' AND ') AS join_condition
+            FROM pg_catalog.pg_constraint AS c
+            CROSS JOIN LATERAL unnest(c.conkey, c.confkey) AS k(child_attnum, parent_attnum)
+            INNER JOIN pg_catalog.pg_attribute AS ca
+                ON ca.attrelid = c.conrelid AND ca.attnum = k.child_attnum
+            INNER JOIN pg_catalog.pg_attribute AS pa
+                ON pa.attrelid = c.confrelid AND pa.attnum = k.parent_attnum
+            WHERE c.contype = 'f'
+            AND c.conrelid = ANY (v_filtered)
+            AND c.confrelid = ANY (v_filtered)
+            AND NOT c.conrelid = ANY (v_spatial)
+            GROUP BY c.oid, c.conrelid, c.confrelid
+        LOOP
+            EXECUTE format('
+                INSERT INTO temp_area_of_interest (ident, uid, from_area)
+                SELECT DISTINCT %1$L, ch.uid, True
+                FROM %2$s AS ch
+                INNER JOIN %3$s AS pa
+                    ON %4$s
+                INNER JOIN temp_area_of_interest AS k
+                    ON k.ident = %5$L AND k.uid = pa.uid AND k.from_area
+                ON CONFLICT DO NOTHING
+                ',
+                fk.child::text, fk.child, fk.parent, fk.join_condition, fk.parent::text
+            );
+            GET DIAGNOSTICS v_added = ROW_COUNT;
+            v_count := v_count + v_added;
+        END LOOP;
+        EXIT WHEN v_count = 0;
+    END LOOP;
+
+    -- Add the rows referenced by the kept rows, even outside the area
+    LOOP
+        v_count := 0;
+        FOR fk IN
+            SELECT c.conrelid::regclass AS child, c.confrelid::regclass AS parent,
+            string_agg(format('ch.%I = pa.%I', ca.attname, pa.attname), ' AND ') AS join_condition
+            FROM pg_catalog.pg_constraint AS c
+            CROSS JOIN LATERAL unnest(c.conkey, c.confkey) AS k(child_attnum, parent_attnum)
+            INNER JOIN pg_catalog.pg_attribute AS ca
+                ON ca.attrelid = c.conrelid AND ca.attnum = k.child_attnum
+            INNER JOIN pg_catalog.pg_attribute AS pa
+                ON pa.attrelid = c.confrelid AND pa.attnum = k.parent_attnum
+            WHERE c.contype = 'f'
+            AND c.conrelid = ANY (v_filtered)
+            AND c.confrelid = ANY (v_filtered)
+            GROUP BY c.oid, c.conrelid, c.confrelid
+        LOOP
+            EXECUTE format('
+                INSERT INTO temp_area_of_interest (ident, uid, from_area)
+                SELECT DISTINCT %1$L, pa.uid, False
+                FROM %2$s AS ch
+                INNER JOIN %3$s AS pa
+                    ON %4$s
+                INNER JOIN temp_area_of_interest AS k
+                    ON k.ident = %5$L AND k.uid = ch.uid
+                ON CONFLICT DO NOTHING
+                ',
+                fk.parent::text, fk.child, fk.parent, fk.join_condition, fk.child::text
+            );
+            GET DIAGNOSTICS v_added = ROW_COUNT;
+            v_count := v_count + v_added;
+        END LOOP;
+        EXIT WHEN v_count = 0;
+    END LOOP;
+
+    RETURN v_filtered;
+END;
+$_$;
+
+
+-- FUNCTION fill_area_of_interest(p_tables regclass[], p_area text)
+COMMENT ON FUNCTION lizsync.fill_area_of_interest(p_tables regclass[], p_area text) IS 'Store the rows of the area of interest of some tables in the temporary table temp_area_of_interest, emptied at the end of the transaction: the rows of the spatial tables intersecting the area, the rows of the other tables referencing them or not referencing any filtered row, and all the rows they reference through foreign keys, even outside the area. The tables without geometry column and not referencing a filtered table are not filtered. It is used to package the data and to synchronize the clones with an area of interest. Parameters: tables, and area as EWKT or NULL. It returns the filtered tables';
+
+
+-- fill_subscription_area(uuid)
+CREATE FUNCTION lizsync.fill_subscription_area(p_clone_id uuid) RETURNS TABLE(table_schema text, table_name text)
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    v_filtered regclass[];
+    v_tables regclass[];
+    rec record;
+BEGIN
+    -- The rows are computed once per transaction for the clone,
+    -- and kept with the filtered tables until the end of the transaction
+    IF current_setting('lizsync.subscription_area_clone', true) IS DISTINCT FROM p_clone_id::text THEN
+        PERFORM lizsync.create_temporary_table('temp_subscription_area', 'area');
+        v_tables := ARRAY[]::regclass[];
+
+        -- The rows are selected as in the package of the clone,
+        -- for each area stored in the subscription filters of the clone
+        FOR rec IN
+            SELECT f.area, array_agg(format('%I.%I', f.table_schema, f.table_name)::regclass) AS tables
+            FROM lizsync.subscription_filters AS f
+            WHERE f.server_id = p_clone_id
+            AND f.area IS NOT NULL
+            AND to_regclass(format('%I.%I', f.table_schema, f.table_name)) IS NOT NULL
+            GROUP BY f.area
+        LOOP
+            v_filtered := lizsync.fill_area_of_interest(rec.tables, rec.area);
+            v_tables := v_tables || v_filtered;
+
+            INSERT INTO temp_subscription_area (ident, uid, from_area)
+            SELECT quote_ident(n.nspname) || '.' || quote_ident(c.relname), k.uid, k.from_area
+            FROM temp_area_of_interest AS k
+            INNER JOIN pg_catalog.pg_class AS c
+                ON c.oid = k.ident::regclass
+            INNER JOIN pg_catalog.pg_namespace AS n
+                ON n.oid = c.relnamespace
+            WHERE c.oid = ANY (v_filtered)
+            ON CONFLICT DO NOTHING
+            ;
+        END LOOP;
+
+        PERFORM set_config('lizsync.subscription_area_clone', p_clone_id::text, true);
+        PERFORM set_config('lizsync.subscription_area_tables', v_tables::text, true);
+    END IF;
+
+    RETURN QUERY
+    SELECT DISTINCT n.nspname::text, c.relname::text
+    FROM pg_catalog.pg_class AS c
+    INNER JOIN pg_catalog.pg_namespace AS n
+        ON n.oid = c.relnamespace
+    WHERE c.oid = ANY (current_setting('lizsync.subscription_area_tables', true)::regclass[])
+    ;
+END;
+$$;
+
+
+-- FUNCTION fill_subscription_area(p_clone_id uuid)
+COMMENT ON FUNCTION lizsync.fill_subscription_area(p_clone_id uuid) IS 'Store the rows of the area of interest of a clone in the temporary table temp_subscription_area, for each table filtered by the area stored in its subscription filters. The rows are selected with lizsync.fill_area_of_interest, as in a package created with this area: the features of the area, the rows referencing them, and the rows they reference, even outside the area. They are computed once per transaction, and the table is emptied at the end of the transaction. Parameters: clone id. It returns the schema and the name of the filtered tables';
+
+
+-- get_area_of_interest_condition(text, text, text, text)
+CREATE FUNCTION lizsync.get_area_of_interest_condition(p_schema_name text, p_table_name text, p_area text, p_alias text) RETURNS text
+    LANGUAGE plpgsql STABLE
+    AS $_$
+DECLARE
+    v_condition text;
+BEGIN
+    -- The rows intersecting the area with one of their geometry columns
+    -- The area is transformed into the SRID of each column, so that its spatial index can be used
+    SELECT string_agg(
+        CASE
+            WHEN Coalesce(g.srid, 0) > 0 THEN format(
+                'ST_Intersects(%1$I.%2$I, ST_Transform(ST_GeomFromEWKT(%3$L), %4$s))',
+                p_alias, a.attname, p_area, g.srid
+            )
+            ELSE format(
+                'ST_Intersects(%1$I.%2$I, ST_SetSRID(ST_GeomFromEWKT(%3$L), 0))',
+                p_alias, a.attname, p_area
+            )
+        END,
+        ' OR ' ORDER BY a.attnum
+    )
+    INTO v_condition
+    FROM pg_catalog.pg_attribute AS a
+    INNER JOIN pg_catalog.pg_type AS ty
+        ON ty.oid = a.atttypid
+    LEFT JOIN geometry_columns AS g
+        ON g.f_table_schema = p_schema_name
+        AND g.f_table_name = p_table_name
+        AND g.f_geometry_column = a.attname
+    WHERE a.attrelid = (quote_ident(p_schema_name) || '.' || quote_ident(p_table_name))::regclass
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    AND ty.typname = 'geometry'
+    ;
+
+    IF v_condition IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    RETURN '(' || v_condition || ')';
+END;
+$_$;
+
+
+-- FUNCTION get_area_of_interest_condition(p_schema_name text, p_table_name text, p_area text, p_alias text)
+COMMENT ON FUNCTION lizsync.get_area_of_interest_condition(p_schema_name text, p_table_name text, p_area text, p_alias text) IS 'Get the SQL condition selecting the rows of a table intersecting an area with one of their geometry columns. Returns NULL if the table has no geometry column. Parameters: schema name, table name, area as EWKT, and alias of the table in the query';
+
+
+-- get_audit_compact_columns(regclass)
+CREATE FUNCTION lizsync.get_audit_compact_columns(p_table regclass) RETURNS text[]
+    LANGUAGE plpgsql STABLE
+    AS $$
+DECLARE
+    v_compact text[];
+BEGIN
+    -- The compact columns are the third argument of the row audit trigger
+    -- and the fourth argument of the update audit trigger
+    SELECT NULLIF(
+        (string_to_array(encode(t.tgargs, 'escape'), '\000'))[
+            CASE WHEN t.tgname = 'audit_trigger_row' THEN 3 ELSE 4 END
+        ],
+        ''
+    )::text[]
+    INTO v_compact
+    FROM pg_catalog.pg_trigger AS t
+    WHERE t.tgrelid = p_table
+    AND t.tgname IN ('audit_trigger_row', 'audit_trigger_upd')
+    LIMIT 1
+    ;
+
+    RETURN v_compact;
+END;
+$$;
+
+
+-- FUNCTION get_audit_compact_columns(p_table regclass)
+COMMENT ON FUNCTION lizsync.get_audit_compact_columns(p_table regclass) IS 'Get the columns kept with the primary key in the compact audit logs of a table, given to audit.audit_table as compact_cols. The other columns are missing from the row data of the UPDATE and DELETE logs. Returns NULL if the logs of the table are not compact. Parameters: table';
+
+
+-- get_audit_excluded_columns(regclass)
+CREATE FUNCTION lizsync.get_audit_excluded_columns(p_table regclass) RETURNS text[]
+    LANGUAGE plpgsql STABLE
+    AS $$
+DECLARE
+    v_excluded text[];
+BEGIN
+    -- The excluded columns are the second argument of the row and update audit triggers
+    SELECT NULLIF((string_to_array(encode(t.tgargs, 'escape'), '\000'))[2], '')::text[]
+    INTO v_excluded
+    FROM pg_catalog.pg_trigger AS t
+    WHERE t.tgrelid = p_table
+    AND t.tgname IN ('audit_trigger_row', 'audit_trigger_upd')
+    LIMIT 1
+    ;
+
+    RETURN Coalesce(v_excluded, ARRAY[]::text[]);
+END;
+$$;
+
+
+-- FUNCTION get_audit_excluded_columns(p_table regclass)
+COMMENT ON FUNCTION lizsync.get_audit_excluded_columns(p_table regclass) IS 'Get the columns of a table excluded from the audit logs, given to audit.audit_table as ignored_cols. These columns are not logged, replayed nor analysed for conflicts. Returns an empty array if the table is not audited. Parameters: table';
+
+
+-- get_audit_partitions()
+CREATE FUNCTION lizsync.get_audit_partitions() RETURNS TABLE(partition_name text, from_event_id bigint, to_event_id bigint)
+    LANGUAGE plpgsql
+    AS $_$
+BEGIN
+    RETURN QUERY
+    WITH
+    partitions AS (
+        SELECT
+            c.relname::text AS relname,
+            regexp_matches(
+                pg_get_expr(c.relpartbound, c.oid),
+                'FROM \((.*)\) TO \((.*)\)'
+            ) AS bounds
+        FROM pg_catalog.pg_inherits AS i
+        INNER JOIN pg_catalog.pg_class AS c
+            ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'audit.logged_actions'::regclass
+    )
+    SELECT
+        p.relname,
+        nullif(trim(p.bounds[1], ''''), 'MINVALUE')::bigint,
+        nullif(trim(p.bounds[2], ''''), 'MAXVALUE')::bigint
+    FROM partitions AS p
+    ORDER BY 2 NULLS FIRST
+    ;
+END;
+$_$;
+
+
+-- FUNCTION get_audit_partitions()
+COMMENT ON FUNCTION lizsync.get_audit_partitions() IS 'List the partitions of the table audit.logged_actions with their first event id and the event id after their last event id. NULL is returned for a partition with no lower or upper limit';
+
+
+-- get_central_audit_logs(text, text[], bigint)
+CREATE FUNCTION lizsync.get_central_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint) RETURNS TABLE(event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer, ident text, action_type text, origine text, action text, updated_field text, uid uuid, original_action_tstamp_tx integer, action_data public.hstore)
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    p_clone_id text;
+    p_local_event_id bigint;
+    sqltemplate text;
+    sqltext text;
+    dblink_connection_name text;
+    dblink_msg text;
+BEGIN
+
+    -- Get clone server id
+    SELECT server_id::text INTO p_clone_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+
+    IF p_clone_id IS NULL THEN
+        RETURN QUERY
+        SELECT
+            NULL, NULL, NULL, NULL,
+            NULL, NULL, NULL, NULL, NULL, NULL,
+            NULL
+        LIMIT 0;
+    END IF;
+
+    -- Get the last central event id replayed, stored in the clone
+    -- It is used instead of the central cursor if it exists: it is lower if the clone
+    -- transaction has failed after the central cursor has been committed,
+    -- and higher if a delta package has been replayed offline
+    SELECT c.last_event_id INTO p_local_event_id
+    FROM lizsync.clone_cursors AS c
+    WHERE c.clone_id = p_clone_id::uuid;
+
+    -- Create dblink connection
+    dblink_connection_name = (md5(((random())::text || (clock_timestamp())::text)))::text;
+    SELECT dblink_connect(
+        dblink_connection_name,
+        'central_server'
+    )
+    INTO dblink_msg;
+
+    -- The central logs are filtered by the central function shared with the delta packages
+    -- from the last event id replayed by the clone
+    sqltemplate = '
+        SELECT *
+        FROM lizsync.get_subscription_audit_logs(
+            %1$L::uuid,
+            Coalesce(
+                %2$s,
+                (SELECT c.last_event_id FROM lizsync.clone_cursors AS c WHERE c.clone_id = %1$L::uuid)
+            ),
+            %3$s,
+            %4$L,
+            %5$L::text[]
+        )
+    ';
+
+    sqltext = format(sqltemplate,
+        p_clone_id,
+        Coalesce(p_local_event_id::text, 'NULL'),
+        Coalesce(p_max_event_id::text, 'NULL'),
+        p_uid_field,
+        p_excluded_columns
+    );
+    RAISE DEBUG '%', sqltext;
+
+    RETURN QUERY
+    SELECT *
+    FROM dblink(
+        dblink_connection_name,
+        sqltext
+    ) AS t(
+        event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer,
+        ident text, action_type text, origine text, action text, updated_field text,
+        uid uuid, original_action_tstamp_tx integer, action_data public.hstore
+    )
+    ;
+
+    -- Disconnect dblink
+    PERFORM dblink_disconnect(dblink_connection_name);
+
+END;
+$_$;
+
+
+-- FUNCTION get_central_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.get_central_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint) IS 'Get all the logs from the central database, returned by lizsync.get_subscription_audit_logs in the central database: modifications have an event id higher than the last event id acknowledged by the clone in the table lizsync.clone_cursors of the clone, or of the central database if the clone has no cursor, not higher than the given maximum event id, and match the subscription of the clone. Parameters: uid column name, excluded columns and maximum event id (NULL for no limit)';
+
+
+-- get_clone_audit_logs(text, text[], bigint)
+CREATE FUNCTION lizsync.get_clone_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint) RETURNS TABLE(event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer, ident text, action_type text, origine text, action text, updated_field text, uid uuid, action_data public.hstore)
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    sqltemplate text;
+BEGIN
+    RETURN QUERY
+    WITH
+    rel AS (
+        -- Primary key fields and columns excluded from the logs, got once per audited relation
+        SELECT r.relation_name, array_agg(r.uid_column) AS pkey_fields,
+        lizsync.get_audit_excluded_columns(to_regclass(r.relation_name)) AS excluded_columns
+        FROM audit.logged_relations AS r
+        GROUP BY r.relation_name
+    ),
+    filters AS (
+        -- Columns of the tables not sent by the central database to this clone,
+        -- and tables only synchronized from the central database
+        SELECT f.table_schema, f.table_name,
+        lizsync.get_excluded_columns(f.table_schema, f.table_name, f.column_names) AS excluded_columns,
+        f.read_only
+        FROM lizsync.subscription_filters AS f
+        INNER JOIN lizsync.server_metadata AS m
+            ON m.server_id = f.server_id
+    )
+    SELECT
+        a.event_id,
+        a.action_tstamp_tx AS action_tstamp_tx,
+        extract(epoch from a.action_tstamp_tx)::integer AS action_tstamp_epoch,
+        concat(a.schema_name, '.', a.table_name) AS ident,
+        a.action AS action_type,
+        'clone'::text AS origine,
+        Coalesce(
+            lizsync.build_event_sql(
+                a.action, a.schema_name, a.table_name,
+                a.row_data,
+                -- only the field of this line for UPDATE
+                slice(a.changed_fields, ARRAY[s]),
+                rel.pkey_fields,
+                p_uid_field::text,
+                e.excluded_columns
+            ),
+            ''
+        ) AS action,
+        s AS updated_field,
+        (a.row_data->p_uid_field)::uuid AS uid,
+        -- Values to replay, without primary keys and excluded columns
+        CASE
+            WHEN a.action = 'I'
+                THEN (a.row_data - rel.pkey_fields) - e.excluded_columns
+            WHEN a.action = 'U'
+                THEN (slice(a.changed_fields, ARRAY[s]) - rel.pkey_fields) - e.excluded_columns
+        END AS action_data
+    FROM audit.logged_actions AS a
+    LEFT JOIN rel
+        ON rel.relation_name = quote_ident(a.schema_name) || '.' || quote_ident(a.table_name)
+    LEFT JOIN filters AS f
+        ON f.table_schema = a.schema_name AND f.table_name = a.table_name
+    -- Columns not synchronized, for all the clones, not logged, or for this clone
+    CROSS JOIN LATERAL (
+        SELECT Coalesce(p_excluded_columns, '{}'::text[])
+        || Coalesce(rel.excluded_columns, '{}'::text[])
+        || Coalesce(f.excluded_columns, '{}'::text[]) AS excluded_columns
+    ) AS e
+    -- Create as many lines as there are changed fields in UPDATE
+    LEFT JOIN skeys(a.changed_fields - e.excluded_columns) AS s ON TRUE
+    WHERE True
+    AND (p_max_event_id IS NULL OR a.event_id <= p_max_event_id)
+    -- Only the updates of the synchronized columns
+    AND (a.action != 'U' OR s IS NOT NULL)
+    -- Not the modifications of the read only tables
+    AND f.read_only IS NOT True
+    ORDER BY a.event_id
+    ;
+END;
+$$;
+
+
+-- FUNCTION get_clone_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.get_clone_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint) IS 'Get all the modifications made in the clone, up to the given maximum event id, without the columns excluded from the audit triggers and the columns not synchronized with the central database for this clone, and without the read only tables of this clone. Parameters: uid column name, excluded columns and maximum event id (NULL for no limit)';
+
+
+-- get_clone_cursor(integer)
+CREATE FUNCTION lizsync.get_clone_cursor(p_batch_size integer) RETURNS TABLE(last_event_id bigint, last_clone_event_id bigint, next_max_event_id bigint)
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    p_clone_id text;
+    p_local_event_id bigint;
+    p_last_event_id bigint;
+    p_last_clone_event_id bigint;
+    p_next_max_event_id bigint;
+    p_purged_event_id bigint;
+    sqltemplate text;
+    sqltext text;
+    dblink_connection_name text;
+    dblink_msg text;
+BEGIN
+    -- Get clone server id
+    SELECT server_id::text INTO p_clone_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+
+    -- Get the last central event id replayed, stored in the clone
+    -- It is used instead of the central cursor if it exists
+    SELECT c.last_event_id INTO p_local_event_id
+    FROM lizsync.clone_cursors AS c
+    WHERE c.clone_id = p_clone_id::uuid;
+
+    -- Create dblink connection
+    dblink_connection_name = (md5(((random())::text || (clock_timestamp())::text)))::text;
+    SELECT dblink_connect(
+        dblink_connection_name,
+        'central_server'
+    )
+    INTO dblink_msg;
+
+    -- Get the cursor of the clone in the central database,
+    -- the maximum event id of the next central logs to replay,
+    -- or of all the central logs without batch size,
+    -- and the last purged event id
+    sqltemplate = '
+        WITH
+        clone_cursor AS (
+            SELECT
+                Coalesce(%2$s, c.last_event_id) AS last_event_id,
+                c.last_clone_event_id
+            FROM lizsync.clone_cursors AS c
+            WHERE c.clone_id = ''%1$s''::uuid
+        ),
+        next_logs AS (
+            SELECT a.event_id
+            FROM audit.logged_actions AS a
+            WHERE a.event_id > (SELECT last_event_id FROM clone_cursor)
+            ORDER BY a.event_id
+            LIMIT %3$s
+        )
+        SELECT
+            c.last_event_id,
+            c.last_clone_event_id,
+            (SELECT max(n.event_id) FROM next_logs AS n) AS next_max_event_id,
+            (
+                SELECT max(h.max_event_id)
+                FROM lizsync.history AS h
+                WHERE h.sync_type = ''purge''
+            ) AS purged_event_id
+        FROM clone_cursor AS c
         ;
     ';
-
     sqltext = format(sqltemplate,
         p_clone_id,
-        p_uid_field,
-        p_excluded_columns_text
+        Coalesce(p_local_event_id::text, 'NULL'),
+        Coalesce(p_batch_size::text, 'ALL')
     );
-    --RAISE NOTICE '%', sqltext;
+    RAISE DEBUG '%', sqltext;
 
-    RETURN QUERY
-    SELECT *
+    SELECT t.last_event_id, t.last_clone_event_id, t.next_max_event_id, t.purged_event_id
+    INTO p_last_event_id, p_last_clone_event_id, p_next_max_event_id, p_purged_event_id
     FROM dblink(
         dblink_connection_name,
         sqltext
     ) AS t(
-        event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer,
-        ident text, action_type text, origine text, action text, updated_field text,
-        uid uuid, original_action_tstamp_tx integer
+        last_event_id bigint, last_clone_event_id bigint, next_max_event_id bigint,
+        purged_event_id bigint
     )
     ;
 
+    -- Disconnect dblink
+    SELECT dblink_disconnect(dblink_connection_name)
+    INTO dblink_msg;
+
+    -- Without cursor, the central logs to replay cannot be found
+    IF p_last_event_id IS NULL THEN
+        RAISE EXCEPTION 'No synchronization cursor has been found for the clone % in the central database. Deploy a package in the clone before synchronizing it', p_clone_id;
+    END IF;
+
+    -- The central logs not replayed yet must not have been purged
+    IF p_last_event_id < p_purged_event_id THEN
+        RAISE EXCEPTION 'The central audit logs have been purged up to the event % but this clone has only replayed them up to the event %. Deploy a new package in the clone', p_purged_event_id, p_last_event_id;
+    END IF;
+
+    RETURN QUERY
+    SELECT p_last_event_id, p_last_clone_event_id, p_next_max_event_id;
 END;
 $_$;
 
 
--- FUNCTION get_central_audit_logs(p_uid_field text, p_excluded_columns text[])
-COMMENT ON FUNCTION lizsync.get_central_audit_logs(p_uid_field text, p_excluded_columns text[]) IS 'Get all the logs from the central database: modifications do not come from the clone, have not yet been replayed by the clone, are dated after the last synchronization, have an event id higher than the last sync maximum event id, and concern the synchronized tables for this clone. Parameters: uid column name and excluded columns';
+-- FUNCTION get_clone_cursor(p_batch_size integer)
+COMMENT ON FUNCTION lizsync.get_clone_cursor(p_batch_size integer) IS 'Get the synchronization cursor of the clone from the central database: the last central event id replayed in the clone, the last clone event id replayed in the central database, and the maximum event id of the next central logs to replay, limited to the given number of logs. The clone cursor is used instead of the central cursor if it exists. An exception is raised if the clone has no cursor, or if the central logs not replayed yet by the clone have been purged. Parameters: batch size (NULL to get the maximum event id of all the central logs to replay)';
 
 
--- get_clone_audit_logs(text, text[])
-CREATE FUNCTION lizsync.get_clone_audit_logs(p_uid_field text, p_excluded_columns text[]) RETURNS TABLE(event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer, ident text, action_type text, origine text, action text, updated_field text, uid uuid)
+-- get_delta_audit_logs(uuid, bigint, bigint)
+CREATE FUNCTION lizsync.get_delta_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint) RETURNS TABLE(event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer, ident text, action_type text, origine text, action text, updated_field text, uid uuid, original_action_tstamp_tx integer, action_data public.hstore)
     LANGUAGE plpgsql
     AS $$
 DECLARE
-    sqltemplate text;
+    status_bool boolean;
 BEGIN
+    -- Store the logs in a temporary table to compact them
+    SELECT lizsync.create_temporary_table('temp_delta_audit', 'audit')
+    INTO status_bool;
+
+    -- Same logs as the ones got by the clone during a synchronization
+    -- but between the given event ids
+    INSERT INTO temp_delta_audit
+    (
+        event_id, action_tstamp_tx, action_tstamp_epoch,
+        ident, action_type, origine, action, updated_field,
+        uid, original_action_tstamp_tx, action_data
+    )
+    SELECT
+        l.event_id, l.action_tstamp_tx, l.action_tstamp_epoch,
+        l.ident, l.action_type, l.origine, l.action, l.updated_field,
+        l.uid, l.original_action_tstamp_tx, l.action_data
+    FROM lizsync.get_subscription_audit_logs(p_clone_id, p_min_event_id, p_max_event_id, 'uid', NULL) AS l
+    ;
+
+    -- Reduce the logs of each object to their net effect
+    PERFORM lizsync.compact_audit_logs('temp_delta_audit', 'uid');
+
     RETURN QUERY
     SELECT
-        a.event_id,
-        a.action_tstamp_tx AS action_tstamp_tx,
-        extract(epoch from a.action_tstamp_tx)::integer AS action_tstamp_epoch,
-        concat(a.schema_name, '.', a.table_name) AS ident,
-        a.action AS action_type,
-        'clone'::text AS origine,
-        Coalesce(
-            lizsync.get_event_sql(
-                a.event_id,
-                p_uid_field::text,
-                array_cat(
-                    p_excluded_columns,
-                    array_remove(akeys(a.changed_fields), s)
-                )
-            ),
-            ''
-        ) AS action,
-        s AS updated_field,
-        (a.row_data->p_uid_field)::uuid AS uid
-    FROM audit.logged_actions AS a
-    -- Create as many lines as there are changed fields in UPDATE
-    LEFT JOIN skeys(a.changed_fields) AS s ON TRUE
-    WHERE True
-    ORDER BY a.event_id
+        t.event_id, t.action_tstamp_tx, t.action_tstamp_epoch,
+        t.ident, t.action_type, t.origine, t.action, t.updated_field,
+        t.uid, t.original_action_tstamp_tx, t.action_data
+    FROM temp_delta_audit AS t
+    ORDER BY t.tid
     ;
 END;
 $$;
 
 
--- FUNCTION get_clone_audit_logs(p_uid_field text, p_excluded_columns text[])
-COMMENT ON FUNCTION lizsync.get_clone_audit_logs(p_uid_field text, p_excluded_columns text[]) IS 'Get all the modifications made in the clone. Parameters: uid column name and excluded columns';
+-- FUNCTION get_delta_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.get_delta_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint) IS 'Get the logs of the central database to put in a delta package for the given clone, returned by lizsync.get_subscription_audit_logs as for a synchronization: modifications with an event id higher than the given minimum event id and not higher than the given maximum event id, matching the subscription of the clone. The rows entering or leaving the area of interest of the clone without modification are only updated by the next synchronization. The logs of each object are reduced to their net effect. Parameters: clone id, minimum event id (excluded) and maximum event id';
+
+
+-- get_different_uids(text, text, text, text[], text, text)
+CREATE FUNCTION lizsync.get_different_uids(p_dblink_connection_name text, p_schema_name text, p_table_name text, p_excluded_columns text[], p_clone_condition text, p_central_condition text) RETURNS uuid[]
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    prefix_length integer;
+    prefixes text[];
+    clone_hashes public.hstore;
+    central_hashes public.hstore;
+BEGIN
+    -- Compare the hashes of the blocks of rows computed in each database,
+    -- with blocks of uid sharing the same first 2, then 4 characters,
+    -- and finally the hashes of the rows of the different blocks.
+    -- Only the hashes of the different blocks are fetched from the central server
+    FOREACH prefix_length IN ARRAY ARRAY[2, 4, 36]
+    LOOP
+        -- The central hashes are computed at the same time as the clone hashes
+        PERFORM dblink_send_query(
+            p_dblink_connection_name,
+            format(
+                'SELECT prefix, hash FROM lizsync.get_table_hashes(%L, %L, %L, %L, %L, %s)',
+                p_schema_name, p_table_name, p_excluded_columns, p_central_condition, prefixes, prefix_length
+            )
+        );
+
+        SELECT Coalesce(hstore(array_agg(h.prefix), array_agg(h.hash)), ''::hstore)
+        INTO clone_hashes
+        FROM lizsync.get_table_hashes(p_schema_name, p_table_name, p_excluded_columns, p_clone_condition, prefixes, prefix_length) AS h
+        ;
+
+        SELECT Coalesce(hstore(array_agg(h.prefix), array_agg(h.hash)), ''::hstore)
+        INTO central_hashes
+        FROM dblink_get_result(p_dblink_connection_name) AS h(prefix text, hash text)
+        ;
+        -- Empty result needed before sending the next query
+        PERFORM * FROM dblink_get_result(p_dblink_connection_name) AS h(prefix text, hash text);
+
+        -- Blocks with a different hash, or only in one of the tables
+        SELECT array_agg(DISTINCT d.key)
+        INTO prefixes
+        FROM (
+            SELECT skeys(clone_hashes - central_hashes) AS key
+            UNION ALL
+            SELECT skeys(central_hashes - clone_hashes)
+        ) AS d
+        ;
+
+        EXIT WHEN prefixes IS NULL;
+    END LOOP;
+
+    -- The prefixes of the last blocks are the uid of the different rows
+    RETURN prefixes::uuid[];
+END;
+$$;
+
+
+-- FUNCTION get_different_uids(p_dblink_connection_name text, p_schema_name text, p_table_name text, p_excluded_columns text[], p_clone_condition text, p_central_condition text)
+COMMENT ON FUNCTION lizsync.get_different_uids(p_dblink_connection_name text, p_schema_name text, p_table_name text, p_excluded_columns text[], p_clone_condition text, p_central_condition text) IS 'Get the uid of the different rows of a table in the clone and in the central database. The hashes of the blocks of rows are computed at the same time in each database with lizsync.get_table_hashes and compared, then the hashes of the smaller blocks and of the rows of the different blocks only. It is used by lizsync.compare_tables and lizsync.update_area_of_interest. Parameters: dblink connection to the central database, schema name, table name, columns not compared, SQL conditions of the rows compared in the clone and in the central database on the alias t (NULL for all the rows). It returns NULL if the tables are the same';
 
 
 -- get_event_sql(bigint, text, text[])
@@ -572,91 +1821,660 @@ CREATE FUNCTION lizsync.get_event_sql(pevent_id bigint, puid_column text, exclud
 DECLARE
   sql text;
 BEGIN
-    IF excluded_columns IS NULL THEN
-        excluded_columns:= '{}'::text[];
+    SELECT INTO sql
+        lizsync.build_event_sql(
+            action, schema_name, table_name,
+            row_data, changed_fields,
+            -- get primary key names
+            (
+                SELECT array_agg(uid_column) as pkey_fields
+                FROM audit.logged_relations r
+                WHERE relation_name = (quote_ident(schema_name) || '.' || quote_ident(table_name))
+            ),
+            puid_column,
+            excluded_columns
+        )
+    FROM audit.logged_actions
+    WHERE event_id = pevent_id
+    ;
+    RETURN sql;
+END;
+$$;
+
+
+-- FUNCTION get_event_sql(pevent_id bigint, puid_column text, excluded_columns text[])
+COMMENT ON FUNCTION lizsync.get_event_sql(pevent_id bigint, puid_column text, excluded_columns text[]) IS '
+Get the SQL to use for replay from a audit log event
+
+Arguments:
+   pevent_id:  The event_id of the event in audit.logged_actions to replay
+   puid_column: The name of the column with unique uuid values
+';
+
+
+-- get_excluded_columns(text, text, text[])
+CREATE FUNCTION lizsync.get_excluded_columns(p_schema_name text, p_table_name text, p_column_names text[]) RETURNS text[]
+    LANGUAGE plpgsql STABLE
+    AS $$
+DECLARE
+    v_excluded text[];
+BEGIN
+    -- All the columns are synchronized
+    IF p_column_names IS NULL THEN
+        RETURN ARRAY[]::text[];
     END IF;
 
-    WITH
-    event AS (
-        SELECT * FROM audit.logged_actions WHERE event_id = pevent_id
+    -- The uid, the primary key and the mandatory columns are always synchronized
+    SELECT Coalesce(array_agg(a.attname::text ORDER BY a.attnum), ARRAY[]::text[])
+    INTO v_excluded
+    FROM pg_catalog.pg_attribute AS a
+    WHERE a.attrelid = (quote_ident(p_schema_name) || '.' || quote_ident(p_table_name))::regclass
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    AND NOT a.attnotnull
+    AND a.attname != 'uid'
+    AND NOT a.attname = ANY (p_column_names)
+    AND NOT EXISTS (
+        SELECT 1
+        FROM pg_catalog.pg_index AS i
+        WHERE i.indrelid = a.attrelid
+        AND i.indisprimary
+        AND a.attnum = ANY (i.indkey)
     )
-    -- get primary key names
-    , where_pks AS (
-        SELECT array_agg(uid_column) as pkey_fields
-        FROM audit.logged_relations r
-        JOIN event ON relation_name = (quote_ident(schema_name) || '.' || quote_ident(table_name))
+    ;
+
+    RETURN v_excluded;
+END;
+$$;
+
+
+-- FUNCTION get_excluded_columns(p_schema_name text, p_table_name text, p_column_names text[])
+COMMENT ON FUNCTION lizsync.get_excluded_columns(p_schema_name text, p_table_name text, p_column_names text[]) IS 'Get the columns of a table which are not synchronized with a clone, from the list of the synchronized columns. The uid, the primary key and the NOT NULL columns are always synchronized. Returns an empty array if the list is NULL. Parameters: schema name, table name, and synchronized columns';
+
+
+-- get_package_data_queries(text[], text, jsonb)
+CREATE FUNCTION lizsync.get_package_data_queries(p_tables text[], p_area text, p_columns jsonb) RETURNS TABLE(table_schema text, table_name text, number_rows bigint, data_query text, excluded_columns text[])
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    v_tables regclass[];
+    v_filtered regclass[];
+    v_projected regclass[];
+    v_columns text;
+    rec record;
+BEGIN
+    -- Tables of the package
+    SELECT array_agg(t::regclass)
+    INTO v_tables
+    FROM unnest(p_tables) AS t
+    ;
+
+    -- Rows kept for each filtered table
+    v_filtered := lizsync.fill_area_of_interest(v_tables, p_area);
+
+    -- Tables with only some of their columns sent to the clone
+    SELECT Coalesce(array_agg(t::regclass), ARRAY[]::regclass[])
+    INTO v_projected
+    FROM jsonb_object_keys(Coalesce(p_columns, '{}'::jsonb)) AS t
+    WHERE t::regclass = ANY (v_tables)
+    ;
+
+    -- Queries of the kept rows, with the columns dumped by pg_dump
+    FOR rec IN
+        SELECT c.oid::regclass AS rel, n.nspname::text AS schema_name, c.relname::text AS rel_name,
+        c.oid = ANY (v_filtered) AS is_filtered
+        FROM pg_catalog.pg_class AS c
+        INNER JOIN pg_catalog.pg_namespace AS n
+            ON n.oid = c.relnamespace
+        WHERE c.oid = ANY (v_filtered || v_projected)
+        ORDER BY n.nspname, c.relname
+    LOOP
+        table_schema := rec.schema_name;
+        table_name := rec.rel_name;
+
+        -- The excluded columns are kept in the clone, but empty
+        excluded_columns := lizsync.get_excluded_columns(
+            rec.schema_name, rec.rel_name,
+            (
+                SELECT array_agg(c.col)
+                FROM jsonb_each(p_columns) AS j
+                CROSS JOIN LATERAL jsonb_array_elements_text(j.value) AS c(col)
+                WHERE j.key::regclass = rec.rel
+            )
+        );
+
+        -- The generated columns are not dumped, since PostgreSQL 12
+        EXECUTE format('
+            SELECT string_agg(
+                CASE
+                    WHEN a.attname = ANY (%3$L::text[]) THEN ''NULL''
+                    ELSE quote_ident(a.attname)
+                END,
+                '', '' ORDER BY a.attnum
+            )
+            FROM pg_catalog.pg_attribute AS a
+            WHERE a.attrelid = %1$s
+            AND a.attnum > 0
+            AND NOT a.attisdropped
+            %2$s
+            ',
+            rec.rel::oid,
+            CASE
+                WHEN current_setting('server_version_num')::integer >= 120000
+                THEN 'AND a.attgenerated = '''''
+                ELSE ''
+            END,
+            excluded_columns
+        )
+        INTO v_columns;
+
+        IF rec.is_filtered THEN
+            SELECT count(*)
+            INTO number_rows
+            FROM temp_area_of_interest AS k
+            WHERE k.ident = rec.rel::text
+            ;
+            data_query := format(
+                'SELECT %1$s FROM %2$s AS t WHERE t.uid IN (SELECT k.uid FROM temp_area_of_interest AS k WHERE k.ident = %3$L)',
+                v_columns, rec.rel, rec.rel::text
+            );
+        ELSE
+            number_rows := NULL;
+            data_query := format(
+                'SELECT %1$s FROM %2$s AS t',
+                v_columns, rec.rel
+            );
+        END IF;
+        RETURN NEXT;
+    END LOOP;
+END;
+$_$;
+
+
+-- FUNCTION get_package_data_queries(p_tables text[], p_area text, p_columns jsonb)
+COMMENT ON FUNCTION lizsync.get_package_data_queries(p_tables text[], p_area text, p_columns jsonb) IS 'Return the query of the rows of each table of the package which must not be sent entirely to the clone. With an area of interest, the rows of the spatial tables intersecting the area are kept in the temporary table temp_area_of_interest by lizsync.fill_area_of_interest, with the rows of the other tables referencing them, and all the rows they reference through foreign keys. The tables without geometry column and not referencing a filtered table are not filtered. The columns not sent to the clone are returned as NULL. The queries must be run in the same transaction. Parameters: tables of the package, area as EWKT or NULL, and JSON object of the columns sent to the clone for each table, ex: {"\"schema\".\"table\"": ["uid", "name"]}';
+
+
+-- get_schema_fingerprint(text[])
+CREATE FUNCTION lizsync.get_schema_fingerprint(p_schema_names text[]) RETURNS text
+    LANGUAGE plpgsql STABLE
+    SET search_path TO 'pg_catalog'
+    AS $$
+DECLARE
+    p_fingerprint text;
+BEGIN
+    -- Definitions of the objects written by pg_dump --schema-only
+    -- The privileges and owners are not used, since the packages are dumped without them
+    WITH
+    ns AS (
+        SELECT n.oid, n.nspname
+        FROM pg_namespace AS n
+        WHERE n.nspname = ANY (p_schema_names)
+    ),
+    items AS (
+        -- Schemas
+        SELECT concat_ws(' ', 'schema', ns.nspname) AS item
+        FROM ns
+
+        UNION ALL
+
+        -- Tables, views, sequences and composite types, with their columns
+        SELECT concat_ws(' ',
+            'relation', ns.nspname, c.relname, c.relkind, c.relpersistence,
+            (
+                SELECT string_agg(
+                    concat_ws(' ',
+                        a.attname, format_type(a.atttypid, a.atttypmod),
+                        a.attnotnull, pg_get_expr(d.adbin, d.adrelid)
+                    ),
+                    ', ' ORDER BY a.attnum
+                )
+                FROM pg_attribute AS a
+                LEFT JOIN pg_attrdef AS d
+                    ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                WHERE a.attrelid = c.oid
+                AND a.attnum > 0
+                AND NOT a.attisdropped
+            ),
+            CASE WHEN c.relkind IN ('v', 'm') THEN pg_get_viewdef(c.oid) END
+        )
+        FROM pg_class AS c
+        INNER JOIN ns ON ns.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p', 'v', 'm', 'S', 'f', 'c')
+
+        UNION ALL
+
+        -- Sequences parameters
+        SELECT concat_ws(' ',
+            'sequence', ns.nspname, c.relname, s.seqtypid::regtype,
+            s.seqstart, s.seqincrement, s.seqmax, s.seqmin, s.seqcache, s.seqcycle
+        )
+        FROM pg_sequence AS s
+        INNER JOIN pg_class AS c ON c.oid = s.seqrelid
+        INNER JOIN ns ON ns.oid = c.relnamespace
+
+        UNION ALL
+
+        -- Constraints of the tables and domains
+        SELECT concat_ws(' ',
+            'constraint', ns.nspname, co.conname,
+            co.conrelid::regclass, co.contypid::regtype,
+            pg_get_constraintdef(co.oid)
+        )
+        FROM pg_constraint AS co
+        INNER JOIN ns ON ns.oid = co.connamespace
+
+        UNION ALL
+
+        -- Indexes
+        SELECT concat_ws(' ', 'index', pg_get_indexdef(i.indexrelid))
+        FROM pg_index AS i
+        INNER JOIN pg_class AS c ON c.oid = i.indexrelid
+        INNER JOIN ns ON ns.oid = c.relnamespace
+
+        UNION ALL
+
+        -- Triggers
+        SELECT concat_ws(' ', 'trigger', pg_get_triggerdef(t.oid))
+        FROM pg_trigger AS t
+        INNER JOIN pg_class AS c ON c.oid = t.tgrelid
+        INNER JOIN ns ON ns.oid = c.relnamespace
+        WHERE NOT t.tgisinternal
+
+        UNION ALL
+
+        -- Functions
+        SELECT concat_ws(' ',
+            'function', ns.nspname, p.proname,
+            pg_get_function_identity_arguments(p.oid), pg_get_function_result(p.oid),
+            p.prolang, p.provolatile, p.proisstrict, p.prosecdef, p.proconfig,
+            md5(p.prosrc)
+        )
+        FROM pg_proc AS p
+        INNER JOIN ns ON ns.oid = p.pronamespace
+
+        UNION ALL
+
+        -- Domains, enums and ranges
+        SELECT concat_ws(' ',
+            'type', ns.nspname, t.typname, t.typtype, t.typbasetype::regtype,
+            (
+                SELECT string_agg(e.enumlabel, ', ' ORDER BY e.enumsortorder)
+                FROM pg_enum AS e
+                WHERE e.enumtypid = t.oid
+            )
+        )
+        FROM pg_type AS t
+        INNER JOIN ns ON ns.oid = t.typnamespace
+        WHERE t.typtype IN ('d', 'e', 'r')
+
+        UNION ALL
+
+        -- Comments
+        SELECT concat_ws(' ',
+            'comment', pg_describe_object(d.classoid, d.objoid, d.objsubid),
+            d.description
+        )
+        FROM pg_description AS d,
+        pg_identify_object(d.classoid, d.objoid, d.objsubid) AS o
+        WHERE o.schema = ANY (p_schema_names)
+        OR (o.type = 'schema' AND o.identity = ANY (p_schema_names))
     )
-    -- create where clause with uid column
-    -- not with primary keys, to manage multi-way sync
-    , where_uid AS (
-        SELECT '"' || puid_column || '" = ' || quote_literal(row_data->puid_column) AS where_clause
-        FROM event
+    SELECT md5(string_agg(item, E'\n' ORDER BY item COLLATE "C"))
+    INTO p_fingerprint
+    FROM items
+    ;
+
+    RETURN p_fingerprint;
+END;
+$$;
+
+
+-- FUNCTION get_schema_fingerprint(p_schema_names text[])
+COMMENT ON FUNCTION lizsync.get_schema_fingerprint(p_schema_names text[]) IS 'Get a hash of the structure of the given schemas, read from the catalog: tables, views, sequences, constraints, indexes, triggers, functions, types and comments. It is used to reuse the SQL files of the schemas dumped for a previous package if the structure has not changed. Parameters: schema names';
+
+
+-- get_subscription_audit_logs(uuid, bigint, bigint, text, text[])
+CREATE FUNCTION lizsync.get_subscription_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_uid_field text, p_excluded_columns text[]) RETURNS TABLE(event_id bigint, action_tstamp_tx timestamp with time zone, action_tstamp_epoch integer, ident text, action_type text, origine text, action text, updated_field text, uid uuid, original_action_tstamp_tx integer, action_data public.hstore)
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    filtered_relations text[];
+    filter_queries text;
+    area_relations text[];
+    area_condition text;
+    sqltemplate text;
+    sqltext text;
+    rec record;
+BEGIN
+    -- The attribute filters are evaluated on the rows before and after the modification,
+    -- read with the type of the table columns, with one query per filtered table
+    filtered_relations = ARRAY[]::text[];
+    filter_queries = '';
+    FOR rec IN
+        SELECT f.table_schema, f.table_name,
+        '(' || trim(f.attribute_filter) || ')' AS condition
+        FROM lizsync.subscription_filters AS f
+        WHERE f.server_id = p_clone_id
+        AND nullif(trim(f.attribute_filter), '') IS NOT NULL
+        AND to_regclass(format('%I.%I', f.table_schema, f.table_name)) IS NOT NULL
+        ORDER BY f.table_schema, f.table_name
+    LOOP
+        filtered_relations = filtered_relations || (quote_ident(rec.table_schema) || '.' || quote_ident(rec.table_name));
+        filter_queries = filter_queries || format('
+        UNION ALL
+        SELECT l.*,
+        l.action NOT IN (''U'', ''D'') OR (
+            SELECT Coalesce(%3$s, False)
+            FROM populate_record(NULL::%1$I.%2$I, l.row_data) AS t
+        ) AS in_old_filter,
+        l.action NOT IN (''I'', ''U'') OR (
+            SELECT Coalesce(%3$s, False)
+            FROM populate_record(NULL::%1$I.%2$I, l.row_data || Coalesce(l.changed_fields, '''')) AS t
+        ) AS in_new_filter
+        FROM logs AS l
+        WHERE l.schema_name = %1$L AND l.table_name = %2$L
+        ',
+            rec.table_schema, rec.table_name, rec.condition
+        );
+    END LOOP;
+
+    -- The rows of the area of interest are only computed if some rows
+    -- of the tables filtered by an area are inserted or updated between the given event ids.
+    -- They are stored in a temporary table, used by the rest of the transaction
+    area_condition = 'True';
+    SELECT array_agg(quote_ident(f.table_schema) || '.' || quote_ident(f.table_name))
+    INTO area_relations
+    FROM lizsync.subscription_filters AS f
+    WHERE f.server_id = p_clone_id
+    AND f.area IS NOT NULL
+    ;
+    IF EXISTS (
+        SELECT 1
+        FROM audit.logged_actions AS a
+        WHERE a.event_id > p_min_event_id
+        AND (p_max_event_id IS NULL OR a.event_id <= p_max_event_id)
+        AND a.action IN ('I', 'U')
+        AND (quote_ident(a.schema_name) || '.' || quote_ident(a.table_name)) = ANY (area_relations)
+    ) THEN
+        SELECT array_agg(quote_ident(r.table_schema) || '.' || quote_ident(r.table_name))
+        INTO area_relations
+        FROM lizsync.fill_subscription_area(p_clone_id) AS r
+        ;
+        area_condition = format('
+            NOT (quote_ident(a.schema_name) || ''.'' || quote_ident(a.table_name)) = ANY (%L::text[])
+            OR EXISTS (
+                SELECT 1
+                FROM temp_subscription_area AS k
+                WHERE k.ident = quote_ident(a.schema_name) || ''.'' || quote_ident(a.table_name)
+                AND k.uid = (a.row_data->$4)::uuid
+            )
+            ',
+            Coalesce(area_relations, ARRAY[]::text[])
+        );
+    END IF;
+
+    sqltemplate = '
+    WITH
+    rel AS (
+        -- Primary key fields and columns excluded from the logs, got once per audited relation
+        SELECT r.relation_name, array_agg(r.uid_column) AS pkey_fields,
+        lizsync.get_audit_excluded_columns(to_regclass(r.relation_name)) AS excluded_columns
+        FROM audit.logged_relations AS r
+        GROUP BY r.relation_name
+    ),
+    tables AS (
+        SELECT t.sync_tables
+        FROM lizsync.synchronized_tables AS t
+        WHERE t.server_id = $1
+        LIMIT 1
+    ),
+    filters AS (
+        -- Columns of the filtered tables
+        SELECT f.table_schema, f.table_name,
+        lizsync.get_excluded_columns(f.table_schema, f.table_name, f.column_names) AS excluded_columns
+        FROM lizsync.subscription_filters AS f
+        WHERE f.server_id = $1
+    ),
+    logs AS (
+        SELECT a.*
+        FROM audit.logged_actions AS a, tables
+
+        WHERE True
+
+        -- Event ID is bigger than the given minimum event id
+        AND a.event_id > $2
+
+        -- Event ID is not bigger than the given maximum event id, if given
+        AND ($3 IS NULL OR a.event_id <= $3)
+
+        -- modifications do not come from clone database
+        -- except the ones made before the deployment of an older package in the clone
+        AND (
+            a.sync_data->>''origin'' != $1::text OR a.sync_data->>''origin'' IS NULL
+            OR a.event_id <= (
+                SELECT c.catch_up_event_id
+                FROM lizsync.clone_cursors AS c
+                WHERE c.clone_id = $1
+            )
+        )
+
+        -- only for tables synchronized by the clone server ID
+        AND tables.sync_tables ? concat(''"'', a.schema_name, ''"."'', a.table_name, ''"'')
+    ),
+    filtered_logs AS (
+        -- Logs of the tables without attribute filter
+        SELECT l.*, True AS in_old_filter, True AS in_new_filter
+        FROM logs AS l
+        WHERE NOT (quote_ident(l.schema_name) || ''.'' || quote_ident(l.table_name)) = ANY (%1$L::text[])
+        %2$s
     )
-    SELECT INTO sql
+    SELECT
+        a.event_id,
+        a.action_tstamp_tx AS action_tstamp_tx,
+        extract(epoch from a.action_tstamp_tx)::integer AS action_tstamp_epoch,
+        concat(a.schema_name, ''.'', a.table_name) AS ident,
+        e.event_action AS action_type,
         CASE
-            WHEN action = 'I' THEN
-                'INSERT INTO "' || schema_name || '"."' || table_name || '"' ||
-                ' (' || (
-                    SELECT string_agg(
-                        '"' || key || '"',
-                        ','
-                    )
-                    FROM each(row_data)
-                    WHERE True
-                    AND key != ALL(pkey_fields)
-                    AND key != ALL(excluded_columns)
-                )
-                || ') VALUES ( ' ||
-                (
-                    SELECT string_agg(
-                        CASE WHEN value IS NULL THEN 'NULL' ELSE quote_literal(value) END,
-                        ','
-                    )
-                    FROM EACH(row_data)
-                    WHERE True
-                    AND key != ALL(pkey_fields)
-                    AND key != ALL(excluded_columns)
-                )
-                || ')'
+            WHEN a.sync_data->>''origin'' IS NULL THEN ''central''
+            ELSE ''clone''
+        END AS origine,
+        Coalesce(
+            lizsync.build_event_sql(
+                e.event_action, a.schema_name, a.table_name,
+                e.event_row,
+                -- only the field of this line for UPDATE
+                slice(a.changed_fields, ARRAY[s]),
+                rel.pkey_fields,
+                $4,
+                e.excluded_columns
+            ),
+            ''''
+        ) AS action,
+        s AS updated_field,
+        (a.row_data->$4)::uuid AS uid,
+        CASE
+            WHEN a.sync_data->>''action_tstamp_tx'' IS NOT NULL
+            AND a.sync_data->>''origin'' IS NOT NULL
+                THEN extract(epoch from Cast(a.sync_data->>''action_tstamp_tx'' AS TIMESTAMP WITH TIME ZONE))::integer
+            ELSE extract(epoch from a.action_tstamp_tx)::integer
+        END AS original_action_tstamp_tx,
+        -- Values to replay, without primary keys and excluded columns
+        CASE
+            WHEN e.event_action = ''I''
+                THEN (e.event_row - rel.pkey_fields) - e.excluded_columns
+            WHEN e.event_action = ''U''
+                THEN (slice(a.changed_fields, ARRAY[s]) - rel.pkey_fields) - e.excluded_columns
+        END AS action_data
+    FROM filtered_logs AS a
+    LEFT JOIN rel
+        ON rel.relation_name = quote_ident(a.schema_name) || ''.'' || quote_ident(a.table_name)
+    -- Rows before and after the modification matching the subscription of the clone
+    -- The rows of the tables filtered by the area must be in the area of interest after the modification
+    LEFT JOIN filters AS f
+        ON f.table_schema = a.schema_name AND f.table_name = a.table_name
+    CROSS JOIN LATERAL (
+        SELECT
+            a.in_old_filter AS in_old,
+            a.in_new_filter
+            AND (a.action NOT IN (''I'', ''U'') OR %3$s) AS in_new
+    ) AS sub
+    -- The rows moving into the subscription are inserted in the clone
+    -- and the rows moving out of the subscription are deleted from the clone
+    CROSS JOIN LATERAL (
+        SELECT
+            CASE
+                WHEN sub.in_old AND sub.in_new THEN a.action
+                WHEN a.action = ''U'' AND sub.in_new THEN ''I''
+                WHEN a.action = ''U'' AND sub.in_old THEN ''D''
+            END AS event_action,
+            CASE
+                WHEN a.action = ''U'' AND sub.in_new AND NOT sub.in_old
+                    THEN a.row_data || a.changed_fields
+                ELSE a.row_data
+            END AS event_row,
+            -- Columns not sent to any clone, not logged, and not sent to this clone
+            Coalesce($5, ''{}''::text[])
+            || Coalesce(rel.excluded_columns, ''{}''::text[])
+            || Coalesce(f.excluded_columns, ''{}''::text[]) AS excluded_columns
+    ) AS e
+    -- Create as many lines as there are changed fields in UPDATE
+    LEFT JOIN skeys(CASE WHEN e.event_action = ''U'' THEN a.changed_fields - e.excluded_columns END) AS s ON TRUE
 
-            WHEN action = 'D' THEN
-                'DELETE FROM "' || schema_name || '"."' || table_name || '"' ||
-                ' WHERE ' || where_clause
+    WHERE True
 
-            WHEN action = 'U' THEN
-                'UPDATE "' || schema_name || '"."' || table_name || '"' ||
-                ' SET ' || (
-                    SELECT string_agg(
-                        '"' || key || '"' || ' = ' ||
-                        CASE
-                            WHEN value IS NULL
-                                THEN 'NULL'
-                            ELSE quote_literal(value)
-                        END,
-                        ','
-                    ) FROM each(changed_fields)
-                    WHERE True
-                    AND key != ALL(pkey_fields)
-                    AND key != ALL(excluded_columns)
-                ) ||
-                ' WHERE ' || where_clause
-        END
-    FROM
-        event, where_pks, where_uid
+    -- Only the modifications of the rows matching the subscription of the clone
+    AND e.event_action IS NOT NULL
+
+    -- Only the updates of the columns sent to the clone
+    AND (e.event_action != ''U'' OR s IS NOT NULL)
+
+    ORDER BY a.event_id
+    ';
+
+    sqltext = format(sqltemplate,
+        filtered_relations,
+        filter_queries,
+        area_condition
+    );
+    RAISE DEBUG '%', sqltext;
+
+    RETURN QUERY
+    EXECUTE sqltext
+    USING p_clone_id, p_min_event_id, p_max_event_id, p_uid_field, p_excluded_columns;
+END;
+$_$;
+
+-- FUNCTION get_subscription_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_uid_field text, p_excluded_columns text[])
+COMMENT ON FUNCTION lizsync.get_subscription_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_uid_field text, p_excluded_columns text[]) IS 'Get the logs of the central database to replay in a clone: modifications with an event id higher than the given minimum event id and not higher than the given maximum event id, which do not come from the clone, except the ones made before the deployment of a package in the clone, and concern the synchronized tables for this clone and the rows and columns matching its subscription filters. The rows of the tables filtered by an area must be in the area of interest of the clone stored by lizsync.fill_subscription_area, with the rows linked to its features by foreign keys, only computed if some of these rows are inserted or updated. The attribute filters are evaluated on the rows of the logs read with the type of the table columns, in one query per filtered table. The rows moving into or out of the subscription filters are inserted in or deleted from the clone. The columns excluded from the audit triggers are not replayed. It is used by the synchronization and by the delta packages. Parameters: clone id, minimum event id (excluded), maximum event id (NULL for no limit), uid column name and columns excluded for all the tables';
+
+
+-- get_subscription_condition(uuid, text, text)
+CREATE FUNCTION lizsync.get_subscription_condition(p_clone_id uuid, p_schema_name text, p_table_name text) RETURNS text
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    v_attribute_filter text;
+    v_conditions text[];
+BEGIN
+    SELECT f.attribute_filter
+    INTO v_attribute_filter
+    FROM lizsync.subscription_filters AS f
+    WHERE f.server_id = p_clone_id
+    AND f.table_schema = p_schema_name
+    AND f.table_name = p_table_name
     ;
-    RETURN sql;
+
+    -- The rows of the area are the ones of the package of the clone,
+    -- linked to the features of the area by foreign keys.
+    -- They are read from the temporary table filled for the transaction
+    v_conditions := ARRAY[]::text[];
+    IF EXISTS (
+        SELECT 1
+        FROM lizsync.fill_subscription_area(p_clone_id) AS r
+        WHERE r.table_schema = p_schema_name
+        AND r.table_name = p_table_name
+    ) THEN
+        v_conditions := v_conditions || format(
+            '(EXISTS (SELECT 1 FROM temp_subscription_area AS k WHERE k.ident = %L AND k.uid = t.uid))',
+            quote_ident(p_schema_name) || '.' || quote_ident(p_table_name)
+        );
+    END IF;
+    IF nullif(trim(v_attribute_filter), '') IS NOT NULL THEN
+        v_conditions := v_conditions || ('(' || v_attribute_filter || ')');
+    END IF;
+
+    -- NULL if the table is not filtered
+    RETURN nullif(array_to_string(v_conditions, ' AND '), '');
 END;
 $$;
 
 
--- FUNCTION get_event_sql(pevent_id bigint, puid_column text, excluded_columns text[])
-COMMENT ON FUNCTION lizsync.get_event_sql(pevent_id bigint, puid_column text, excluded_columns text[]) IS '
-Get the SQL to use for replay from a audit log event
+-- FUNCTION get_subscription_condition(p_clone_id uuid, p_schema_name text, p_table_name text)
+COMMENT ON FUNCTION lizsync.get_subscription_condition(p_clone_id uuid, p_schema_name text, p_table_name text) IS 'Get the SQL condition of the subscription of a clone to a synchronized table, built from the area and the attribute filter of the table lizsync.subscription_filters, on the alias t. The rows of the area are read from the temporary table temp_subscription_area filled by lizsync.fill_subscription_area, so the condition must be used in the same transaction. It returns NULL if the table is not filtered for the clone. Parameters: clone id, schema name and table name';
 
-Arguments:
-   pevent_id:  The event_id of the event in audit.logged_actions to replay
-   puid_column: The name of the column with unique uuid values
-';
+
+-- get_table_hashes(text, text, text[], text, text[], integer)
+CREATE FUNCTION lizsync.get_table_hashes(p_schema_name text, p_table_name text, p_excluded_columns text[], p_condition text, p_prefixes text[], p_prefix_length integer) RETURNS TABLE(prefix text, row_count bigint, hash text)
+    LANGUAGE plpgsql STABLE
+    SET "TimeZone" TO 'UTC'
+    SET "DateStyle" TO 'ISO, YMD'
+    SET "IntervalStyle" TO 'postgres'
+    SET extra_float_digits TO '3'
+    SET bytea_output TO 'hex'
+    AS $_$
+DECLARE
+    sqltemplate text;
+    p_columns text;
+BEGIN
+    -- The columns are sorted by name, so that their order in the table does not matter
+    SELECT string_agg(format('t.%I', a.attname), ', ' ORDER BY a.attname)
+    INTO p_columns
+    FROM pg_catalog.pg_attribute AS a
+    WHERE a.attrelid = format('%I.%I', p_schema_name, p_table_name)::regclass
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    AND a.attname != ALL (Coalesce(p_excluded_columns, '{}'::text[]))
+    ;
+
+    -- The values are written with the same settings in each database.
+    -- The hash of each row is computed first, so that only the hashes
+    -- are sorted by uid to compute the hash of each block
+    sqltemplate = '
+    SELECT
+        r.prefix,
+        count(*) AS row_count,
+        md5(string_agg(r.hash, '''' ORDER BY r.uid)) AS hash
+    FROM (
+        SELECT
+            left(t.uid::text, %4$s) AS prefix,
+            t.uid,
+            md5(ROW(%3$s)::text) AS hash
+        FROM %1$I.%2$I AS t
+        WHERE (%6$s)
+        AND (
+            %5$L::text[] IS NULL
+            OR left(t.uid::text, Coalesce(length((%5$L::text[])[1]), 0)) = ANY (%5$L::text[])
+        )
+    ) AS r
+    GROUP BY r.prefix
+    ';
+
+    RETURN QUERY
+    EXECUTE format(sqltemplate,
+        p_schema_name,
+        p_table_name,
+        p_columns,
+        p_prefix_length,
+        p_prefixes,
+        Coalesce(p_condition, 'True')
+    );
+END;
+$_$;
+
+
+-- FUNCTION get_table_hashes(p_schema_name text, p_table_name text, p_excluded_columns text[], p_condition text, p_prefixes text[], p_prefix_length integer)
+COMMENT ON FUNCTION lizsync.get_table_hashes(p_schema_name text, p_table_name text, p_excluded_columns text[], p_condition text, p_prefixes text[], p_prefix_length integer) IS 'Get the hashes of the blocks of rows of a table, grouped by the first characters of their uid. It is run in the clone and in the central database by lizsync.get_different_uids, which only fetches the hashes from the central database. Parameters: schema name, table name, excluded columns, SQL condition of the rows to hash on the alias t (NULL for all the rows), uid prefixes of the rows to hash (NULL for all the rows), and length of the uid prefix of the blocks (36 for one block per row). It returns the uid prefix, the number of rows and the hash of each block';
 
 
 -- import_central_server_schemas()
@@ -724,18 +2542,425 @@ $$;
 COMMENT ON FUNCTION lizsync.import_central_server_schemas() IS 'Import synchronized schemas from the central database foreign server into central_XXX local schemas to the clone database. This allow to edit data of the central database from the clone.';
 
 
+-- merge_update_logs(text, text)
+CREATE FUNCTION lizsync.merge_update_logs(p_temporary_table text, p_uid_field text) RETURNS integer
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    sqltemplate text;
+    p_count integer;
+BEGIN
+    -- Merge the UPDATE logs of each object into its last UPDATE log
+    -- The fields are unique per object after lizsync.compact_audit_logs
+    sqltemplate = '
+    WITH
+    merged AS (
+        SELECT
+            t.ident, t.uid,
+            max(t.tid) AS tid,
+            hstore(array_agg(e.key), array_agg(e.value)) AS action_data
+        FROM %1$I AS t,
+        each(t.action_data) AS e
+        WHERE t.action_type = ''U''
+        GROUP BY t.ident, t.uid
+        HAVING count(DISTINCT t.tid) > 1
+    ),
+    updates AS (
+        UPDATE %1$I AS t
+        SET
+            action_data = m.action_data,
+            updated_field = NULL,
+            action = Coalesce(
+                lizsync.build_event_sql(
+                    ''U'',
+                    split_part(t.ident, ''.'', 1),
+                    substr(t.ident, strpos(t.ident, ''.'') + 1),
+                    hstore(%2$L, t.uid::text),
+                    m.action_data,
+                    ''{}''::text[],
+                    %2$L,
+                    NULL
+                ),
+                ''''
+            )
+        FROM merged AS m
+        WHERE t.tid = m.tid
+        RETURNING t.tid, t.ident, t.uid
+    ),
+    removed AS (
+        DELETE FROM %1$I AS t
+        USING updates AS u
+        WHERE True
+        AND t.action_type = ''U''
+        AND t.ident = u.ident
+        AND t.uid = u.uid
+        AND t.tid != u.tid
+        RETURNING t.tid
+    )
+    SELECT count(*) FROM removed
+    ';
+    EXECUTE format(sqltemplate, p_temporary_table, p_uid_field)
+    INTO p_count;
+
+    RETURN p_count;
+END;
+$_$;
+
+
+-- FUNCTION merge_update_logs(p_temporary_table text, p_uid_field text)
+COMMENT ON FUNCTION lizsync.merge_update_logs(p_temporary_table text, p_uid_field text) IS 'Merge the UPDATE logs of each object stored in a temporary audit table into one UPDATE of all the modified fields. It must be run after the conflicts analysis, which compares the modifications field by field. Parameters: temporary table name and uid column name. It returns the number of removed logs.';
+
+
+-- partition_audit_logs(bigint)
+CREATE FUNCTION lizsync.partition_audit_logs(p_partition_size bigint) RETURNS boolean
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    p_sequence_name text;
+    p_table_comment text;
+    p_to_event_id bigint;
+BEGIN
+    -- Nothing to do if the table is already partitioned
+    IF (
+        SELECT c.relkind = 'p'
+        FROM pg_catalog.pg_class AS c
+        WHERE c.oid = 'audit.logged_actions'::regclass
+    ) THEN
+        RETURN False;
+    END IF;
+    IF p_partition_size IS NULL OR p_partition_size < 1 THEN
+        RAISE EXCEPTION 'The partition size must be greater than 0';
+    END IF;
+
+    -- Lock the table to stop the audit triggers during the change
+    LOCK TABLE audit.logged_actions IN ACCESS EXCLUSIVE MODE;
+    p_sequence_name = pg_get_serial_sequence('audit.logged_actions', 'event_id');
+    p_table_comment = obj_description('audit.logged_actions'::regclass, 'pg_class');
+    SELECT Coalesce(max(event_id), 0) + 1 INTO p_to_event_id
+    FROM audit.logged_actions;
+
+    -- Rename the existing table, which becomes the first partition
+    ALTER TABLE audit.logged_actions RENAME TO logged_actions_p0;
+
+    -- Create the partitioned table, using the same event id sequence
+    CREATE TABLE audit.logged_actions (
+        LIKE audit.logged_actions_p0
+        INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+    )
+    PARTITION BY RANGE (event_id);
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY audit.logged_actions.event_id', p_sequence_name);
+    EXECUTE format('COMMENT ON TABLE audit.logged_actions IS %L', p_table_comment);
+    REVOKE ALL ON audit.logged_actions FROM public;
+
+    -- Attach the existing events. This needs a scan of the table
+    EXECUTE format(
+        'ALTER TABLE audit.logged_actions ATTACH PARTITION audit.logged_actions_p0 FOR VALUES FROM (MINVALUE) TO (%s)',
+        p_to_event_id
+    );
+
+    -- Create the partitions for the next events
+    PERFORM lizsync.create_audit_partition(p_to_event_id, NULL);
+    PERFORM lizsync.create_audit_partitions(p_partition_size);
+
+    RETURN True;
+END;
+$_$;
+
+
+-- FUNCTION partition_audit_logs(p_partition_size bigint)
+COMMENT ON FUNCTION lizsync.partition_audit_logs(p_partition_size bigint) IS 'Partition the table audit.logged_actions by range of event id. The existing table becomes the first partition, and the next partitions are created with the given number of events. Use it in the central database, before purging the audit logs with lizsync.purge_audit_logs. Parameters: number of events of each partition. It returns False if the table is already partitioned';
+
+
+-- purge_audit_logs(bigint, boolean, text)
+CREATE FUNCTION lizsync.purge_audit_logs(p_partition_size bigint, p_drop_partitions boolean, p_archive_directory text) RETURNS TABLE(partition_name text, from_event_id bigint, to_event_id bigint, archive_file text)
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    p_central_id text;
+    p_max_event_id bigint;
+    p_purged_from_event_id bigint;
+    p_purged_to_event_id bigint;
+    rec record;
+BEGIN
+    -- Get central server id
+    SELECT server_id::text INTO p_central_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+
+    -- Get the last event id replayed by all the clones
+    SELECT Coalesce(min(Coalesce(c.last_event_id, 0)), 0)
+    INTO p_max_event_id
+    FROM lizsync.synchronized_tables AS s
+    LEFT JOIN lizsync.clone_cursors AS c
+        ON c.clone_id = s.server_id;
+
+    -- Archive the partitions containing only replayed events
+    -- The server must be allowed to write in the directory
+    IF p_archive_directory IS NOT NULL THEN
+        FOR rec IN
+            SELECT p.partition_name
+            FROM lizsync.get_audit_partitions() AS p
+            WHERE p.to_event_id <= p_max_event_id + 1
+        LOOP
+            EXECUTE format(
+                'COPY audit.%I TO %L WITH (FORMAT csv, HEADER true)',
+                rec.partition_name,
+                concat(rtrim(p_archive_directory, '/'), '/', rec.partition_name, '.csv')
+            );
+        END LOOP;
+    END IF;
+
+    -- Detach and drop them
+    FOR rec IN
+        SELECT p.partition_name, p.from_event_id, p.to_event_id
+        FROM lizsync.get_audit_partitions() AS p
+        WHERE p.to_event_id <= p_max_event_id + 1
+        ORDER BY p.to_event_id
+    LOOP
+        EXECUTE format('ALTER TABLE audit.logged_actions DETACH PARTITION audit.%I', rec.partition_name);
+        IF p_drop_partitions THEN
+            EXECUTE format('DROP TABLE audit.%I', rec.partition_name);
+        END IF;
+        p_purged_from_event_id = Coalesce(p_purged_from_event_id, rec.from_event_id, 0);
+        p_purged_to_event_id = rec.to_event_id;
+
+        partition_name = rec.partition_name;
+        from_event_id = rec.from_event_id;
+        to_event_id = rec.to_event_id;
+        archive_file = NULL;
+        IF p_archive_directory IS NOT NULL THEN
+            archive_file = concat(rtrim(p_archive_directory, '/'), '/', rec.partition_name, '.csv');
+        END IF;
+        RETURN NEXT;
+    END LOOP;
+
+    -- Add an item in the history table. A package created before
+    -- cannot be deployed anymore, and a clone which has not replayed
+    -- the purged events must be deployed again
+    IF p_purged_to_event_id IS NOT NULL THEN
+        INSERT INTO lizsync.history (
+            server_from, min_event_id, max_event_id,
+            sync_type, sync_status
+        )
+        VALUES (
+            p_central_id, p_purged_from_event_id, p_purged_to_event_id - 1,
+            'purge', 'done'
+        );
+    END IF;
+
+    -- Create the partitions for the next events
+    PERFORM lizsync.create_audit_partitions(p_partition_size);
+
+    RETURN;
+END;
+$_$;
+
+
+-- FUNCTION purge_audit_logs(p_partition_size bigint, p_drop_partitions boolean, p_archive_directory text)
+COMMENT ON FUNCTION lizsync.purge_audit_logs(p_partition_size bigint, p_drop_partitions boolean, p_archive_directory text) IS 'Retention of the partitioned table audit.logged_actions in the central database: detach the partitions of events already replayed by all the clones, and create the partitions for the next events. Run it regularly, for example with a scheduled task. Parameters: number of events of each new partition, drop the detached partitions, directory of the server where the partitions are saved as CSV files before being detached (NULL to not archive them). It returns the detached partitions';
+
+
+-- repair_table(text, text, text)
+CREATE FUNCTION lizsync.repair_table(p_schema_name text, p_table_name text, p_source text) RETURNS TABLE(uid uuid, status text, repaired_server text)
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    pkeys text[];
+    excluded_columns text[];
+    rec record;
+    modified_uids uuid[];
+    central_sql text[];
+    clone_inserts uuid[];
+    central_inserts uuid[];
+    insert_sql text[];
+    p_ident text;
+    status_bool boolean;
+    p_clone_id text;
+    p_central_id text;
+    p_sync_id uuid;
+    dblink_connection_name text;
+    dblink_msg text;
+BEGIN
+    IF p_source IS NOT NULL AND p_source NOT IN ('central', 'clone') THEN
+        RAISE EXCEPTION 'The source of the values must be central, clone or NULL, not %', p_source;
+    END IF;
+
+    -- Get array of primary key field(s)
+    SELECT Coalesce(array_agg(uid_column), ARRAY[]::text[]) as pkey_fields
+    INTO pkeys
+    FROM audit.logged_relations r
+    WHERE relation_name = (quote_ident(p_schema_name) || '.' || quote_ident(p_table_name))
+    ;
+
+    -- The columns not sent to the clone are not copied
+    SELECT lizsync.get_excluded_columns(f.table_schema, f.table_name, f.column_names)
+    INTO excluded_columns
+    FROM lizsync.subscription_filters AS f
+    INNER JOIN lizsync.server_metadata AS m
+        ON m.server_id = f.server_id
+    WHERE f.table_schema = p_schema_name
+    AND f.table_name = p_table_name
+    LIMIT 1
+    ;
+
+    -- Rows modified in the clone since the last synchronization
+    SELECT array_agg(DISTINCT (a.row_data -> 'uid')::uuid)
+    INTO modified_uids
+    FROM audit.logged_actions AS a
+    WHERE a.schema_name = p_schema_name
+    AND a.table_name = p_table_name
+    ;
+
+    -- The repairs of the clone are stored as logs, applied at the end
+    p_ident = concat(p_schema_name, '.', p_table_name);
+    SELECT lizsync.create_temporary_table('temp_repair_audit', 'audit')
+    INTO status_bool;
+
+    -- Get the different rows, and the server to repair for each of them
+    -- Without a given source, the rows modified in the clone since
+    -- the last synchronization are copied to the central database,
+    -- and the other ones are copied from the central database
+    FOR rec IN
+        SELECT
+            d.uid, d.status,
+            CASE
+                WHEN p_source = 'central' THEN 'clone'
+                WHEN p_source = 'clone' THEN 'central'
+                WHEN d.uid = ANY (modified_uids) THEN 'central'
+                ELSE 'clone'
+            END AS repaired_server,
+            d.clone_table_values,
+            d.central_table_values
+        FROM lizsync.compare_tables(p_schema_name, p_table_name) AS d
+    LOOP
+        IF rec.repaired_server = 'clone' THEN
+            IF rec.status = 'not in table 1' THEN
+                clone_inserts = clone_inserts || rec.uid;
+            ELSIF rec.status = 'not in table 2' THEN
+                INSERT INTO temp_repair_audit (ident, action_type, uid)
+                VALUES (p_ident, 'D', rec.uid);
+            ELSE
+                INSERT INTO temp_repair_audit (ident, action_type, uid, action_data)
+                VALUES (p_ident, 'U', rec.uid, rec.central_table_values - pkeys);
+            END IF;
+        ELSE
+            IF rec.status = 'not in table 2' THEN
+                central_inserts = central_inserts || rec.uid;
+            ELSIF rec.status = 'not in table 1' THEN
+                central_sql = central_sql || lizsync.build_event_sql(
+                    'D', p_schema_name, p_table_name,
+                    public.hstore('uid', rec.uid::text), NULL,
+                    pkeys, 'uid', NULL
+                );
+            ELSE
+                central_sql = central_sql || lizsync.build_event_sql(
+                    'U', p_schema_name, p_table_name,
+                    public.hstore('uid', rec.uid::text), rec.clone_table_values,
+                    pkeys, 'uid', NULL
+                );
+            END IF;
+        END IF;
+
+        uid = rec.uid;
+        status = rec.status;
+        repaired_server = rec.repaired_server;
+        RETURN NEXT;
+    END LOOP;
+
+    -- The missing rows are inserted with all their values,
+    -- read from the central foreign table or from the clone table
+    IF clone_inserts IS NOT NULL THEN
+        EXECUTE format(
+            'INSERT INTO temp_repair_audit (ident, action_type, uid, action_data)
+            SELECT %3$L, ''I'', t.uid, (public.hstore(t) - %4$L::text[]) - %6$L::text[]
+            FROM "central_%1$s"."%2$s" AS t
+            WHERE t.uid = ANY (%5$L::uuid[])',
+            p_schema_name, p_table_name, p_ident, pkeys, clone_inserts,
+            Coalesce(excluded_columns, ARRAY[]::text[])
+        );
+    END IF;
+    IF central_inserts IS NOT NULL THEN
+        EXECUTE format(
+            'SELECT array_agg(lizsync.build_event_sql(''I'', %1$L, %2$L, public.hstore(t), NULL, %3$L, ''uid'', %5$L))
+            FROM "%1$s"."%2$s" AS t
+            WHERE t.uid = ANY (%4$L::uuid[])',
+            p_schema_name, p_table_name, pkeys, central_inserts, excluded_columns
+        )
+        INTO insert_sql;
+        central_sql = central_sql || insert_sql;
+    END IF;
+
+    -- Repair the central database in one transaction
+    -- The triggers are kept, so that the repaired rows are sent to the other clones.
+    -- As for the replayed clone logs, the audit logs are tagged with the origin of the clone,
+    -- so that they are not sent back to this clone
+    IF central_sql IS NOT NULL THEN
+        SELECT server_id::text INTO p_clone_id
+        FROM lizsync.server_metadata
+        LIMIT 1;
+        SELECT server_id::text INTO p_central_id
+        FROM central_lizsync.server_metadata
+        LIMIT 1;
+        p_sync_id = md5(random()::text || clock_timestamp()::text)::uuid;
+
+        dblink_connection_name = (md5(((random())::text || (clock_timestamp())::text)))::text;
+        SELECT dblink_connect(
+            dblink_connection_name,
+            'central_server'
+        )
+        INTO dblink_msg;
+
+        PERFORM dblink_exec(
+            dblink_connection_name,
+            concat(
+                format(
+                    'SELECT set_config(''lizsync.server_from'', %1$L, true), set_config(''lizsync.server_to'', %2$L, true), set_config(''lizsync.sync_id'', %3$L, true);',
+                    p_clone_id, p_central_id, p_sync_id
+                ),
+                array_to_string(central_sql, ';'),
+                format(
+                    ';INSERT INTO lizsync.history (sync_id, sync_time, server_from, server_to, sync_type, sync_status) VALUES (%1$L, now(), %2$L, ARRAY[%3$L], ''partial'', ''done'');',
+                    p_sync_id, p_clone_id, p_central_id
+                )
+            )
+        );
+
+        SELECT dblink_disconnect(dblink_connection_name)
+        INTO dblink_msg;
+    END IF;
+
+    -- Repair the clone database, with one query per action
+    -- We disable triggers to avoid adding rows to the local audit logged_actions table
+    IF EXISTS (SELECT 1 FROM temp_repair_audit) THEN
+        SET session_replication_role = replica;
+        PERFORM lizsync.apply_audit_logs('temp_repair_audit', 'uid');
+        SET session_replication_role = DEFAULT;
+    END IF;
+
+END;
+$_$;
+
+
+-- FUNCTION repair_table(p_schema_name text, p_table_name text, p_source text)
+COMMENT ON FUNCTION lizsync.repair_table(p_schema_name text, p_table_name text, p_source text) IS 'Repair the rows of a table which are different in the clone and in the central database, found with lizsync.compare_tables. Only these rows, and the columns sent to the clone, are copied, and the central rows not matching the subscription filters of the clone are neither copied to the clone nor deleted. In the clone, the repairs are applied with lizsync.apply_audit_logs, with one query per action, and the triggers are disabled, so that no audit log is created. In the central database, the rows are audited with the origin of the clone, as the replayed clone logs, so that they are sent to the other clones but not back to this clone. Parameters: schema name, table name, and source of the values: central, clone, or NULL to copy the rows modified in the clone since the last synchronization to the central database and the other rows from the central database. It returns the uid, the status given by lizsync.compare_tables and the repaired server of each row';
+
+
 -- replay_central_logs_to_clone(bigint[], bigint, bigint, timestamp with time zone)
 CREATE FUNCTION lizsync.replay_central_logs_to_clone(p_ids bigint[], p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) RETURNS TABLE(replay_count integer)
     LANGUAGE plpgsql
     AS $$
 DECLARE
-    sqltemplate text;
     p_central_id text;
     p_clone_id text;
     p_sync_id uuid;
-    rec record;
     p_counter integer;
 BEGIN
+    -- Get clone server id
+    SELECT server_id::text INTO p_clone_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+    -- RAISE NOTICE 'Clone server id = %', p_clone_id;
+
     -- Do the replay ONLY if there are ids to replay
     -- We do NOT want to insert a new lizsync.history item if p_ids IS NULL
     -- This means there were no changes in the central since last sync
@@ -749,12 +2974,6 @@ BEGIN
         LIMIT 1;
         -- RAISE NOTICE 'Central server id = %', p_central_id;
 
-        -- Get clone server id
-        SELECT server_id::text INTO p_clone_id
-        FROM lizsync.server_metadata
-        LIMIT 1;
-        -- RAISE NOTICE 'Clone server id = %', p_clone_id;
-
         -- Add item in CENTRAL history table
         INSERT INTO central_lizsync.history (
             sync_id, sync_time,
@@ -773,57 +2992,87 @@ BEGIN
         ;
         -- RAISE NOTICE 'SYNC ID = %', p_sync_id;
 
-        -- Replay SQL queries in clone db
+        -- Replay the logs in clone db, grouped by table
         -- We disable triggers to avoid adding more rows to the local audit logged_actions table
-        sqltemplate = '';
-        p_counter = 0;
-        sqltemplate = concat(sqltemplate, ' SET session_replication_role = replica;');
-        FOR rec IN
-            SELECT event_id, action
-            FROM temp_central_audit
-            ORDER BY tid
-        LOOP
-            p_counter = p_counter + 1;
-            -- RAISE NOTICE '%', rec.event_id;
-            sqltemplate = concat(sqltemplate, rec.action || ';');
-        END LOOP;
-        sqltemplate = concat(sqltemplate, ' SET session_replication_role = DEFAULT;');
-        -- RAISE NOTICE 'SQL TEMPLATE %', sqltemplate;
+        SET session_replication_role = replica;
+        SELECT lizsync.apply_audit_logs('temp_central_audit', 'uid')
+        INTO p_counter;
+        SET session_replication_role = DEFAULT;
         -- RAISE NOTICE 'p_counter %', p_counter;
 
-        --RAISE NOTICE '%', sqltemplate;
-        IF p_counter > 0 THEN
-            EXECUTE sqltemplate
-            ;
+    ELSE
+        p_counter = 0;
+        RAISE NOTICE 'No central logs since last sync';
+    END IF;
+
+    -- Move the clone cursor in the central database
+    -- To tell these actions have been replayed by this clone
+    -- A chunk can have no log to replay for this clone, but the cursor must still be moved
+    IF p_max_event_id IS NOT NULL THEN
+        UPDATE central_lizsync.clone_cursors
+        SET
+            last_event_id = p_max_event_id,
+            last_action_tstamp_tx = Coalesce(p_max_action_tstamp_tx, last_action_tstamp_tx),
+            last_sync_id = Coalesce(p_sync_id, last_sync_id),
+            last_sync_time = now()
+        WHERE clone_id = p_clone_id::uuid
+        ;
+        IF NOT FOUND THEN
+            INSERT INTO central_lizsync.clone_cursors (
+                clone_id, last_event_id, last_action_tstamp_tx,
+                last_sync_id, last_sync_time
+            )
+            VALUES (
+                p_clone_id::uuid, p_max_event_id, p_max_action_tstamp_tx,
+                p_sync_id, now()
+            );
         END IF;
 
-        -- Update central audit logged actions
-        -- To tell these actions have been replayed by this clone
-        UPDATE central_audit.logged_actions
-        SET sync_data = jsonb_set(
-            sync_data,
-            '{"replayed_by"}',
-            sync_data->'replayed_by' || jsonb_build_object(p_clone_id, p_sync_id),
-            true
+        -- Also store the cursor in the clone, in the same transaction as the replay
+        -- If the clone transaction fails after the commit of the central cursor,
+        -- the next synchronization starts from the clone cursor
+        INSERT INTO lizsync.clone_cursors AS c (
+            clone_id, last_event_id, last_action_tstamp_tx,
+            last_sync_id, last_sync_time
+        )
+        VALUES (
+            p_clone_id::uuid, p_max_event_id, p_max_action_tstamp_tx,
+            p_sync_id, now()
         )
-        WHERE event_id = ANY (p_ids)
+        ON CONFLICT ON CONSTRAINT clone_cursors_pkey
+        DO UPDATE
+        SET
+            last_event_id = EXCLUDED.last_event_id,
+            last_action_tstamp_tx = Coalesce(EXCLUDED.last_action_tstamp_tx, c.last_action_tstamp_tx),
+            last_sync_id = Coalesce(EXCLUDED.last_sync_id, c.last_sync_id),
+            last_sync_time = EXCLUDED.last_sync_time
         ;
+    ELSE
+        -- The clone cursor is ahead of the central cursor
+        -- if a delta package has been replayed without connection to the central database
+        UPDATE central_lizsync.clone_cursors AS c
+        SET
+            last_event_id = l.last_event_id,
+            last_action_tstamp_tx = l.last_action_tstamp_tx,
+            last_sync_id = l.last_sync_id,
+            last_sync_time = l.last_sync_time
+        FROM lizsync.clone_cursors AS l
+        WHERE l.clone_id = p_clone_id::uuid
+        AND c.clone_id = l.clone_id
+        AND c.last_event_id < l.last_event_id
+        ;
+    END IF;
 
-        -- Modify central server synchronization item central->clone
-        -- to mark it as 'done'
+    -- Modify central server synchronization item central->clone
+    -- to mark it as 'done'
+    IF p_sync_id IS NOT NULL THEN
         UPDATE central_lizsync.history
         SET sync_status = 'done'
         WHERE True
         AND sync_id = p_sync_id
         ;
-
-    ELSE
-        p_counter = 0;
-        RAISE NOTICE 'No central logs since last sync';
     END IF;
 
-
-
     -- Sync done !
     RETURN QUERY
     SELECT p_counter;
@@ -832,76 +3081,45 @@ $$;
 
 
 -- FUNCTION replay_central_logs_to_clone(p_ids bigint[], p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone)
-COMMENT ON FUNCTION lizsync.replay_central_logs_to_clone(p_ids bigint[], p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) IS 'Replay the central logs in the clone database, then modifiy the corresponding audit logs in the central server to update the sync_data column. A new item is also created in the central server lizsync.history table. When running the log queries, we disable triggers in the clone to avoid adding more rows to the local audit logged_actions table';
+COMMENT ON FUNCTION lizsync.replay_central_logs_to_clone(p_ids bigint[], p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) IS 'Replay the central logs in the clone database with lizsync.apply_audit_logs, then move the clone cursor to the given maximum event id, even if the last central logs are not synchronized with this clone, in the central server lizsync.clone_cursors table and in the clone. Without central logs to replay, the central cursor is moved to the clone cursor if it is ahead, after the replay of a delta package. A new item is also created in the central server lizsync.history table. When running the log queries, we disable triggers in the clone to avoid adding more rows to the local audit logged_actions table';
 
 
--- replay_clone_logs_to_central()
-CREATE FUNCTION lizsync.replay_clone_logs_to_central() RETURNS TABLE(replay_count integer)
+-- replay_clone_logs_to_central(bigint)
+CREATE FUNCTION lizsync.replay_clone_logs_to_central(p_max_event_id bigint) RETURNS TABLE(replay_count integer)
     LANGUAGE plpgsql
     AS $_$
 DECLARE
     sqltemplate text;
-    sqlsession text;
-    sqlupdatelogs text;
-    p_central_id text;
     p_clone_id text;
+    p_logs jsonb;
     p_sync_id uuid;
-    rec record;
     p_counter integer;
     dblink_connection_name text;
     dblink_msg text;
 BEGIN
     -- Get the total number of logs to replay
-    SELECT count(*) AS nb
+    -- and build the batch sent to the central server
+    SELECT
+        count(*) AS nb,
+        jsonb_agg(
+            jsonb_build_object(
+                'action', trim(action),
+                'action_tstamp_tx', action_tstamp_tx
+            )
+            ORDER BY tid
+        )
     FROM temp_clone_audit
-    INTO p_counter;
+    INTO p_counter, p_logs;
     -- RAISE NOTICE 'p_counter %', p_counter;
 
     -- If there are some logs, process them
-    IF p_counter > 0 THEN
-
-        -- Get central server id
-        SELECT server_id::text INTO p_central_id
-        FROM central_lizsync.server_metadata
-        LIMIT 1;
-        -- RAISE NOTICE 'central id %', p_central_id;
-
-        -- Get clone server id
-        SELECT server_id::text INTO p_clone_id
-        FROM lizsync.server_metadata
-        LIMIT 1;
-        -- RAISE NOTICE 'clone id %', p_clone_id;
-
-        -- Add a new item in the central history table
-        INSERT INTO central_lizsync.history (
-            sync_id, sync_time,
-            server_from, server_to,
-            min_event_id, max_event_id, max_action_tstamp_tx,
-            sync_type, sync_status
-        )
-        VALUES (
-            md5(random()::text || clock_timestamp()::text)::uuid, now(),
-            p_clone_id, ARRAY[p_central_id],
-            NULL, NULL, NULL,
-            'partial', 'pending'
-        )
-        RETURNING sync_id
-        INTO p_sync_id
-        ;
-        -- RAISE NOTICE 'sync id %', p_sync_id;
-
-        -- Replay SQL queries in central db
-        -- The session variables are used by the central server audit function
-        -- to fill the sync_data field
-        -- do not break line in sqlsession to avoid bugs
-        sqlsession = format('SET SESSION "lizsync.server_from" = ''%1$s''; SET SESSION "lizsync.server_to" = ''%2$s''; SET SESSION "lizsync.sync_id" = ''%3$s'';',
-            p_clone_id,
-            p_central_id,
-            p_sync_id
-        );
+    IF p_counter > 0 THEN
 
-        -- Store SQL query to update central logs afterward with original log timestamp
-        sqlupdatelogs = '';
+        -- Get clone server id
+        SELECT server_id::text INTO p_clone_id
+        FROM lizsync.server_metadata
+        LIMIT 1;
+        -- RAISE NOTICE 'clone id %', p_clone_id;
 
         -- Create dblink connection
         dblink_connection_name = (md5(((random())::text || (clock_timestamp())::text)))::text;
@@ -912,74 +3130,37 @@ BEGIN
         )
         INTO dblink_msg;
 
-        -- Loop through logs and replay action
-        -- We need to query one by one to be able
-        -- to update the sync_data->action_tstamp_tx afterwards
-        -- by searching action = sqltemplate
-        FOR rec IN
-            SELECT *
-            FROM temp_clone_audit
-            ORDER BY tid
-        LOOP
-            -- Run the query in the central database via dblink
-            sqltemplate = sqlsession || trim(rec.action) || ';';
-            SELECT dblink_exec(
-                dblink_connection_name,
-                sqltemplate
-            )
-            INTO dblink_msg;
-
-            -- Concatenate action in sqlupdatelogs
-            sqltemplate = trim(quote_literal(sqltemplate), '''');
-            sqlupdatelogs = concat(
-                sqlupdatelogs,
-                format('
-                    UPDATE audit.logged_actions
-                    SET sync_data = sync_data || jsonb_build_object(
-                        ''action_tstamp_tx'',
-                        Cast(''%1$s'' AS TIMESTAMP WITH TIME ZONE)
-                    )
-                    WHERE True
-                    AND sync_data->''replayed_by''->>''%2$s'' = ''%3$s''
-                    AND client_query = ''%4$s''
-                    AND action = ''%5$s''
-                    AND concat(schema_name, ''.'', table_name) = ''%6$s''
-                    ;',
-                    rec.action_tstamp_tx,
-                    p_central_id,
-                    p_sync_id,
-                    sqltemplate,
-                    rec.action_type,
-                    rec.ident
-                )
-            );
-
-        END LOOP;
-
-        -- Update central audit.logged_actions
-        SELECT dblink_exec(
+        -- Replay all the logs in the central database with only one query
+        -- The central function runs the actions in the same order
+        -- and keeps the original timestamp of each action in the central logs
+        -- It also stores the maximum event id, to ignore the logs if they are sent again
+        sqltemplate = format(
+            'SELECT sync_id, replay_count FROM lizsync.apply_clone_logs(%1$s, %2$s::jsonb, %3$s)',
+            quote_literal(p_clone_id),
+            quote_literal(p_logs::text),
+            p_max_event_id
+        );
+        SELECT t.sync_id
+        FROM dblink(
             dblink_connection_name,
-            sqlupdatelogs
-        )
-        INTO dblink_msg;
+            sqltemplate
+        ) AS t(sync_id uuid, replay_count integer)
+        INTO p_sync_id;
+        -- RAISE NOTICE 'sync id %', p_sync_id;
 
         -- Disconnect dblink
         SELECT dblink_disconnect(dblink_connection_name)
         INTO dblink_msg;
 
-        -- Update central history table item
-        UPDATE central_lizsync.history
-        SET sync_status = 'done'
-        WHERE True
-        AND sync_id = p_sync_id
-        ;
-
     END IF;
 
 
-    -- Remove logs from clone audit table
-    TRUNCATE audit.logged_actions
-    RESTART IDENTITY;
+    -- Remove the replayed logs from clone audit table
+    -- The event ids must keep growing, since the central server
+    -- stores the last replayed one
+    DELETE FROM audit.logged_actions
+    WHERE event_id <= p_max_event_id
+    ;
 
     -- Return
     RETURN QUERY
@@ -988,8 +3169,119 @@ END;
 $_$;
 
 
--- FUNCTION replay_clone_logs_to_central()
-COMMENT ON FUNCTION lizsync.replay_clone_logs_to_central() IS 'Replay all logs from the clone to the central database. It returns the number of actions replayed. After this, the clone audit logs are truncated.';
+-- FUNCTION replay_clone_logs_to_central(p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.replay_clone_logs_to_central(p_max_event_id bigint) IS 'Replay all logs from the clone to the central database. The logs are sent in one batch to the central function lizsync.apply_clone_logs, with the maximum clone event id of the logs. It returns the number of actions replayed. After this, the clone audit logs up to this event id are deleted.';
+
+
+-- replay_delta_audit_logs(uuid, bigint, bigint, timestamp with time zone)
+CREATE FUNCTION lizsync.replay_delta_audit_logs(p_sync_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) RETURNS TABLE(number_replayed_to_clone integer, number_conflicts integer)
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    p_clone_id text;
+    p_local_event_id bigint;
+    p_max_clone_event_id bigint;
+    p_number_replayed_to_clone integer;
+    p_number_conflicts integer;
+    status_bool boolean;
+BEGIN
+    -- Get clone server id
+    SELECT server_id::text INTO p_clone_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+
+    -- The delta package must follow the last central event replayed in the clone
+    SELECT c.last_event_id INTO p_local_event_id
+    FROM lizsync.clone_cursors AS c
+    WHERE c.clone_id = p_clone_id::uuid;
+
+    IF p_local_event_id IS NULL THEN
+        RAISE EXCEPTION 'No synchronization cursor has been found in the clone. Synchronize the clone or deploy a package before applying a delta package';
+    END IF;
+    IF p_local_event_id >= p_max_event_id THEN
+        RAISE EXCEPTION 'The central logs of this delta package have already been replayed in the clone up to the event %', p_local_event_id;
+    END IF;
+    IF p_local_event_id != p_min_event_id THEN
+        RAISE EXCEPTION 'This delta package follows the central event % but the clone has replayed the central logs up to the event %. Create a delta package from the last synchronization of the clone', p_min_event_id, p_local_event_id;
+    END IF;
+
+    -- The central logs have been stored in the temporary table temp_central_audit
+    -- Create the other temporary tables
+    SELECT lizsync.create_temporary_table('temp_clone_audit', 'audit')
+    INTO status_bool;
+    SELECT lizsync.create_temporary_table('temp_conflicts', 'conflict')
+    INTO status_bool;
+
+    -- Get the modifications made in the clone
+    -- They are kept for the next synchronization with the central database
+    SELECT max(event_id)
+    FROM audit.logged_actions
+    INTO p_max_clone_event_id
+    ;
+    INSERT INTO temp_clone_audit
+    (
+        event_id, action_tstamp_tx, action_tstamp_epoch,
+        ident, action_type, origine, action, updated_field,
+        uid, original_action_tstamp_tx, action_data
+    )
+    SELECT
+        event_id, action_tstamp_tx, action_tstamp_epoch,
+        ident, action_type, origine, action, updated_field,
+        uid, action_tstamp_epoch, action_data
+    FROM lizsync.get_clone_audit_logs('uid', NULL, p_max_clone_event_id)
+    ;
+
+    -- Analyse logs
+    -- find conflicts, useless logs, and remove them from temp tables
+    -- The rejected clone modifications are removed from the clone audit log
+    PERFORM lizsync.analyse_audit_logs();
+
+    -- Replay the central logs in the clone
+    -- We disable triggers to avoid adding more rows to the local audit logged_actions table
+    SET session_replication_role = replica;
+    SELECT lizsync.apply_audit_logs('temp_central_audit', 'uid')
+    INTO p_number_replayed_to_clone;
+    SET session_replication_role = DEFAULT;
+
+    -- Store the conflicts in the clone
+    -- The central database cannot be reached
+    INSERT INTO lizsync.conflicts
+    ( "object_table", "object_uid",
+    "clone_id",
+    "central_event_id", "central_event_timestamp",
+    "central_sql", "clone_sql",
+    "rejected", "rule_applied"
+    )
+    SELECT
+        c.object_table, c.object_uid,
+        p_clone_id::uuid,
+        c.central_event_id, c.central_event_timestamp,
+        c.central_sql, c.clone_sql,
+        c.rejected, c.rule_applied
+    FROM temp_conflicts AS c
+    ORDER BY tid
+    ;
+    GET DIAGNOSTICS p_number_conflicts = ROW_COUNT;
+
+    -- Move the clone cursor to the end of the delta package
+    -- The next synchronization starts from this cursor
+    UPDATE lizsync.clone_cursors
+    SET
+        last_event_id = p_max_event_id,
+        last_action_tstamp_tx = Coalesce(p_max_action_tstamp_tx, last_action_tstamp_tx),
+        last_sync_id = p_sync_id,
+        last_sync_time = now()
+    WHERE clone_id = p_clone_id::uuid
+    ;
+
+    RETURN QUERY
+    SELECT p_number_replayed_to_clone, p_number_conflicts;
+END;
+$$;
+
+
+-- FUNCTION replay_delta_audit_logs(p_sync_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone)
+COMMENT ON FUNCTION lizsync.replay_delta_audit_logs(p_sync_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) IS 'Replay in the clone the central logs of a delta package, without connection to the central database. The logs must have been stored in the temporary table temp_central_audit. The delta package must follow the last central event replayed in the clone. The conflicts with the clone modifications are resolved as during a synchronization, and stored in the clone lizsync.conflicts table. The clone cursor is moved to the maximum event id of the package. Parameters: synchronization id of the package, minimum event id (excluded), maximum event id and maximum action timestamp of the package';
 
 
 -- store_conflicts()
@@ -1047,7 +3339,7 @@ COMMENT ON FUNCTION lizsync.store_conflicts() IS 'Store resolved conflicts in th
 -- synchronize()
 CREATE FUNCTION lizsync.synchronize() RETURNS TABLE(number_replayed_to_central integer, number_replayed_to_clone integer, number_conflicts integer)
     LANGUAGE plpgsql
-    AS $$
+    AS $_$
 DECLARE
     sqltemplate text;
     p_clone_id text;
@@ -1058,9 +3350,15 @@ DECLARE
     p_min_event_id bigint;
     p_max_event_id bigint;
     p_max_action_tstamp_tx timestamp with time zone;
+    p_last_clone_event_id bigint;
+    p_max_clone_event_id bigint;
+    p_scanned_max_event_id bigint;
     p_number_replayed_to_central integer;
     p_number_replayed_to_clone integer;
     p_number_conflicts integer;
+    p_number_area_rows integer;
+    p_modified_tables text[];
+    p_update_area boolean;
     status_bool boolean;
     status_msg text;
     t timestamptz := clock_timestamp();
@@ -1080,6 +3378,24 @@ BEGIN
     INTO status_bool;
     RAISE NOTICE 'Create temporary tables: %', clock_timestamp() - t;
 
+    -- Remove the clone logs already replayed in the central database
+    -- by a synchronization interrupted before its end
+    -- Also get the maximum central event id: the central logs are read up to this event
+    SELECT last_clone_event_id, next_max_event_id
+    FROM lizsync.get_clone_cursor(NULL)
+    INTO p_last_clone_event_id, p_scanned_max_event_id
+    ;
+    DELETE FROM audit.logged_actions
+    WHERE event_id <= p_last_clone_event_id
+    ;
+
+    -- Get the maximum clone event id
+    -- The clone modifications made during the synchronization are kept for the next one
+    SELECT max(event_id)
+    FROM audit.logged_actions
+    INTO p_max_clone_event_id
+    ;
+
     -- Get audit logs and store them in temporary tables
     -- central
     RAISE NOTICE 'Get modifications from central audit table...';
@@ -1088,12 +3404,13 @@ BEGIN
     (
         event_id, action_tstamp_tx, action_tstamp_epoch,
         ident, action_type, origine, action, updated_field,
-        uid, original_action_tstamp_tx
+        uid, original_action_tstamp_tx, action_data
     )
     SELECT
         *
-    FROM lizsync.get_central_audit_logs(''uid'', NULL)
+    FROM lizsync.get_central_audit_logs(''uid'', NULL, $1)
     '
+    USING p_scanned_max_event_id
     ;
     RAISE NOTICE 'Get modifications from central audit table: %', clock_timestamp() - t;
 
@@ -1104,16 +3421,28 @@ BEGIN
     (
         event_id, action_tstamp_tx, action_tstamp_epoch,
         ident, action_type, origine, action, updated_field,
-        uid, original_action_tstamp_tx
+        uid, original_action_tstamp_tx, action_data
     )
     SELECT
-        *,
-        action_tstamp_epoch
-    FROM lizsync.get_clone_audit_logs(''uid'', NULL)
+        event_id, action_tstamp_tx, action_tstamp_epoch,
+        ident, action_type, origine, action, updated_field,
+        uid, action_tstamp_epoch, action_data
+    FROM lizsync.get_clone_audit_logs(''uid'', NULL, $1)
     '
+    USING p_max_clone_event_id
     ;
     RAISE NOTICE 'Get modifications from clone audit table: %', clock_timestamp() - t;
 
+    -- Tables modified by the logs, before the analysis removes some of them
+    SELECT array_agg(ident)
+    INTO p_modified_tables
+    FROM (
+        SELECT ident FROM temp_central_audit
+        UNION
+        SELECT ident FROM temp_clone_audit
+    ) AS l
+    ;
+
     -- Analyse logs
     -- find conflicts, useless logs, and remove them from temp tables
     RAISE NOTICE 'Analyse modifications and manage conflicts...';
@@ -1124,24 +3453,67 @@ BEGIN
     RAISE NOTICE 'Analyse modifications and manage conflicts: %', clock_timestamp() - t;
 
     -- Replay logs
+    -- clone -> central
+    -- It must be done first: the central server commits the replayed clone logs
+    -- in its own transaction, and updates the lizsync.clone_cursors row
+    -- which is then modified by the clone transaction
+    RAISE NOTICE 'Replay modification from clone to central server...';
+    SELECT lizsync.replay_clone_logs_to_central(p_max_clone_event_id)
+    INTO p_number_replayed_to_clone
+    ;
+    RAISE NOTICE 'Replay modification from clone to central server: %', clock_timestamp() - t;
+
     -- central -> clone
+    -- The cursor is moved to the last central event read,
+    -- even if the last central logs are not synchronized with this clone
     RAISE NOTICE 'Replay modification from central server to clone...';
     SELECT lizsync.replay_central_logs_to_clone(
         p_ids,
         p_min_event_id,
-        p_max_event_id,
+        GREATEST(p_scanned_max_event_id, p_max_event_id),
         p_max_action_tstamp_tx
     )
     INTO p_number_replayed_to_central
     ;
     RAISE NOTICE 'Replay modification from central server to clone: %', clock_timestamp() - t;
 
-    -- clone -> central
-    RAISE NOTICE 'Replay modification from clone to central server...';
-    SELECT lizsync.replay_clone_logs_to_central()
-    INTO p_number_replayed_to_clone
+    -- Rows entering or leaving the area of interest of the clone
+    -- without modification of their own
+    -- They can only change if the logs modify the tables filtered by an area,
+    -- or if the area differs from the one stored in the clone by the last update.
+    -- The central tables are read after the replay of the clone logs
+    SELECT server_id::text INTO p_clone_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+    SELECT EXISTS (
+        SELECT 1
+        FROM (
+            SELECT f.table_schema, f.table_name, f.area
+            FROM central_lizsync.subscription_filters AS f
+            WHERE f.server_id = p_clone_id::uuid
+        ) AS f
+        FULL JOIN (
+            SELECT l.table_schema, l.table_name, l.area
+            FROM lizsync.subscription_filters AS l
+            WHERE l.server_id = p_clone_id::uuid
+        ) AS l
+            ON l.table_schema = f.table_schema
+            AND l.table_name = f.table_name
+        WHERE f.area IS DISTINCT FROM l.area
+        OR (
+            f.area IS NOT NULL
+            AND concat(f.table_schema, '.', f.table_name) = ANY (p_modified_tables)
+        )
+    )
+    INTO p_update_area
     ;
-    RAISE NOTICE 'Replay modification from clone to central server: %', clock_timestamp() - t;
+    IF p_update_area THEN
+        RAISE NOTICE 'Update the rows of the area of interest...';
+        SELECT lizsync.update_area_of_interest()
+        INTO p_number_area_rows
+        ;
+        RAISE NOTICE 'Update the rows of the area of interest: % rows, %', p_number_area_rows, clock_timestamp() - t;
+    END IF;
 
     -- Store conflicts
     RAISE NOTICE 'Store conflicts in the central server...';
@@ -1149,12 +3521,8 @@ BEGIN
     INTO p_number_conflicts;
     RAISE NOTICE 'Store conflicts in the central server: %', clock_timestamp() - t;
 
-    -- Drop temporary tables
-    RAISE NOTICE 'Drop temporary tables...';
-    EXECUTE 'DROP TABLE IF EXISTS ' || quote_ident(temp_central_audit_table);
-    EXECUTE 'DROP TABLE IF EXISTS ' || quote_ident(temp_clone_audit_table)  ;
-    EXECUTE 'DROP TABLE IF EXISTS ' || quote_ident(temp_conflicts_table)    ;
-    RAISE NOTICE 'Drop temporary tables: %', clock_timestamp() - t;
+    -- The temporary tables are emptied at the end of the transaction
+    -- and kept for the next synchronization of the session
 
     -- Return
     RETURN QUERY
@@ -1164,13 +3532,369 @@ BEGIN
         p_number_conflicts
     ;
 END;
-$$;
+$_$;
 
 
 -- FUNCTION synchronize()
 COMMENT ON FUNCTION lizsync.synchronize() IS 'Run the bi-directionnal database synchronization between the clone and the central server';
 
 
+-- synchronize_chunk(integer)
+CREATE FUNCTION lizsync.synchronize_chunk(p_batch_size integer) RETURNS TABLE(number_replayed_to_central integer, number_replayed_to_clone integer, number_conflicts integer, is_complete boolean)
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    temp_central_audit_table text;
+    temp_clone_audit_table text;
+    temp_conflicts_table text;
+    p_ids bigint[];
+    p_min_event_id bigint;
+    p_max_event_id bigint;
+    p_max_action_tstamp_tx timestamp with time zone;
+    p_last_clone_event_id bigint;
+    p_chunk_max_event_id bigint;
+    p_number_replayed_to_central integer;
+    p_number_replayed_to_clone integer;
+    p_number_conflicts integer;
+    p_is_complete boolean;
+    status_bool boolean;
+BEGIN
+
+    IF p_batch_size IS NULL OR p_batch_size < 1 THEN
+        RAISE EXCEPTION 'The batch size must be a positive integer: %', p_batch_size;
+    END IF;
+
+    temp_central_audit_table = 'temp_central_audit';
+    temp_clone_audit_table = 'temp_clone_audit';
+    temp_conflicts_table = 'temp_conflicts';
+
+    -- Create temporary tables
+    SELECT lizsync.create_temporary_table(temp_central_audit_table, 'audit')
+    INTO status_bool;
+    SELECT lizsync.create_temporary_table(temp_clone_audit_table, 'audit')
+    INTO status_bool;
+    SELECT lizsync.create_temporary_table(temp_conflicts_table, 'conflict')
+    INTO status_bool;
+
+    -- Get the clone cursor and the maximum event id of the next central chunk
+    SELECT last_clone_event_id, next_max_event_id
+    FROM lizsync.get_clone_cursor(p_batch_size)
+    INTO p_last_clone_event_id, p_chunk_max_event_id
+    ;
+
+    -- Remove the clone logs already replayed in the central database
+    -- by a synchronization interrupted before its end
+    DELETE FROM audit.logged_actions
+    WHERE event_id <= p_last_clone_event_id
+    ;
+
+    p_number_replayed_to_central = 0;
+    p_number_replayed_to_clone = 0;
+    p_is_complete = False;
+
+    IF p_chunk_max_event_id IS NOT NULL THEN
+        -- central -> clone
+        -- All the central logs are replayed before the clone logs
+        RAISE NOTICE 'Replay the central logs up to the event %', p_chunk_max_event_id;
+        EXECUTE '
+        INSERT INTO ' || quote_ident(temp_central_audit_table) || '
+        (
+            event_id, action_tstamp_tx, action_tstamp_epoch,
+            ident, action_type, origine, action, updated_field,
+            uid, original_action_tstamp_tx, action_data
+        )
+        SELECT
+            *
+        FROM lizsync.get_central_audit_logs(''uid'', NULL, $1)
+        '
+        USING p_chunk_max_event_id
+        ;
+
+        -- The clone logs of the same objects are only used to find the conflicts
+        EXECUTE '
+        INSERT INTO ' || quote_ident(temp_clone_audit_table) || '
+        (
+            event_id, action_tstamp_tx, action_tstamp_epoch,
+            ident, action_type, origine, action, updated_field,
+            uid, original_action_tstamp_tx, action_data
+        )
+        SELECT
+            l.event_id, l.action_tstamp_tx, l.action_tstamp_epoch,
+            l.ident, l.action_type, l.origine, l.action, l.updated_field,
+            l.uid, l.action_tstamp_epoch, l.action_data
+        FROM lizsync.get_clone_audit_logs(''uid'', NULL, NULL) AS l
+        WHERE EXISTS (
+            SELECT 1
+            FROM ' || quote_ident(temp_central_audit_table) || ' AS c
+            WHERE c.ident = l.ident AND c.uid = l.uid
+        )
+        '
+        ;
+
+        SELECT ids, min_event_id, max_event_id, max_action_tstamp_tx
+        FROM lizsync.analyse_audit_logs()
+        INTO p_ids, p_min_event_id, p_max_event_id, p_max_action_tstamp_tx
+        ;
+
+        -- The cursor is moved to the end of the chunk,
+        -- even if some central logs are not synchronized with this clone
+        SELECT lizsync.replay_central_logs_to_clone(
+            p_ids,
+            p_min_event_id,
+            p_chunk_max_event_id,
+            p_max_action_tstamp_tx
+        )
+        INTO p_number_replayed_to_central
+        ;
+
+    ELSE
+        -- clone -> central
+        SELECT max(a.event_id)
+        FROM (
+            SELECT event_id
+            FROM audit.logged_actions
+            ORDER BY event_id
+            LIMIT p_batch_size
+        ) AS a
+        INTO p_chunk_max_event_id
+        ;
+        RAISE NOTICE 'Replay the clone logs up to the event %', p_chunk_max_event_id;
+
+        IF p_chunk_max_event_id IS NOT NULL THEN
+            EXECUTE '
+            INSERT INTO ' || quote_ident(temp_clone_audit_table) || '
+            (
+                event_id, action_tstamp_tx, action_tstamp_epoch,
+                ident, action_type, origine, action, updated_field,
+                uid, original_action_tstamp_tx, action_data
+            )
+            SELECT
+                event_id, action_tstamp_tx, action_tstamp_epoch,
+                ident, action_type, origine, action, updated_field,
+                uid, action_tstamp_epoch, action_data
+            FROM lizsync.get_clone_audit_logs(''uid'', NULL, $1)
+            '
+            USING p_chunk_max_event_id
+            ;
+
+            PERFORM lizsync.analyse_audit_logs();
+
+            SELECT lizsync.replay_clone_logs_to_central(p_chunk_max_event_id)
+            INTO p_number_replayed_to_clone
+            ;
+        END IF;
+
+        -- The synchronization is complete when all the clone logs have been replayed
+        SELECT NOT EXISTS (SELECT 1 FROM audit.logged_actions)
+        INTO p_is_complete
+        ;
+
+        -- Rows entering or leaving the area of interest of the clone
+        -- without modification of their own
+        IF p_is_complete THEN
+            PERFORM lizsync.update_area_of_interest();
+        END IF;
+    END IF;
+
+    -- Store conflicts
+    SELECT lizsync.store_conflicts()
+    INTO p_number_conflicts;
+
+    -- The temporary tables are emptied at the end of the transaction
+    -- and kept for the next chunk
+
+    -- Return
+    RETURN QUERY
+    SELECT
+        p_number_replayed_to_central,
+        p_number_replayed_to_clone,
+        p_number_conflicts,
+        p_is_complete
+    ;
+END;
+$_$;
+
+
+-- FUNCTION synchronize_chunk(p_batch_size integer)
+COMMENT ON FUNCTION lizsync.synchronize_chunk(p_batch_size integer) IS 'Run one step of the bi-directionnal database synchronization between the clone and the central server, replaying at most the given number of logs: first the central logs in the clone, then the clone logs in the central server. Each step is committed with its cursor, so that an interrupted synchronization restarts from the last committed step. It must be called until is_complete is True.';
+
+
+-- update_area_of_interest()
+CREATE FUNCTION lizsync.update_area_of_interest() RETURNS integer
+    LANGUAGE plpgsql
+    AS $_$
+DECLARE
+    p_clone_id text;
+    pkeys text[];
+    excluded text[];
+    compared_columns text[];
+    different uuid[];
+    missing uuid[];
+    modified_uids uuid[];
+    rec record;
+    status_bool boolean;
+    v_count integer;
+    v_total integer;
+    dblink_connection_name text;
+    dblink_msg text;
+BEGIN
+    v_total := 0;
+
+    -- Get clone server id
+    SELECT server_id::text INTO p_clone_id
+    FROM lizsync.server_metadata
+    LIMIT 1;
+
+    -- Create dblink connection
+    -- The rows of the area of interest are computed once in the central transaction
+    dblink_connection_name = (md5(((random())::text || (clock_timestamp())::text)))::text;
+    SELECT dblink_connect(
+        dblink_connection_name,
+        'central_server'
+    )
+    INTO dblink_msg;
+    PERFORM dblink_exec(dblink_connection_name, 'BEGIN');
+
+    -- The rows entering the area are stored as logs, applied at the end
+    SELECT lizsync.create_temporary_table('temp_area_audit', 'audit')
+    INTO status_bool;
+
+    -- We disable triggers to avoid adding rows to the local audit logged_actions table
+    SET session_replication_role = replica;
+
+    -- Tables filtered by the area of interest of the clone
+    FOR rec IN
+        SELECT r.table_schema, r.table_name
+        FROM dblink(
+            dblink_connection_name,
+            format(
+                'SELECT table_schema, table_name FROM lizsync.fill_subscription_area(%L::uuid)',
+                p_clone_id
+            )
+        ) AS r(table_schema text, table_name text)
+        WHERE to_regclass(format('%I.%I', r.table_schema, r.table_name)) IS NOT NULL
+    LOOP
+        -- Only the uid of the clone rows and of the central rows of the area are compared,
+        -- so that only the rows entering or leaving the area are fetched
+        SELECT array_agg(DISTINCT a.attname::text)
+        INTO compared_columns
+        FROM pg_catalog.pg_attribute AS a
+        WHERE a.attrelid IN (
+            format('%I.%I', rec.table_schema, rec.table_name)::regclass,
+            to_regclass(format('%I.%I', 'central_' || rec.table_schema, rec.table_name))
+        )
+        AND a.attnum > 0
+        AND NOT a.attisdropped
+        AND a.attname != 'uid'
+        ;
+        SELECT lizsync.get_different_uids(
+            dblink_connection_name, rec.table_schema, rec.table_name, compared_columns,
+            NULL,
+            format(
+                'EXISTS (SELECT 1 FROM temp_subscription_area AS k WHERE k.ident = %L AND k.uid = t.uid)',
+                quote_ident(rec.table_schema) || '.' || quote_ident(rec.table_name)
+            )
+        )
+        INTO different
+        ;
+        CONTINUE WHEN different IS NULL;
+
+        -- The different rows missing in the clone have entered the area without modification,
+        -- for example the rows referencing a feature moved into the area.
+        -- The other different rows have left the area
+        EXECUTE format(
+            'SELECT array_agg(k.uid)
+            FROM unnest(%3$L::uuid[]) AS k(uid)
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM %1$I.%2$I AS t
+                WHERE t.uid = k.uid
+            )',
+            rec.table_schema, rec.table_name, different
+        )
+        INTO missing;
+
+        -- Delete the rows which have left the area,
+        -- except the ones modified in the clone since the synchronization
+        SELECT Coalesce(array_agg(DISTINCT (a.row_data -> 'uid')::uuid), ARRAY[]::uuid[])
+        INTO modified_uids
+        FROM audit.logged_actions AS a
+        WHERE a.schema_name = rec.table_schema
+        AND a.table_name = rec.table_name
+        ;
+        EXECUTE format(
+            'DELETE FROM %1$I.%2$I AS t
+            WHERE t.uid = ANY (%3$L::uuid[])
+            AND NOT t.uid = ANY (%4$L::uuid[])',
+            rec.table_schema, rec.table_name, different, modified_uids
+        );
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        v_total := v_total + v_count;
+
+        -- Insert the rows which have entered the area
+        CONTINUE WHEN missing IS NULL;
+
+        SELECT Coalesce(array_agg(r.uid_column), ARRAY[]::text[])
+        INTO pkeys
+        FROM audit.logged_relations AS r
+        WHERE r.relation_name = (quote_ident(rec.table_schema) || '.' || quote_ident(rec.table_name))
+        ;
+        SELECT lizsync.get_excluded_columns(f.table_schema, f.table_name, f.column_names)
+        INTO excluded
+        FROM lizsync.subscription_filters AS f
+        WHERE f.server_id = p_clone_id::uuid
+        AND f.table_schema = rec.table_schema
+        AND f.table_name = rec.table_name
+        ;
+
+        -- The rows are read from the central foreign table,
+        -- without the columns not sent to the clone
+        EXECUTE format(
+            'INSERT INTO temp_area_audit (ident, action_type, uid, action_data)
+            SELECT %3$L, ''I'', t.uid, (public.hstore(t) - %4$L::text[]) - %6$L::text[]
+            FROM "central_%1$s"."%2$s" AS t
+            WHERE t.uid = ANY (%5$L::uuid[])',
+            rec.table_schema, rec.table_name, concat(rec.table_schema, '.', rec.table_name),
+            pkeys, missing, Coalesce(excluded, ARRAY[]::text[])
+        );
+    END LOOP;
+
+    -- Insert the rows with one query per table
+    SELECT v_total + lizsync.apply_audit_logs('temp_area_audit', 'uid')
+    INTO v_total;
+
+    SET session_replication_role = DEFAULT;
+
+    -- Store the area used to update the rows in the clone,
+    -- so that the next synchronizations can detect a modification of the area
+    UPDATE lizsync.subscription_filters
+    SET area = NULL
+    WHERE server_id = p_clone_id::uuid
+    AND area IS NOT NULL
+    ;
+    INSERT INTO lizsync.subscription_filters AS f
+    (server_id, table_schema, table_name, area)
+    SELECT c.server_id, c.table_schema, c.table_name, c.area
+    FROM central_lizsync.subscription_filters AS c
+    WHERE c.server_id = p_clone_id::uuid
+    AND c.area IS NOT NULL
+    ON CONFLICT ON CONSTRAINT subscription_filters_pkey
+    DO UPDATE
+    SET area = EXCLUDED.area
+    ;
+
+    -- Disconnect dblink
+    SELECT dblink_disconnect(dblink_connection_name)
+    INTO dblink_msg;
+
+    RETURN v_total;
+END;
+$_$;
+
+
+-- FUNCTION update_area_of_interest()
+COMMENT ON FUNCTION lizsync.update_area_of_interest() IS 'Update the rows of the tables filtered by the area of interest of the clone, which can enter or leave the area without being modified, for example the rows referencing a feature moved into or out of the area. The uid of the clone rows are compared with the rows of the area stored by lizsync.fill_subscription_area with lizsync.get_different_uids, so that only the different rows are fetched. The rows of the area missing in the clone are copied from the central database with lizsync.apply_audit_logs, and the other different rows of the clone are deleted, except the ones modified in the clone since the synchronization. The triggers are disabled. The areas used are then stored in the table lizsync.subscription_filters of the clone. It is run at the end of the synchronizations which replay modifications of the tables filtered by an area, or when the area of the clone has been modified in the central database. It returns the number of inserted and deleted rows';
+
 --
 -- PostgreSQL database dump complete
 --
@@ -20,6 +20,22 @@ SET default_tablespace = '';
 
 SET default_with_oids = false;
 
+-- clone_cursors
+CREATE TABLE lizsync.clone_cursors (
+    clone_id uuid NOT NULL,
+    last_event_id bigint NOT NULL,
+    last_action_tstamp_tx timestamp with time zone,
+    last_sync_id uuid,
+    last_sync_time timestamp with time zone DEFAULT now() NOT NULL,
+    last_clone_event_id bigint DEFAULT 0 NOT NULL,
+    catch_up_event_id bigint
+);
+
+
+-- clone_cursors
+COMMENT ON TABLE lizsync.clone_cursors IS 'Last central audit event acknowledged by each clone. The next synchronization of a clone only fetches the central logs with a greater event id.';
+
+
 -- conflicts
 CREATE TABLE lizsync.conflicts (
     id bigint NOT NULL,
@@ -74,6 +90,22 @@ CREATE TABLE lizsync.server_metadata (
 );
 
 
+-- subscription_filters
+CREATE TABLE lizsync.subscription_filters (
+    server_id uuid NOT NULL,
+    table_schema text NOT NULL,
+    table_name text NOT NULL,
+    area text,
+    attribute_filter text,
+    column_names text[],
+    read_only boolean DEFAULT false
+);
+
+
+-- subscription_filters
+COMMENT ON TABLE lizsync.subscription_filters IS 'Filters of the modifications synchronized with each clone, per synchronized table. Only the modifications of the rows intersecting the area and matching the attribute filter, and of the listed columns, are sent to the clone. The rows moving into the filter are inserted in the clone, and the rows moving out of the filter are deleted from the clone. The read only tables are only synchronized from the central database to the clone.';
+
+
 -- synchronized_tables
 CREATE TABLE lizsync.synchronized_tables (
     server_id uuid NOT NULL,
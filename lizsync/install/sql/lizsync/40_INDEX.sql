@@ -16,6 +16,12 @@ SET xmloption = content;
 SET client_min_messages = warning;
 SET row_security = off;
 
+SET default_tablespace = '';
+
+-- history history_server_from_sync_time_idx
+CREATE INDEX history_server_from_sync_time_idx ON lizsync.history USING btree (server_from, sync_time);
+
+
 --
 -- PostgreSQL database dump complete
 --
@@ -16,6 +16,10 @@ SET xmloption = content;
 SET client_min_messages = warning;
 SET row_security = off;
 
+-- subscription_filters check_subscription_filter
+CREATE TRIGGER check_subscription_filter BEFORE INSERT OR UPDATE ON lizsync.subscription_filters FOR EACH ROW EXECUTE PROCEDURE lizsync.check_subscription_filter();
+
+
 --
 -- PostgreSQL database dump complete
 --
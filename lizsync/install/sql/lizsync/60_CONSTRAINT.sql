@@ -18,6 +18,11 @@ SET row_security = off;
 
 SET default_tablespace = '';
 
+-- clone_cursors clone_cursors_pkey
+ALTER TABLE ONLY lizsync.clone_cursors
+    ADD CONSTRAINT clone_cursors_pkey PRIMARY KEY (clone_id);
+
+
 -- conflicts conflicts_pkey
 ALTER TABLE ONLY lizsync.conflicts
     ADD CONSTRAINT conflicts_pkey PRIMARY KEY (id);
@@ -38,6 +43,11 @@ ALTER TABLE ONLY lizsync.server_metadata
     ADD CONSTRAINT server_metadata_server_name_key UNIQUE (server_name);
 
 
+-- subscription_filters subscription_filters_pkey
+ALTER TABLE ONLY lizsync.subscription_filters
+    ADD CONSTRAINT subscription_filters_pkey PRIMARY KEY (server_id, table_schema, table_name);
+
+
 -- synchronized_tables synchronized_tables_pkey
 ALTER TABLE ONLY lizsync.synchronized_tables
     ADD CONSTRAINT synchronized_tables_pkey PRIMARY KEY (server_id);
@@ -17,7 +17,39 @@ SET client_min_messages = warning;
 SET row_security = off;
 
 -- FUNCTION analyse_audit_logs()
-COMMENT ON FUNCTION lizsync.analyse_audit_logs() IS 'Get audit logs from the central database and the clone since the last synchronization. Compare the logs to find and resolved UPDATE conflicts (same table, feature, column): last modified object wins. This function store the resolved conflicts into the table lizsync.conflicts in the central database. Returns central server event ids, minimum event id, maximum event id, maximum action timestamp.';
+COMMENT ON FUNCTION lizsync.analyse_audit_logs() IS 'Get audit logs from the central database and the clone since the last synchronization. Reduce the logs of each object to their net effect, then compare the logs to find and resolved UPDATE conflicts (same table, feature, column): last modified object wins. The remaining UPDATE of each object are then merged. This function store the resolved conflicts into the table lizsync.conflicts in the central database. Returns central server event ids, minimum event id, maximum event id, maximum action timestamp.';
+
+
+-- FUNCTION apply_audit_logs(p_temporary_table text, p_uid_field text)
+COMMENT ON FUNCTION lizsync.apply_audit_logs(p_temporary_table text, p_uid_field text) IS 'Apply the logs stored in a temporary audit table with one query per table and group of consecutive logs with the same action and modified columns, in the order of the logs of each table. The values are read from the action_data column with the type of the target columns. Parameters: temporary table name and uid column name. It returns the number of applied logs.';
+
+
+-- FUNCTION apply_clone_logs(p_clone_id text, p_logs jsonb, p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.apply_clone_logs(p_clone_id text, p_logs jsonb, p_max_event_id bigint) IS 'Replay in the central database a batch of clone logs, sent as a JSON array of objects with the keys action and action_tstamp_tx, in the array order and in a single transaction. The original clone timestamp of each action is stored by the audit trigger in the sync_data of the created events. A new item is also created in the lizsync.history table, and the maximum clone event id of the batch is stored in the lizsync.clone_cursors table. The batch is ignored if this event id has already been replayed. Parameters: clone server id, logs and maximum clone event id of the logs. It returns the synchronization id and the number of replayed actions.';
+
+
+-- FUNCTION build_event_sql(p_action text, p_schema_name text, p_table_name text, p_row_data public.hstore, p_changed_fields public.hstore, p_pkey_fields text[], p_uid_column text, p_excluded_columns text[])
+COMMENT ON FUNCTION lizsync.build_event_sql(p_action text, p_schema_name text, p_table_name text, p_row_data public.hstore, p_changed_fields public.hstore, p_pkey_fields text[], p_uid_column text, p_excluded_columns text[]) IS 'Build the SQL to use for replay from the values of an audit log event, without reading any table. It is used to get the SQL of many logs in one query. Parameters: action (I, U or D), schema name, table name, row data, changed fields, primary key fields, uid column name and excluded columns';
+
+
+-- FUNCTION check_subscription_filter()
+COMMENT ON FUNCTION lizsync.check_subscription_filter() IS 'Trigger function refusing the attribute filters of lizsync.subscription_filters on the tables with compact audit logs, which do not contain all the columns of the rows needed to evaluate the filter.';
+
+
+-- FUNCTION compare_tables(p_schema_name text, p_table_name text)
+COMMENT ON FUNCTION lizsync.compare_tables(p_schema_name text, p_table_name text) IS 'Compare the data of a table in the clone and in the central database. The uid of the different rows are found with lizsync.get_different_uids, which compares the hashes of the blocks of rows computed in each database. The values of the different rows are then read from the central foreign table. Only the rows matching the subscription filters of the clone, and the columns sent to the clone, are compared. Parameters: schema name and table name. It returns the uid, the status, and the different values in the clone and in the central database';
+
+
+-- FUNCTION compact_audit_logs(p_temporary_table text, p_uid_field text)
+COMMENT ON FUNCTION lizsync.compact_audit_logs(p_temporary_table text, p_uid_field text) IS 'Reduce the logs of each object stored in a temporary audit table to their net effect: an INSERT followed by a DELETE is removed, the UPDATE following an INSERT are merged into the INSERT, the logs before a DELETE are removed, and only the last UPDATE of each field is kept. Parameters: temporary table name and uid column name. It returns the number of removed logs.';
+
+
+-- FUNCTION create_audit_partition(p_from_event_id bigint, p_to_event_id bigint)
+COMMENT ON FUNCTION lizsync.create_audit_partition(p_from_event_id bigint, p_to_event_id bigint) IS 'Create a partition of the partitioned table audit.logged_actions, with the same indexes as the original table. Parameters: first event id, event id after the last event id of the partition (NULL for no upper limit). It returns the partition name';
+
+
+-- FUNCTION create_audit_partitions(p_partition_size bigint)
+COMMENT ON FUNCTION lizsync.create_audit_partitions(p_partition_size bigint) IS 'Create the next partitions of the partitioned table audit.logged_actions, so that the partitions can store at least the given number of new events before the last partition with no upper limit. Parameters: number of events of each partition. It returns the number of created partitions';
 
 
 -- FUNCTION create_central_server_fdw(p_central_host text, p_central_port smallint, p_central_database text, p_central_username text, p_central_password text)
@@ -25,15 +57,51 @@ COMMENT ON FUNCTION lizsync.create_central_server_fdw(p_central_host text, p_cen
 
 
 -- FUNCTION create_temporary_table(temporary_table text, table_type text)
-COMMENT ON FUNCTION lizsync.create_temporary_table(temporary_table text, table_type text) IS 'Create temporary table used during database bidirectionnal synchronization. Parameters: temporary table name, and table type (audit or conflit)';
+COMMENT ON FUNCTION lizsync.create_temporary_table(temporary_table text, table_type text) IS 'Create temporary table used during database bidirectionnal synchronization, with its indexes. The table is created once per session and emptied at the end of each transaction: if it already exists, it is only truncated. Parameters: temporary table name, and table type (audit, conflit or area)';
+
+
+-- FUNCTION fill_area_of_interest(p_tables regclass[], p_area text)
+COMMENT ON FUNCTION lizsync.fill_area_of_interest(p_tables regclass[], p_area text) IS 'Store the rows of the area of interest of some tables in the temporary table temp_area_of_interest, emptied at the end of the transaction: the rows of the spatial tables intersecting the area, the rows of the other tables referencing them or not referencing any filtered row, and all the rows they reference through foreign keys, even outside the area. The tables without geometry column and not referencing a filtered table are not filtered. It is used to package the data and to synchronize the clones with an area of interest. Parameters: tables, and area as EWKT or NULL. It returns the filtered tables';
+
+
+-- FUNCTION fill_subscription_area(p_clone_id uuid)
+COMMENT ON FUNCTION lizsync.fill_subscription_area(p_clone_id uuid) IS 'Store the rows of the area of interest of a clone in the temporary table temp_subscription_area, for each table filtered by the area stored in its subscription filters. The rows are selected with lizsync.fill_area_of_interest, as in a package created with this area: the features of the area, the rows referencing them, and the rows they reference, even outside the area. They are computed once per transaction, and the table is emptied at the end of the transaction. Parameters: clone id. It returns the schema and the name of the filtered tables';
+
+
+-- FUNCTION get_area_of_interest_condition(p_schema_name text, p_table_name text, p_area text, p_alias text)
+COMMENT ON FUNCTION lizsync.get_area_of_interest_condition(p_schema_name text, p_table_name text, p_area text, p_alias text) IS 'Get the SQL condition selecting the rows of a table intersecting an area with one of their geometry columns. Returns NULL if the table has no geometry column. Parameters: schema name, table name, area as EWKT, and alias of the table in the query';
+
 
+-- FUNCTION get_audit_compact_columns(p_table regclass)
+COMMENT ON FUNCTION lizsync.get_audit_compact_columns(p_table regclass) IS 'Get the columns kept with the primary key in the compact audit logs of a table, given to audit.audit_table as compact_cols. The other columns are missing from the row data of the UPDATE and DELETE logs. Returns NULL if the logs of the table are not compact. Parameters: table';
 
--- FUNCTION get_central_audit_logs(p_uid_field text, p_excluded_columns text[])
-COMMENT ON FUNCTION lizsync.get_central_audit_logs(p_uid_field text, p_excluded_columns text[]) IS 'Get all the logs from the central database: modifications do not come from the clone, have not yet been replayed by the clone, are dated after the last synchronization, have an event id higher than the last sync maximum event id, and concern the synchronized tables for this clone. Parameters: uid column name and excluded columns';
 
+-- FUNCTION get_audit_excluded_columns(p_table regclass)
+COMMENT ON FUNCTION lizsync.get_audit_excluded_columns(p_table regclass) IS 'Get the columns of a table excluded from the audit logs, given to audit.audit_table as ignored_cols. These columns are not logged, replayed nor analysed for conflicts. Returns an empty array if the table is not audited. Parameters: table';
 
--- FUNCTION get_clone_audit_logs(p_uid_field text, p_excluded_columns text[])
-COMMENT ON FUNCTION lizsync.get_clone_audit_logs(p_uid_field text, p_excluded_columns text[]) IS 'Get all the modifications made in the clone. Parameters: uid column name and excluded columns';
+
+-- FUNCTION get_audit_partitions()
+COMMENT ON FUNCTION lizsync.get_audit_partitions() IS 'List the partitions of the table audit.logged_actions with their first event id and the event id after their last event id. NULL is returned for a partition with no lower or upper limit';
+
+
+-- FUNCTION get_central_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.get_central_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint) IS 'Get all the logs from the central database, returned by lizsync.get_subscription_audit_logs in the central database: modifications have an event id higher than the last event id acknowledged by the clone in the table lizsync.clone_cursors of the clone, or of the central database if the clone has no cursor, not higher than the given maximum event id, and match the subscription of the clone. Parameters: uid column name, excluded columns and maximum event id (NULL for no limit)';
+
+
+-- FUNCTION get_clone_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.get_clone_audit_logs(p_uid_field text, p_excluded_columns text[], p_max_event_id bigint) IS 'Get all the modifications made in the clone, up to the given maximum event id, without the columns excluded from the audit triggers and the columns not synchronized with the central database for this clone, and without the read only tables of this clone. Parameters: uid column name, excluded columns and maximum event id (NULL for no limit)';
+
+
+-- FUNCTION get_clone_cursor(p_batch_size integer)
+COMMENT ON FUNCTION lizsync.get_clone_cursor(p_batch_size integer) IS 'Get the synchronization cursor of the clone from the central database: the last central event id replayed in the clone, the last clone event id replayed in the central database, and the maximum event id of the next central logs to replay, limited to the given number of logs. The clone cursor is used instead of the central cursor if it exists. An exception is raised if the clone has no cursor, or if the central logs not replayed yet by the clone have been purged. Parameters: batch size (NULL to get the maximum event id of all the central logs to replay)';
+
+
+-- FUNCTION get_delta_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.get_delta_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint) IS 'Get the logs of the central database to put in a delta package for the given clone, returned by lizsync.get_subscription_audit_logs as for a synchronization: modifications with an event id higher than the given minimum event id and not higher than the given maximum event id, matching the subscription of the clone. The rows entering or leaving the area of interest of the clone without modification are only updated by the next synchronization. The logs of each object are reduced to their net effect. Parameters: clone id, minimum event id (excluded) and maximum event id';
+
+
+-- FUNCTION get_different_uids(p_dblink_connection_name text, p_schema_name text, p_table_name text, p_excluded_columns text[], p_clone_condition text, p_central_condition text)
+COMMENT ON FUNCTION lizsync.get_different_uids(p_dblink_connection_name text, p_schema_name text, p_table_name text, p_excluded_columns text[], p_clone_condition text, p_central_condition text) IS 'Get the uid of the different rows of a table in the clone and in the central database. The hashes of the blocks of rows are computed at the same time in each database with lizsync.get_table_hashes and compared, then the hashes of the smaller blocks and of the rows of the different blocks only. It is used by lizsync.compare_tables and lizsync.update_area_of_interest. Parameters: dblink connection to the central database, schema name, table name, columns not compared, SQL conditions of the rows compared in the clone and in the central database on the alias t (NULL for all the rows). It returns NULL if the tables are the same';
 
 
 -- FUNCTION get_event_sql(pevent_id bigint, puid_column text, excluded_columns text[])
@@ -46,16 +114,60 @@ Arguments:
 ';
 
 
+-- FUNCTION get_excluded_columns(p_schema_name text, p_table_name text, p_column_names text[])
+COMMENT ON FUNCTION lizsync.get_excluded_columns(p_schema_name text, p_table_name text, p_column_names text[]) IS 'Get the columns of a table which are not synchronized with a clone, from the list of the synchronized columns. The uid, the primary key and the NOT NULL columns are always synchronized. Returns an empty array if the list is NULL. Parameters: schema name, table name, and synchronized columns';
+
+
+-- FUNCTION get_package_data_queries(p_tables text[], p_area text, p_columns jsonb)
+COMMENT ON FUNCTION lizsync.get_package_data_queries(p_tables text[], p_area text, p_columns jsonb) IS 'Return the query of the rows of each table of the package which must not be sent entirely to the clone. With an area of interest, the rows of the spatial tables intersecting the area are kept in the temporary table temp_area_of_interest by lizsync.fill_area_of_interest, with the rows of the other tables referencing them, and all the rows they reference through foreign keys. The tables without geometry column and not referencing a filtered table are not filtered. The columns not sent to the clone are returned as NULL. The queries must be run in the same transaction. Parameters: tables of the package, area as EWKT or NULL, and JSON object of the columns sent to the clone for each table, ex: {"\"schema\".\"table\"": ["uid", "name"]}';
+
+
+-- FUNCTION get_schema_fingerprint(p_schema_names text[])
+COMMENT ON FUNCTION lizsync.get_schema_fingerprint(p_schema_names text[]) IS 'Get a hash of the structure of the given schemas, read from the catalog: tables, views, sequences, constraints, indexes, triggers, functions, types and comments. It is used to reuse the SQL files of the schemas dumped for a previous package if the structure has not changed. Parameters: schema names';
+
+
+-- FUNCTION get_subscription_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_uid_field text, p_excluded_columns text[])
+COMMENT ON FUNCTION lizsync.get_subscription_audit_logs(p_clone_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_uid_field text, p_excluded_columns text[]) IS 'Get the logs of the central database to replay in a clone: modifications with an event id higher than the given minimum event id and not higher than the given maximum event id, which do not come from the clone, except the ones made before the deployment of a package in the clone, and concern the synchronized tables for this clone and the rows and columns matching its subscription filters. The rows of the tables filtered by an area must be in the area of interest of the clone stored by lizsync.fill_subscription_area, with the rows linked to its features by foreign keys, only computed if some of these rows are inserted or updated. The attribute filters are evaluated on the rows of the logs read with the type of the table columns, in one query per filtered table. The rows moving into or out of the subscription filters are inserted in or deleted from the clone. The columns excluded from the audit triggers are not replayed. It is used by the synchronization and by the delta packages. Parameters: clone id, minimum event id (excluded), maximum event id (NULL for no limit), uid column name and columns excluded for all the tables';
+
+
+-- FUNCTION get_subscription_condition(p_clone_id uuid, p_schema_name text, p_table_name text)
+COMMENT ON FUNCTION lizsync.get_subscription_condition(p_clone_id uuid, p_schema_name text, p_table_name text) IS 'Get the SQL condition of the subscription of a clone to a synchronized table, built from the area and the attribute filter of the table lizsync.subscription_filters, on the alias t. The rows of the area are read from the temporary table temp_subscription_area filled by lizsync.fill_subscription_area, so the condition must be used in the same transaction. It returns NULL if the table is not filtered for the clone. Parameters: clone id, schema name and table name';
+
+
+-- FUNCTION get_table_hashes(p_schema_name text, p_table_name text, p_excluded_columns text[], p_condition text, p_prefixes text[], p_prefix_length integer)
+COMMENT ON FUNCTION lizsync.get_table_hashes(p_schema_name text, p_table_name text, p_excluded_columns text[], p_condition text, p_prefixes text[], p_prefix_length integer) IS 'Get the hashes of the blocks of rows of a table, grouped by the first characters of their uid. It is run in the clone and in the central database by lizsync.get_different_uids, which only fetches the hashes from the central database. Parameters: schema name, table name, excluded columns, SQL condition of the rows to hash on the alias t (NULL for all the rows), uid prefixes of the rows to hash (NULL for all the rows), and length of the uid prefix of the blocks (36 for one block per row). It returns the uid prefix, the number of rows and the hash of each block';
+
+
 -- FUNCTION import_central_server_schemas()
 COMMENT ON FUNCTION lizsync.import_central_server_schemas() IS 'Import synchronized schemas from the central database foreign server into central_XXX local schemas to the clone database. This allow to edit data of the central database from the clone.';
 
 
+-- FUNCTION merge_update_logs(p_temporary_table text, p_uid_field text)
+COMMENT ON FUNCTION lizsync.merge_update_logs(p_temporary_table text, p_uid_field text) IS 'Merge the UPDATE logs of each object stored in a temporary audit table into one UPDATE of all the modified fields. It must be run after the conflicts analysis, which compares the modifications field by field. Parameters: temporary table name and uid column name. It returns the number of removed logs.';
+
+
+-- FUNCTION partition_audit_logs(p_partition_size bigint)
+COMMENT ON FUNCTION lizsync.partition_audit_logs(p_partition_size bigint) IS 'Partition the table audit.logged_actions by range of event id. The existing table becomes the first partition, and the next partitions are created with the given number of events. Use it in the central database, before purging the audit logs with lizsync.purge_audit_logs. Parameters: number of events of each partition. It returns False if the table is already partitioned';
+
+
+-- FUNCTION purge_audit_logs(p_partition_size bigint, p_drop_partitions boolean, p_archive_directory text)
+COMMENT ON FUNCTION lizsync.purge_audit_logs(p_partition_size bigint, p_drop_partitions boolean, p_archive_directory text) IS 'Retention of the partitioned table audit.logged_actions in the central database: detach the partitions of events already replayed by all the clones, and create the partitions for the next events. Run it regularly, for example with a scheduled task. Parameters: number of events of each new partition, drop the detached partitions, directory of the server where the partitions are saved as CSV files before being detached (NULL to not archive them). It returns the detached partitions';
+
+
+-- FUNCTION repair_table(p_schema_name text, p_table_name text, p_source text)
+COMMENT ON FUNCTION lizsync.repair_table(p_schema_name text, p_table_name text, p_source text) IS 'Repair the rows of a table which are different in the clone and in the central database, found with lizsync.compare_tables. Only these rows, and the columns sent to the clone, are copied, and the central rows not matching the subscription filters of the clone are neither copied to the clone nor deleted. In the clone, the repairs are applied with lizsync.apply_audit_logs, with one query per action, and the triggers are disabled, so that no audit log is created. In the central database, the rows are audited with the origin of the clone, as the replayed clone logs, so that they are sent to the other clones but not back to this clone. Parameters: schema name, table name, and source of the values: central, clone, or NULL to copy the rows modified in the clone since the last synchronization to the central database and the other rows from the central database. It returns the uid, the status given by lizsync.compare_tables and the repaired server of each row';
+
+
 -- FUNCTION replay_central_logs_to_clone(p_ids bigint[], p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone)
-COMMENT ON FUNCTION lizsync.replay_central_logs_to_clone(p_ids bigint[], p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) IS 'Replay the central logs in the clone database, then modifiy the corresponding audit logs in the central server to update the sync_data column. A new item is also created in the central server lizsync.history table. When running the log queries, we disable triggers in the clone to avoid adding more rows to the local audit logged_actions table';
+COMMENT ON FUNCTION lizsync.replay_central_logs_to_clone(p_ids bigint[], p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) IS 'Replay the central logs in the clone database with lizsync.apply_audit_logs, then move the clone cursor to the given maximum event id, even if the last central logs are not synchronized with this clone, in the central server lizsync.clone_cursors table and in the clone. Without central logs to replay, the central cursor is moved to the clone cursor if it is ahead, after the replay of a delta package. A new item is also created in the central server lizsync.history table. When running the log queries, we disable triggers in the clone to avoid adding more rows to the local audit logged_actions table';
+
 
+-- FUNCTION replay_clone_logs_to_central(p_max_event_id bigint)
+COMMENT ON FUNCTION lizsync.replay_clone_logs_to_central(p_max_event_id bigint) IS 'Replay all logs from the clone to the central database. The logs are sent in one batch to the central function lizsync.apply_clone_logs, with the maximum clone event id of the logs. It returns the number of actions replayed. After this, the clone audit logs up to this event id are deleted.';
 
--- FUNCTION replay_clone_logs_to_central()
-COMMENT ON FUNCTION lizsync.replay_clone_logs_to_central() IS 'Replay all logs from the clone to the central database. It returns the number of actions replayed. After this, the clone audit logs are truncated.';
+
+-- FUNCTION replay_delta_audit_logs(p_sync_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone)
+COMMENT ON FUNCTION lizsync.replay_delta_audit_logs(p_sync_id uuid, p_min_event_id bigint, p_max_event_id bigint, p_max_action_tstamp_tx timestamp with time zone) IS 'Replay in the clone the central logs of a delta package, without connection to the central database. The logs must have been stored in the temporary table temp_central_audit. The delta package must follow the last central event replayed in the clone. The conflicts with the clone modifications are resolved as during a synchronization, and stored in the clone lizsync.conflicts table. The clone cursor is moved to the maximum event id of the package. Parameters: synchronization id of the package, minimum event id (excluded), maximum event id and maximum action timestamp of the package';
 
 
 -- FUNCTION store_conflicts()
@@ -66,6 +178,46 @@ COMMENT ON FUNCTION lizsync.store_conflicts() IS 'Store resolved conflicts in th
 COMMENT ON FUNCTION lizsync.synchronize() IS 'Run the bi-directionnal database synchronization between the clone and the central server';
 
 
+-- FUNCTION synchronize_chunk(p_batch_size integer)
+COMMENT ON FUNCTION lizsync.synchronize_chunk(p_batch_size integer) IS 'Run one step of the bi-directionnal database synchronization between the clone and the central server, replaying at most the given number of logs: first the central logs in the clone, then the clone logs in the central server. Each step is committed with its cursor, so that an interrupted synchronization restarts from the last committed step. It must be called until is_complete is True.';
+
+
+-- FUNCTION update_area_of_interest()
+COMMENT ON FUNCTION lizsync.update_area_of_interest() IS 'Update the rows of the tables filtered by the area of interest of the clone, which can enter or leave the area without being modified, for example the rows referencing a feature moved into or out of the area. The uid of the clone rows are compared with the rows of the area stored by lizsync.fill_subscription_area with lizsync.get_different_uids, so that only the different rows are fetched. The rows of the area missing in the clone are copied from the central database with lizsync.apply_audit_logs, and the other different rows of the clone are deleted, except the ones modified in the clone since the synchronization. The triggers are disabled. The areas used are then stored in the table lizsync.subscription_filters of the clone. It is run at the end of the synchronizations which replay modifications of the tables filtered by an area, or when the area of the clone has been modified in the central database. It returns the number of inserted and deleted rows';
+
+
+-- clone_cursors
+COMMENT ON TABLE lizsync.clone_cursors IS 'Synchronization cursor of each clone: last central audit event acknowledged by the clone, and last clone audit event replayed in the central database. The next synchronization of a clone only fetches the central logs with a greater event id. The clone also stores its own cursor.';
+
+
+-- clone_cursors.clone_id
+COMMENT ON COLUMN lizsync.clone_cursors.clone_id IS 'Clone server id';
+
+
+-- clone_cursors.last_event_id
+COMMENT ON COLUMN lizsync.clone_cursors.last_event_id IS 'Last central audit event id acknowledged by the clone';
+
+
+-- clone_cursors.last_action_tstamp_tx
+COMMENT ON COLUMN lizsync.clone_cursors.last_action_tstamp_tx IS 'Action timestamp of the last central audit event acknowledged by the clone';
+
+
+-- clone_cursors.last_sync_id
+COMMENT ON COLUMN lizsync.clone_cursors.last_sync_id IS 'Id of the history item which has moved the cursor';
+
+
+-- clone_cursors.last_sync_time
+COMMENT ON COLUMN lizsync.clone_cursors.last_sync_time IS 'Timestamp of the last cursor update';
+
+
+-- clone_cursors.last_clone_event_id
+COMMENT ON COLUMN lizsync.clone_cursors.last_clone_event_id IS 'Last clone audit event id replayed in the central database';
+
+
+-- clone_cursors.catch_up_event_id
+COMMENT ON COLUMN lizsync.clone_cursors.catch_up_event_id IS 'Last central audit event id made before the deployment of a package in the clone. The central logs coming from the clone up to this event are also replayed in the clone, since they are not in the deployed package if it is older';
+
+
 -- conflicts
 COMMENT ON TABLE lizsync.conflicts IS 'Store conflicts resolution made during bidirectionnal database synchronizations.';
 
@@ -114,6 +266,38 @@ COMMENT ON COLUMN lizsync.conflicts.rejected IS 'Rejected object. If "clone", it
 COMMENT ON COLUMN lizsync.conflicts.rule_applied IS 'Rule used when managing conflict';
 
 
+-- subscription_filters
+COMMENT ON TABLE lizsync.subscription_filters IS 'Filters of the modifications synchronized with each clone, per synchronized table. Only the modifications of the rows intersecting the area and matching the attribute filter, and of the listed columns, are sent to the clone. The rows moving into the filter are inserted in the clone, and the rows moving out of the filter are deleted from the clone. The read only tables are only synchronized from the central database to the clone.';
+
+
+-- subscription_filters.server_id
+COMMENT ON COLUMN lizsync.subscription_filters.server_id IS 'Clone server id';
+
+
+-- subscription_filters.table_schema
+COMMENT ON COLUMN lizsync.subscription_filters.table_schema IS 'Schema of the synchronized table';
+
+
+-- subscription_filters.table_name
+COMMENT ON COLUMN lizsync.subscription_filters.table_name IS 'Name of the synchronized table';
+
+
+-- subscription_filters.area
+COMMENT ON COLUMN lizsync.subscription_filters.area IS 'Area of interest of the clone, as EWKT, intersecting the geometry columns of the rows. It is set when a package created with an area of interest is deployed. Not used for the tables without geometry column';
+
+
+-- subscription_filters.attribute_filter
+COMMENT ON COLUMN lizsync.subscription_filters.attribute_filter IS 'SQL expression on the columns of the table, for example: team = ''north''';
+
+
+-- subscription_filters.column_names
+COMMENT ON COLUMN lizsync.subscription_filters.column_names IS 'Columns of the table sent to the clone. The other columns are empty in the clone, and their modifications are not sent to the central database. The uid, the primary key and the NOT NULL columns are always sent. NULL for all the columns';
+
+
+-- subscription_filters.read_only
+COMMENT ON COLUMN lizsync.subscription_filters.read_only IS 'If True, the table is only synchronized from the central database to the clone. The table is not audited in the clone, and its modifications made in the clone are neither analysed nor sent to the central database';
+
+
 -- synchronized_tables
 COMMENT ON TABLE lizsync.synchronized_tables IS 'List of tables to synchronize per clone server id. This list works as a white list. Only listed tables will be synchronized for each server ids.';
 
@@ -13,7 +13,9 @@ __author__ = '3liz'
 __date__ = '2018-12-19'
 __copyright__ = '(C) 2018 by 3liz'
 
+import json
 import os
+import shutil
 import tempfile
 
 from qgis.core import (
@@ -22,6 +24,7 @@ from qgis.core import (
     QgsProcessingParameterString,
     QgsProcessingParameterFile,
     QgsProcessingParameterBoolean,
+    QgsProcessingParameterNumber,
     QgsProcessingOutputString,
     QgsProcessingOutputNumber
 )
@@ -33,6 +36,9 @@ from .tools import (
     getUriFromConnectionName,
     get_connection_password_from_ini,
     fetchDataFromSqlQuery,
+    get_newer_synchronization_sql,
+    load_zip_archive,
+    pg_restore,
     run_command,
 )
 from platform import system as psys
@@ -52,8 +58,10 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
     CONNECTION_NAME_CENTRAL = 'CONNECTION_NAME_CENTRAL'
     CONNECTION_NAME_CLONE = 'CONNECTION_NAME_CLONE'
     POSTGRESQL_BINARY_PATH = 'POSTGRESQL_BINARY_PATH'
+    JOBS = 'JOBS'
     RECREATE_CLONE_SERVER_ID = 'RECREATE_CLONE_SERVER_ID'
     ZIP_FILE = 'ZIP_FILE'
+    LOAD_WITHOUT_EXTRACTING = 'LOAD_WITHOUT_EXTRACTING'
 
     OUTPUT_STATUS = 'OUTPUT_STATUS'
     OUTPUT_STRING = 'OUTPUT_STRING'
@@ -76,6 +84,21 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
             ' "Package central database" algorithm, to the chosen clone.'
             ' This ZIP archive, named by default "central_database_package.zip"'
             ' contains data from the central PostgreSQL database.'
+            '\n'
+            '\n'
+            ' The same package can be deployed to several clones, even after some synchronizations:'
+            ' the modifications made in the central database since the creation of the package'
+            ' are then replayed in the clone.'
+            '\n'
+            '\n'
+            ' If the package has been created with an area of interest, this area is stored'
+            ' as the subscription filter of the clone in the central database:'
+            ' only the modifications of the features of this area are then sent to the clone.'
+            ' In the same way, the columns sent to the clone for some tables'
+            ' are stored in the central and in the clone databases:'
+            ' the other columns are not synchronized with this clone.'
+            ' The tables not edited in the field are also stored as read only tables:'
+            ' their modifications made in the clone are not sent to the central database.'
         )
         return short_help
 
@@ -164,6 +187,24 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
             )
         )
 
+        # Number of parallel jobs of pg_restore
+        param = QgsProcessingParameterNumber(
+            self.JOBS,
+            tr('Number of parallel jobs'),
+            defaultValue=os.cpu_count() or 1,
+            minValue=1,
+            optional=False
+        )
+        tooltip = tr(
+            'Number of tables restored in parallel by pg_restore.'
+            ' By default, the number of processors of this computer.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
         # Database ZIP archive file
         database_archive_file = ls.variable('general/database_archive_file')
         if not database_archive_file:
@@ -193,6 +234,16 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
             )
         )
 
+        # Load the archive without extracting it
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.LOAD_WITHOUT_EXTRACTING,
+                tr('Load the ZIP archive in one transaction without extracting it (clones with small storage)'),
+                defaultValue=False,
+                optional=True
+            )
+        )
+
         # OUTPUTS
         # Add output for message
         self.addOutput(
@@ -276,10 +327,15 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
         connection_name_central = parameters[self.CONNECTION_NAME_CENTRAL]
         connection_name_clone = parameters[self.CONNECTION_NAME_CLONE]
         postgresql_binary_path = parameters[self.POSTGRESQL_BINARY_PATH]
+        jobs = self.parameterAsInt(parameters, self.JOBS, context)
         recreate_clone_server_id = self.parameterAsBool(
             parameters, self.RECREATE_CLONE_SERVER_ID,
             context
         )
+        load_without_extracting = self.parameterAsBool(
+            parameters, self.LOAD_WITHOUT_EXTRACTING,
+            context
+        )
 
         # store parameters
         ls = lizsyncConfig()
@@ -296,12 +352,19 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
 
         msg = ''
         # Uncompress package
+        # Only the text files are extracted if the SQL files are loaded from the archive
         feedback.pushInfo(tr('UNCOMPRESS PACKAGE') + ' {0}'.format(database_archive_file))
         import zipfile
         dir_path = os.path.dirname(os.path.abspath(database_archive_file))
         try:
             with zipfile.ZipFile(database_archive_file) as t:
-                t.extractall(dir_path)
+                archive_members = t.namelist()
+                if load_without_extracting:
+                    for member in archive_members:
+                        if member.endswith('.txt'):
+                            t.extract(member, dir_path)
+                else:
+                    t.extractall(dir_path)
                 feedback.pushInfo(tr('Package uncompressed successfully'))
         except Exception:
             m = tr('Package extraction error')
@@ -314,16 +377,25 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
         archive_files = [
             '01_before.sql',
             '02_predata.sql',
-            '02_data.sql',
             '03_after.sql',
             '04_lizsync.sql',
             'sync_id.txt',
             'sync_tables.txt'
         ]
         for f in archive_files:
-            if not os.path.exists(os.path.join(dir_path, f)):
+            if f not in archive_members:
                 m = tr('One mandatory file has not been found in the ZIP archive') + '  - %s' % f
                 raise QgsProcessingException(m)
+
+        # The data are in the directory 02_data, dumped with the directory format,
+        # or in the file 02_data.sql for the packages created by previous versions
+        if '02_data/toc.dat' in archive_members:
+            data_file = '02_data'
+        elif '02_data.sql' in archive_members:
+            data_file = '02_data.sql'
+        else:
+            m = tr('One mandatory file has not been found in the ZIP archive') + '  - %s' % '02_data'
+            raise QgsProcessingException(m)
         feedback.pushInfo(tr('All the mandatory files have been sucessfully found'))
 
         feedback.pushInfo('')
@@ -376,9 +448,10 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
         feedback.pushInfo('')
 
         # Get last synchro and
-        # check if no newer bi-directionnal (partial sync)
+        # check if newer bi-directionnal (partial sync)
         # or archive deployment (full sync)
-        # have been made since last deployment
+        # have been made since last deployment.
+        # The clone then catches up with the central modifications made since the package
         if has_sync and clone_id:
             feedback.pushInfo(tr('CHECK LAST SYNCHRONIZATION'))
             with open(os.path.join(dir_path, 'sync_id.txt')) as f:
@@ -386,25 +459,7 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
             if not sync_id:
                 m = tr('No synchronization ID has been found in the file sync_id.txt')
                 raise QgsProcessingException(m)
-            sql = '''
-                SELECT sync_id
-                FROM lizsync.history
-                WHERE TRUE
-                AND sync_time > (
-                    SELECT sync_time
-                    FROM lizsync.history
-                    WHERE sync_id::text = '{sync_id}'
-                )
-                AND server_from::text = (
-                    SELECT server_id::text
-                    FROM lizsync.server_metadata
-                    LIMIT 1
-                )
-                AND '{clone_id}' = ANY (server_to)
-            '''.format(
-                sync_id=sync_id,
-                clone_id=clone_id
-            )
+            sql = get_newer_synchronization_sql(sync_id, clone_id)
             last_sync = None
             header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
                 connection_name_central,
@@ -416,17 +471,47 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
             for a in data:
                 last_sync = a[0]
             if last_sync:
-                m = tr(
+                feedback.pushInfo(tr(
                     'Bi-directionnal synchronization has already been made on this clone'
-                    ' since the deployment of this package. Abort the current deployment.'
-                )
-                raise QgsProcessingException(m)
+                    ' since the deployment of this package. The modifications made since'
+                    ' the package will be replayed in the clone after the deployment.'
+                ))
             else:
                 feedback.pushInfo(tr(
                     'No previous bi-directionnal synchronization found since the deployment'
                     ' of this package. Everything is ok.'
                 ))
 
+        # Check the central audit logs following this package
+        # have not been purged
+        feedback.pushInfo(tr('CHECK PURGED CENTRAL AUDIT LOGS'))
+        with open(os.path.join(dir_path, 'sync_id.txt')) as f:
+            sync_id = f.readline().strip()
+        sql = '''
+            SELECT h.sync_id
+            FROM lizsync.history AS h, lizsync.history AS p
+            WHERE TRUE
+            AND p.sync_id = '{sync_id}'::uuid
+            AND h.sync_type = 'purge'
+            AND h.max_event_id > p.max_event_id
+        '''.format(
+            sync_id=sync_id
+        )
+        header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
+            connection_name_central,
+            sql
+        )
+        if not ok:
+            m = error_message + ' ' + sql
+            raise QgsProcessingException(m)
+        if rowCount > 0:
+            m = tr(
+                'The central audit logs have been purged since the creation of this package.'
+                ' Abort the current deployment. Please create a new package.'
+            )
+            raise QgsProcessingException(m)
+        feedback.pushInfo(tr('The central audit logs following this package have not been purged.'))
+
         # Get synchronized schemas from text file
         feedback.pushInfo(tr('GET THE LIST OF SYNCHRONIZED TABLES FROM THE FILE sync_tables.txt'))
         with open(os.path.join(dir_path, 'sync_tables.txt')) as f:
@@ -443,22 +528,45 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
         # Run SQL scripts from archive with PSQL command
         feedback.pushInfo(tr('RUN SQL SCRIPT FROM THE DECOMPRESSED ZIP FILE'))
         sql_files = [
-            os.path.join(dir_path, '01_before.sql'),
-            os.path.join(dir_path, '02_predata.sql'),
-            os.path.join(dir_path, '02_data.sql'),
-            os.path.join(dir_path, '03_after.sql'),
-            os.path.join(dir_path, '04_lizsync.sql'),
+            '01_before.sql',
+            '02_predata.sql',
+            data_file,
+            '03_after.sql',
+            '04_lizsync.sql',
         ]
+
+        # Add additional SQL file if present
+        if '99_last.sql' in archive_members:
+            sql_files.append('99_last.sql')
+
+        # Load the SQL files directly from the archive
+        # in one session and one transaction
+        if load_without_extracting:
+            feedback.pushInfo(tr('Load the SQL files from the ZIP archive in one transaction'))
+            sync_tables = [
+                tuple(a.strip().strip('"').split('"."'))
+                for a in tables.split(',')
+            ]
+            status, messages = load_zip_archive(
+                feedback,
+                postgresql_binary_path,
+                connection_name_clone,
+                database_archive_file,
+                sql_files,
+                sync_tables
+            )
+            if not status:
+                m = ' '.join(messages)
+                raise QgsProcessingException(m)
+            msg += ' '.join(messages)
+            sql_files = []
+
+        sql_files = [os.path.join(dir_path, f) for f in sql_files]
         for f in sql_files:
             if not os.path.exists(f):
                 m = tr('SQL files not found') + ': {}'.format(f)
                 raise QgsProcessingException(m)
 
-        # Add additional SQL file if present
-        last_sql = os.path.join(dir_path, '99_last.sql')
-        if os.path.exists(last_sql):
-            sql_files.append(last_sql)
-
         # Build clone database connection parameters for psql
         status, uri, error_message = getUriFromConnectionName(connection_name_clone)
         if not status or not uri:
@@ -494,6 +602,25 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
             try:
                 short_file_name = sql_file.replace(dir_path, '')
                 feedback.pushInfo(tr('Loading file') + ' {0} ...'.format(short_file_name))
+
+                # Restore the data directory with parallel jobs
+                if os.path.isdir(sql_file):
+                    pstatus, pmessages = pg_restore(
+                        feedback,
+                        postgresql_binary_path,
+                        connection_name_clone,
+                        sql_file,
+                        jobs
+                    )
+                    for pmessage in pmessages:
+                        feedback.pushInfo(pmessage)
+                    if not pstatus:
+                        m = tr('Error loading file') + ' {0}'.format(short_file_name)
+                        raise QgsProcessingException(m)
+                    msg += '* {0} -> OK'.format(short_file_name)
+                    shutil.rmtree(sql_file)
+                    continue
+
                 cmd = [
                           pgbin
                       ] + cmdo + [
@@ -605,6 +732,129 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
 
         feedback.pushInfo('')
 
+        # CENTRAL AND CLONE DATABASES
+        # Use the area of interest of the package as the subscription filter of the clone
+        # so that only the central modifications of this area are sent to the clone.
+        # The clone stores the area of its rows, to detect a modification of the area
+        if 'area_of_interest.txt' in archive_members:
+            feedback.pushInfo(tr('ADDING THE AREA OF INTEREST OF THIS CLONE IN THE CENTRAL AND CLONE DATABASES'))
+            with open(os.path.join(dir_path, 'area_of_interest.txt')) as f:
+                area = f.read().strip()
+            sql = '''
+                INSERT INTO lizsync.subscription_filters AS f
+                (server_id, table_schema, table_name, area)
+                SELECT '{0}', (parse_ident(t))[1], (parse_ident(t))[2], '{1}'
+                FROM unnest(ARRAY['{2}']) AS t
+                ON CONFLICT ON CONSTRAINT subscription_filters_pkey
+                DO UPDATE
+                SET area = EXCLUDED.area
+                ;
+            '''.format(
+                clone_id,
+                area.replace("'", "''"),
+                "', '".join([a.strip() for a in tables.split(',')])
+            )
+        else:
+            # The whole tables are in the package
+            sql = '''
+                UPDATE lizsync.subscription_filters
+                SET area = NULL
+                WHERE server_id = '{0}'
+                ;
+            '''.format(
+                clone_id
+            )
+        for connection_name in (connection_name_central, connection_name_clone):
+            header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
+                connection_name,
+                sql
+            )
+            if not ok:
+                m = tr('Error while adding the area of interest in the central and clone databases')
+                m += ' ' + error_message
+                raise QgsProcessingException(m)
+        if 'area_of_interest.txt' in archive_members:
+            feedback.pushInfo(tr('Area of interest added in central and clone databases for this clone'))
+            feedback.pushInfo('')
+
+        # CENTRAL AND CLONE DATABASES
+        # Store the columns sent to the clone for each table
+        # in the central database, to filter the central modifications sent to the clone,
+        # and in the clone database, to filter the clone modifications sent to the central database
+        columns = {}
+        if 'synchronized_columns.txt' in archive_members:
+            feedback.pushInfo(tr('ADDING THE COLUMNS SENT TO THIS CLONE IN THE CENTRAL AND CLONE DATABASES'))
+            with open(os.path.join(dir_path, 'synchronized_columns.txt')) as f:
+                columns = json.load(f)
+        sql = '''
+            UPDATE lizsync.subscription_filters
+            SET column_names = NULL
+            WHERE server_id = '{0}'
+            ;
+            INSERT INTO lizsync.subscription_filters AS f
+            (server_id, table_schema, table_name, column_names)
+            SELECT
+                '{0}', (parse_ident(c.key))[1], (parse_ident(c.key))[2],
+                ARRAY(SELECT jsonb_array_elements_text(c.value))
+            FROM jsonb_each('{1}'::jsonb) AS c
+            ON CONFLICT ON CONSTRAINT subscription_filters_pkey
+            DO UPDATE
+            SET column_names = EXCLUDED.column_names
+            ;
+        '''.format(
+            clone_id,
+            json.dumps(columns).replace("'", "''")
+        )
+        for connection_name in (connection_name_central, connection_name_clone):
+            header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
+                connection_name,
+                sql
+            )
+            if not ok:
+                m = tr('Error while adding the columns sent to the clone')
+                m += ' ' + error_message
+                raise QgsProcessingException(m)
+        if columns:
+            feedback.pushInfo(tr('Columns sent to the clone added in the central and clone databases'))
+            feedback.pushInfo('')
+
+        # CENTRAL AND CLONE DATABASES
+        # Store the tables only synchronized from the central database to the clone
+        read_only_tables = []
+        if 'read_only_tables.txt' in archive_members:
+            feedback.pushInfo(tr('ADDING THE READ ONLY TABLES OF THIS CLONE IN THE CENTRAL AND CLONE DATABASES'))
+            with open(os.path.join(dir_path, 'read_only_tables.txt')) as f:
+                read_only_tables = [t for t in f.read().strip().split(',') if t]
+        sql = '''
+            UPDATE lizsync.subscription_filters
+            SET read_only = False
+            WHERE server_id = '{0}'
+            ;
+            INSERT INTO lizsync.subscription_filters AS f
+            (server_id, table_schema, table_name, read_only)
+            SELECT '{0}', (parse_ident(t))[1], (parse_ident(t))[2], True
+            FROM unnest(ARRAY[{1}]::text[]) AS t
+            ON CONFLICT ON CONSTRAINT subscription_filters_pkey
+            DO UPDATE
+            SET read_only = True
+            ;
+        '''.format(
+            clone_id,
+            ', '.join(["'{0}'".format(t.replace("'", "''")) for t in read_only_tables])
+        )
+        for connection_name in (connection_name_central, connection_name_clone):
+            header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
+                connection_name,
+                sql
+            )
+            if not ok:
+                m = tr('Error while adding the read only tables of the clone')
+                m += ' ' + error_message
+                raise QgsProcessingException(m)
+        if read_only_tables:
+            feedback.pushInfo(tr('Read only tables added in the central and clone databases'))
+            feedback.pushInfo('')
+
         # CLONE DATABASE
         # Add foreign server and foreign schemas for synced schemas
         # We need full connection params: host, port, dbname, user, password
@@ -648,6 +898,10 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
 
         # CENTRAL DATABASE - Add clone Id in the lizsync.history line
         # corresponding to this deployed package
+        # and set the clone cursor to the package maximum event id.
+        # The clone audit log has been recreated: reset its last replayed event id.
+        # The central logs coming from this clone since the package are not in the package:
+        # they must be replayed up to the last central event
         feedback.pushInfo(tr('ADD CLONE ID IN THE CENTRAL DATABASE HISTORY ITEM FOR THIS ARCHIVE DEPLOYEMENT'))
         with open(os.path.join(dir_path, 'sync_id.txt')) as f:
             sync_id = f.readline().strip()
@@ -656,6 +910,25 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
                 SET server_to = array_append(server_to, '{0}')
                 WHERE sync_id = '{1}'
                 ;
+                INSERT INTO lizsync.clone_cursors AS c (
+                    clone_id, last_event_id, last_action_tstamp_tx,
+                    last_sync_id, last_sync_time, catch_up_event_id
+                )
+                SELECT
+                    '{0}', max_event_id, max_action_tstamp_tx, sync_id, now(),
+                    (SELECT max(event_id) FROM audit.logged_actions)
+                FROM lizsync.history
+                WHERE sync_id = '{1}'
+                ON CONFLICT ON CONSTRAINT clone_cursors_pkey
+                DO UPDATE
+                SET
+                    last_event_id = EXCLUDED.last_event_id,
+                    last_action_tstamp_tx = EXCLUDED.last_action_tstamp_tx,
+                    last_sync_id = EXCLUDED.last_sync_id,
+                    last_sync_time = EXCLUDED.last_sync_time,
+                    last_clone_event_id = 0,
+                    catch_up_event_id = EXCLUDED.catch_up_event_id
+                ;
             '''.format(
                 clone_id,
                 sync_id
@@ -674,10 +947,69 @@ class DeployDatabaseServerPackage(BaseProcessingAlgorithm):
                 m+= ' ' + error_message
                 raise QgsProcessingException(m)
 
+        # CLONE DATABASE - Also store the clone cursor in the clone
+        # It is needed to replay a delta package without connection to the central database
+        sql = '''
+            INSERT INTO lizsync.clone_cursors AS c (
+                clone_id, last_event_id, last_action_tstamp_tx,
+                last_sync_id, last_sync_time
+            )
+            SELECT '{0}', max_event_id, max_action_tstamp_tx, sync_id, now()
+            FROM central_lizsync.history
+            WHERE sync_id = '{1}'
+            ON CONFLICT ON CONSTRAINT clone_cursors_pkey
+            DO UPDATE
+            SET
+                last_event_id = EXCLUDED.last_event_id,
+                last_action_tstamp_tx = EXCLUDED.last_action_tstamp_tx,
+                last_sync_id = EXCLUDED.last_sync_id,
+                last_sync_time = EXCLUDED.last_sync_time
+            ;
+        '''.format(
+            clone_id,
+            sync_id
+        )
+        header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
+            connection_name_clone,
+            sql
+        )
+        if ok:
+            feedback.pushInfo(tr('The clone cursor has been stored in the clone database'))
+        else:
+            m = tr('Error while storing the clone cursor in the clone database')
+            m += ' ' + error_message
+            raise QgsProcessingException(m)
+
+        feedback.pushInfo('')
+
+        # CLONE DATABASE - Catch up with the central modifications
+        # made since the creation of the package,
+        # so that an older package can be deployed to new clones
+        feedback.pushInfo(tr('REPLAY THE CENTRAL MODIFICATIONS MADE SINCE THE CREATION OF THE PACKAGE'))
+        sql = '''
+            SELECT *
+            FROM lizsync.synchronize()
+        '''
+        header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
+            connection_name_clone,
+            sql
+        )
+        if not ok:
+            m = tr('Error while replaying the central modifications made since the creation of the package')
+            m += ' ' + error_message
+            raise QgsProcessingException(m)
+        for line in data:
+            feedback.pushInfo(
+                tr('Number of modifications applied from the central server') + ' = {0}'.format(line[0])
+            )
+
         feedback.pushInfo('')
 
         # Delete txt files
         other_files = [o for o in archive_files if not o.endswith('.sql')]
+        other_files.append('area_of_interest.txt')
+        other_files.append('synchronized_columns.txt')
+        other_files.append('read_only_tables.txt')
         for a in other_files:
             f = os.path.join(dir_path, a)
             if os.path.exists(f):
@@ -0,0 +1,214 @@
+__copyright__ = 'Copyright 2020, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+__revision__ = '$Format:%H$'
+
+import os
+import tempfile
+import zipfile
+
+from qgis.core import (
+    Qgis,
+    QgsProcessingException,
+    QgsProcessingParameterString,
+    QgsProcessingParameterFile,
+    QgsProcessingOutputString,
+    QgsProcessingOutputNumber,
+)
+if Qgis.QGIS_VERSION_INT >= 31400:
+    from qgis.core import QgsProcessingParameterProviderConnection
+from .tools import (
+    lizsyncConfig,
+    getUriFromConnectionName,
+    replay_delta_audit_logs,
+)
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.algorithm_processing import BaseProcessingAlgorithm
+
+
+class DeployDeltaPackage(BaseProcessingAlgorithm):
+    CONNECTION_NAME_CLONE = 'CONNECTION_NAME_CLONE'
+    ZIP_FILE = 'ZIP_FILE'
+
+    OUTPUT_STATUS = 'OUTPUT_STATUS'
+    OUTPUT_STRING = 'OUTPUT_STRING'
+
+    def name(self):
+        return 'deploy_delta_package'
+
+    def displayName(self):
+        return tr('Deploy a delta package to the clone')
+
+    def group(self):
+        return tr('02 PostgreSQL synchronization')
+
+    def groupId(self):
+        return 'lizsync_postgresql_sync'
+
+    def shortHelpString(self):
+        short_help = tr(
+            ' Replay in the clone the central database modifications of a delta package,'
+            ' created with the algorithm "Create a delta package with the central database modifications".'
+            '\n'
+            '\n'
+            ' No connection to the central database is needed. The package must follow'
+            ' the last central modifications replayed in the clone.'
+            '\n'
+            '\n'
+            ' The conflicts with the modifications made in the clone are resolved as during a synchronization,'
+            ' and stored in the clone. The modifications made in the clone are kept'
+            ' and sent to the central database during the next synchronization.'
+        )
+        return short_help
+
+    def initAlgorithm(self, config=None):
+        # LizSync config file from ini
+        ls = lizsyncConfig()
+
+        # INPUTS
+
+        # Clone database connection parameters
+        connection_name_clone = ls.variable('postgresql:clone/name')
+        label = tr('PostgreSQL connection to the clone database')
+        if Qgis.QGIS_VERSION_INT >= 31400:
+            param = QgsProcessingParameterProviderConnection(
+                self.CONNECTION_NAME_CLONE,
+                label,
+                "postgres",
+                defaultValue=connection_name_clone,
+                optional=False,
+            )
+        else:
+            param = QgsProcessingParameterString(
+                self.CONNECTION_NAME_CLONE,
+                label,
+                defaultValue=connection_name_clone,
+                optional=False
+            )
+            param.setMetadata({
+                'widget_wrapper': {
+                    'class': 'processing.gui.wrappers_postgis.ConnectionWidgetWrapper'
+                }
+            })
+        tooltip = tr(
+            'The PostgreSQL connection to the clone database.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # Delta package ZIP file
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.ZIP_FILE,
+                tr('Delta package ZIP archive path'),
+                defaultValue=os.path.join(
+                    tempfile.gettempdir(),
+                    'central_database_delta.zip'
+                ),
+                behavior=QgsProcessingParameterFile.File,
+                optional=False,
+                extension='zip'
+            )
+        )
+
+        # OUTPUTS
+        # Add output for message
+        self.addOutput(
+            QgsProcessingOutputNumber(
+                self.OUTPUT_STATUS, tr('Output status')
+            )
+        )
+        self.addOutput(
+            QgsProcessingOutputString(
+                self.OUTPUT_STRING, tr('Output message')
+            )
+        )
+
+    def checkParameterValues(self, parameters, context):
+
+        # Check zip archive path
+        zip_file = self.parameterAsString(parameters, self.ZIP_FILE, context)
+        if not os.path.exists(zip_file):
+            return False, tr("The ZIP archive does not exists in the specified path") + ": {0}".format(zip_file)
+
+        # Check connection
+        connection_name_clone = parameters[self.CONNECTION_NAME_CLONE]
+        ok, uri, msg = getUriFromConnectionName(connection_name_clone, True)
+        if not ok:
+            return False, msg
+
+        return super(DeployDeltaPackage, self).checkParameterValues(parameters, context)
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        Replay the central audit logs of the delta package in the clone
+        """
+        # Parameters
+        connection_name_clone = parameters[self.CONNECTION_NAME_CLONE]
+        zip_file = self.parameterAsString(parameters, self.ZIP_FILE, context)
+
+        # store parameters
+        ls = lizsyncConfig()
+        ls.setVariable('postgresql:clone/name', connection_name_clone)
+        ls.save()
+
+        # Read the package information
+        # The logs are loaded from the archive without extracting them
+        feedback.pushInfo(tr('CHECK THE DELTA PACKAGE'))
+        archive_files = [
+            'delta_audit_logs.csv',
+            'delta_cursor.txt',
+            'sync_id.txt',
+        ]
+        try:
+            with zipfile.ZipFile(zip_file) as zf:
+                archive_members = zf.namelist()
+                for f in archive_files:
+                    if f not in archive_members:
+                        m = tr('One mandatory file has not been found in the ZIP archive') + '  - %s' % f
+                        raise QgsProcessingException(m)
+                sync_id = zf.read('sync_id.txt').decode('utf-8').strip()
+                cursor = zf.read('delta_cursor.txt').decode('utf-8').strip().split(';')
+        except zipfile.BadZipFile:
+            m = tr('Package extraction error')
+            raise QgsProcessingException(m)
+        min_event_id, max_event_id, max_action_tstamp_tx = cursor
+        feedback.pushInfo(tr('* synchronization id') + ' = {0}'.format(sync_id))
+        feedback.pushInfo(tr('* central event ids') + ' = {0} - {1}'.format(
+            int(min_event_id) + 1, max_event_id
+        ))
+        feedback.pushInfo('')
+
+        # Replay the logs in the clone, in one transaction
+        feedback.pushInfo(tr('REPLAY THE CENTRAL MODIFICATIONS IN THE CLONE'))
+        status, counts, message = replay_delta_audit_logs(
+            connection_name_clone,
+            zip_file,
+            'delta_audit_logs.csv',
+            sync_id,
+            int(min_event_id),
+            int(max_event_id),
+            max_action_tstamp_tx
+        )
+        if not status:
+            m = tr('An error occured while replaying the delta package') + ' ' + message
+            raise QgsProcessingException(m)
+        feedback.pushInfo(message)
+
+        # Output messages
+        b = tr('Number of modifications replayed in the clone')
+        b += ' = %s' % counts[0]
+        c = tr('Number of conflicts resolved')
+        c += ' = %s' % counts[1]
+        feedback.pushInfo(b)
+        feedback.pushInfo(c)
+
+        msg = tr('The delta package has been successfully deployed to the clone.')
+        output = {
+            self.OUTPUT_STATUS: 1,
+            self.OUTPUT_STRING: msg + ' ' + ', '.join([b, c])
+        }
+        return output
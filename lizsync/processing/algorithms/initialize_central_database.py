@@ -57,6 +57,7 @@ class InitializeCentralDatabase(BaseProcessingAlgorithm):
     ADD_SERVER_ID = 'ADD_SERVER_ID'
     ADD_UID_COLUMNS = 'ADD_UID_COLUMNS'
     ADD_AUDIT_TRIGGERS = 'ADD_AUDIT_TRIGGERS'
+    EXCLUDED_COLUMNS = 'EXCLUDED_COLUMNS'
 
     OUTPUT_STATUS = 'OUTPUT_STATUS'
     OUTPUT_STRING = 'OUTPUT_STRING'
@@ -88,6 +89,11 @@ class InitializeCentralDatabase(BaseProcessingAlgorithm):
             '\n'
             '\n'
             ' You can pass a list of PostgreSQL central database schemas and this alg will add the necessary data and tools'
+            '\n'
+            '\n'
+            ' The columns excluded from the synchronization, such as last modification dates or computed areas,'
+            ' are not logged by the added audit triggers: their modifications are neither replayed'
+            ' nor analysed for conflicts.'
         )
         return short_help
 
@@ -175,6 +181,17 @@ class InitializeCentralDatabase(BaseProcessingAlgorithm):
             )
         )
 
+        # Columns excluded from the audit logs
+        excluded_columns = ls.variable('general/excluded_columns')
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.EXCLUDED_COLUMNS,
+                tr('Comma separated column names excluded from the synchronization'),
+                defaultValue=excluded_columns,
+                optional=True
+            )
+        )
+
         # OUTPUTS
         # Add output for status (integer)
         self.addOutput(
@@ -241,11 +258,13 @@ class InitializeCentralDatabase(BaseProcessingAlgorithm):
         add_server_id = self.parameterAsBool(parameters, self.ADD_SERVER_ID, context)
         add_audit_triggers = self.parameterAsBool(parameters, self.ADD_AUDIT_TRIGGERS, context)
         synchronized_schemas = parameters[self.SCHEMAS].strip()
+        excluded_columns = self.parameterAsString(parameters, self.EXCLUDED_COLUMNS, context).strip()
 
         # store parameters
         ls = lizsyncConfig()
         ls.setVariable('postgresql:central/name', connection_name_central)
         ls.setVariable('postgresql:central/schemas', synchronized_schemas)
+        ls.setVariable('general/excluded_columns', excluded_columns)
         ls.save()
 
         # Structure
@@ -339,7 +358,9 @@ class InitializeCentralDatabase(BaseProcessingAlgorithm):
             feedback.pushInfo(tr('ADD AUDIT TRIGGERS IN ALL THE TABLES OF THE GIVEN SCHEMAS'))
             status, message = add_database_audit_triggers(
                 connection_name_central,
-                synchronized_schemas
+                synchronized_schemas,
+                None,
+                excluded_columns
             )
             if not status:
                 raise QgsProcessingException(message)
@@ -13,7 +13,9 @@ __author__ = '3liz'
 __date__ = '2018-12-19'
 __copyright__ = '(C) 2018 by 3liz'
 
+import json
 import os
+import shutil
 import tempfile
 import zipfile
 
@@ -21,11 +23,15 @@ from platform import system as psys
 
 from qgis.core import (
     Qgis,
+    QgsGeometry,
     QgsProcessing,
     QgsProcessingException,
     QgsProcessingParameterString,
     QgsProcessingParameterBoolean,
+    QgsProcessingParameterExtent,
+    QgsProcessingParameterFeatureSource,
     QgsProcessingParameterMultipleLayers,
+    QgsProcessingParameterNumber,
     QgsProcessingParameterFile,
     QgsProcessingParameterFileDestination,
     QgsProcessingOutputString,
@@ -43,7 +49,11 @@ from .tools import (
     add_database_uid_columns,
     lizsyncConfig,
     getUriFromConnectionName,
-    fetchDataFromSqlQuery,
+    export_database_snapshot,
+    filter_package_data,
+    get_package_cache_file,
+    get_cached_package_file,
+    store_cached_package_file,
     pg_dump,
 )
 from ...qgis_plugin_tools.tools.i18n import tr
@@ -60,11 +70,17 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
     # calling from the QGIS console.
     CONNECTION_NAME_CENTRAL = 'CONNECTION_NAME_CENTRAL'
     PG_LAYERS = 'PG_LAYERS'
+    READ_ONLY_LAYERS = 'READ_ONLY_LAYERS'
     ADD_UID_COLUMNS = 'ADD_UID_COLUMNS'
     ADD_AUDIT_TRIGGERS = 'ADD_AUDIT_TRIGGERS'
     POSTGRESQL_BINARY_PATH = 'POSTGRESQL_BINARY_PATH'
+    JOBS = 'JOBS'
     ZIP_FILE = 'ZIP_FILE'
+    EXCLUDED_COLUMNS = 'EXCLUDED_COLUMNS'
     ADDITIONAL_SQL_FILE = 'ADDITIONAL_SQL_FILE'
+    AREA_EXTENT = 'AREA_EXTENT'
+    AREA_LAYER = 'AREA_LAYER'
+    SYNCHRONIZED_COLUMNS = 'SYNCHRONIZED_COLUMNS'
     OUTPUT_STATUS = 'OUTPUT_STATUS'
     OUTPUT_STRING = 'OUTPUT_STRING'
 
@@ -94,6 +110,34 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             ' or remove some constraints. For example "DELETE FROM pg_trigger WHERE tgname = \'name_of_trigger\';"'
             '\n'
             '\n'
+            ' The columns excluded from the synchronization are not logged by the added audit triggers.'
+            ' The audit triggers of the clone exclude the same columns as the ones of the central database.'
+            '\n'
+            '\n'
+            ' You can give the extent or the polygons of the area of interest of a clone.'
+            ' Only the features of the tables intersecting this area are then packaged,'
+            ' with the rows of the other tables referencing them, and all the rows they reference.'
+            ' The tables without geometry are packaged with all their rows.'
+            '\n'
+            '\n'
+            ' You can also give the columns sent to the clone for some tables,'
+            ' for example "schema.table.column_a, schema.table.column_b".'
+            ' The other columns of these tables are empty in the clone,'
+            ' and their modifications are not synchronized with this clone.'
+            ' The uid, the primary key and the NOT NULL columns are always sent.'
+            '\n'
+            '\n'
+            ' The layers not edited in the field, such as reference layers, are only synchronized'
+            ' from the central database to the clone: they are not audited in the clone,'
+            ' and their modifications made in the clone are not sent to the central database.'
+            '\n'
+            '\n'
+            ' The SQL files of the structure of the schemas are kept in the folder "LizSync_cache",'
+            ' next to the LizSync.ini configuration file, and reused by the next packages'
+            ' as long as the structure of the schemas has not changed.'
+            ' Only the data is then dumped again.'
+            '\n'
+            '\n'
             ' An internet connection is needed because a synchronization item must be written'
             ' to the central database "lizsync.history" table during the process.'
             ' and obviously data must be downloaded from the central database'
@@ -152,6 +196,24 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             )
         )
 
+        # Number of parallel jobs of pg_dump
+        param = QgsProcessingParameterNumber(
+            self.JOBS,
+            tr('Number of parallel jobs'),
+            defaultValue=os.cpu_count() or 1,
+            minValue=1,
+            optional=False
+        )
+        tooltip = tr(
+            'Number of tables dumped in parallel by pg_dump.'
+            ' By default, the number of processors of this computer.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
         # PostgreSQL layers
         self.addParameter(
             QgsProcessingParameterMultipleLayers(
@@ -162,6 +224,23 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             )
         )
 
+        # Layers only synchronized from the central database to the clone
+        param = QgsProcessingParameterMultipleLayers(
+            self.READ_ONLY_LAYERS,
+            tr('PostgreSQL Layers not edited in the field'),
+            QgsProcessing.TypeVector,
+            optional=True,
+        )
+        tooltip = tr(
+            'Layers among the layers to edit, such as reference layers, only synchronized'
+            ' from the central database to the clone. They are not audited in the clone.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
         # Add uid columns in all the tables of the synchronized schemas
         self.addParameter(
             QgsProcessingParameterBoolean(
@@ -182,6 +261,17 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             )
         )
 
+        # Columns excluded from the audit logs
+        excluded_columns = ls.variable('general/excluded_columns')
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.EXCLUDED_COLUMNS,
+                tr('Comma separated column names excluded from the synchronization'),
+                defaultValue=excluded_columns,
+                optional=True
+            )
+        )
+
         # Additionnal SQL file to run on the clone
         additional_sql_file = ls.variable('general/additional_sql_file')
         self.addParameter(
@@ -195,6 +285,57 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             )
         )
 
+        # Area of interest of the clone
+        param = QgsProcessingParameterExtent(
+            self.AREA_EXTENT,
+            tr('Extent of the area of interest of the clone'),
+            optional=True
+        )
+        tooltip = tr(
+            'Only the features intersecting this extent are packaged,'
+            ' with the rows they reference.'
+            ' If empty, all the rows of the tables are packaged.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        param = QgsProcessingParameterFeatureSource(
+            self.AREA_LAYER,
+            tr('Polygons of the area of interest of the clone'),
+            [QgsProcessing.TypeVectorPolygon],
+            optional=True
+        )
+        tooltip = tr(
+            'Only the features intersecting these polygons are packaged,'
+            ' with the rows they reference. It replaces the extent.'
+            ' If empty, all the rows of the tables are packaged.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # Columns sent to the clone
+        param = QgsProcessingParameterString(
+            self.SYNCHRONIZED_COLUMNS,
+            tr('Columns sent to the clone'),
+            optional=True
+        )
+        tooltip = tr(
+            'Comma separated list of the columns sent to the clone, as schema.table.column.'
+            ' The other columns of the listed tables are empty in the clone.'
+            ' If empty, all the columns of the tables are sent.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
         # Output zip file destination
         database_archive_file = ls.variable('general/database_archive_file')
         if not database_archive_file:
@@ -332,8 +473,10 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
         # Parameters
         connection_name_central = parameters[self.CONNECTION_NAME_CENTRAL]
         postgresql_binary_path = parameters[self.POSTGRESQL_BINARY_PATH]
+        jobs = self.parameterAsInt(parameters, self.JOBS, context)
         add_uid_columns = self.parameterAsBool(parameters, self.ADD_UID_COLUMNS, context)
         add_audit_triggers = self.parameterAsBool(parameters, self.ADD_AUDIT_TRIGGERS, context)
+        excluded_columns = self.parameterAsString(parameters, self.EXCLUDED_COLUMNS, context).strip()
         additional_sql_file = self.parameterAsString(
             parameters,
             self.ADDITIONAL_SQL_FILE,
@@ -352,6 +495,60 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
                 schemas.append(schema)
         synchronized_schemas = ','.join(schemas)
 
+        # Tables only synchronized from the central database to the clone
+        read_only_layers = self.parameterAsLayerList(parameters, self.READ_ONLY_LAYERS, context)
+        read_only_tables = []
+        for layer in read_only_layers:
+            if layer.providerType() != 'postgres':
+                continue
+            uri = layer.dataProvider().uri()
+            table = '"' + uri.schema() + '"."' + uri.table() + '"'
+            if table not in tables:
+                raise QgsProcessingException(
+                    tr('The layer {0} not edited in the field is not in the package').format(layer.name())
+                )
+            if table not in read_only_tables:
+                read_only_tables.append(table)
+        audited_tables = [table for table in tables if table not in read_only_tables]
+
+        # Area of interest, as EWKT
+        area = None
+        area_geometry = None
+        if parameters.get(self.AREA_LAYER):
+            source = self.parameterAsSource(parameters, self.AREA_LAYER, context)
+            area_geometry = QgsGeometry.unaryUnion(
+                [feature.geometry() for feature in source.getFeatures() if feature.hasGeometry()]
+            )
+            area_crs = source.sourceCrs()
+        elif parameters.get(self.AREA_EXTENT):
+            area_geometry = QgsGeometry.fromRect(
+                self.parameterAsExtent(parameters, self.AREA_EXTENT, context)
+            )
+            area_crs = self.parameterAsExtentCrs(parameters, self.AREA_EXTENT, context)
+        if area_geometry is not None:
+            if area_geometry.isEmpty():
+                raise QgsProcessingException(tr('The area of interest is empty'))
+            area = 'SRID={0};{1}'.format(area_crs.postgisSrid(), area_geometry.asWkt())
+
+        # Columns sent to the clone, for each table
+        columns = {}
+        synchronized_columns = self.parameterAsString(parameters, self.SYNCHRONIZED_COLUMNS, context)
+        for item in synchronized_columns.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            names = item.split('.')
+            if len(names) != 3:
+                raise QgsProcessingException(
+                    tr('The column {0} must be given as schema.table.column').format(item)
+                )
+            table = '"' + names[0] + '"."' + names[1] + '"'
+            if table not in tables:
+                raise QgsProcessingException(
+                    tr('The table of the column {0} is not in the package').format(item)
+                )
+            columns.setdefault(table, []).append(names[2])
+
         # store parameters
         ls = lizsyncConfig()
         ls.setVariable('postgresql:central/name', connection_name_central)
@@ -359,6 +556,7 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
         ls.setVariable('postgresql:central/schemas', synchronized_schemas)
         ls.setVariable('general/additional_sql_file', additional_sql_file)
         ls.setVariable('general/database_archive_file', zip_file)
+        ls.setVariable('general/excluded_columns', excluded_columns)
         ls.save()
 
         # Add the asked configuration: uid and triggers
@@ -377,7 +575,8 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             status, message = add_database_audit_triggers(
                 connection_name_central,
                 None,
-                tables
+                tables,
+                excluded_columns
             )
             if not status:
                 raise QgsProcessingException(message)
@@ -397,7 +596,7 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
         sql_file_list = [
             '01_before.sql',
             '02_predata.sql',
-            '02_data.sql',
+            '02_data',
             '03_after.sql',
             '04_lizsync.sql',
             'sync_id.txt',
@@ -467,132 +666,22 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             feedback.pushInfo(tr('File 01_before.sql created'))
         feedback.pushInfo('')
 
-        # 2/a) 02_predata.sql
-        ####
-        # First we get functions from the needed schemas
-        feedback.pushInfo(tr('CREATE SCRIPT 02_predata.sql'))
-        # compute the tables options: we need to exclude all tables from schema
-        # even if no data is fetched to allow pg_dump to create the needed related functions
-        # for example functions used in triggers
-        # ex: pg_dump service='test' -Fp --schema-only -n my_schema --no-acl --no-owner -T '"my_schema".*'
-        excluded_tables_params = []
-        for schema in schemas:
-            excluded_tables_params.append(
-                '-T "{}".*'.format(schema)
-            )
-        pstatus, pmessages = pg_dump(
-            feedback,
-            postgresql_binary_path,
-            connection_name_central,
-            sql_files['02_predata.sql'] + '.tpl',
-            schemas,
-            None,
-            ['--schema-only'] + excluded_tables_params
-        )
-        for pmessage in pmessages:
-            feedback.pushInfo(pmessage)
-        if not pstatus:
-            m = ' '.join(pmessages)
-            raise QgsProcessingException(m)
-
-        # We need to remove unwanted SQL statements
-        with open(sql_files['02_predata.sql'] + '.tpl', 'r') as input_file:
-            filedata = input_file.read()
-        newdata = filedata
-        replacements = [
-            ['CREATE SCHEMA ', 'CREATE SCHEMA IF NOT EXISTS '],
-            ['CREATE FUNCTION ', 'CREATE OR REPLACE FUNCTION '],
-        ]
-        for item in replacements:
-            newdata = newdata.replace(item[0], item[1])
-        with open(sql_files['02_predata.sql'], 'w') as output_file:
-            output_file.write(newdata)
-        os.remove(sql_files['02_predata.sql'] + '.tpl')
-        feedback.pushInfo(tr('File 02_predata.sql created'))
-        feedback.pushInfo('')
-
-        # 2/b) 02_data.sql
-        ####
-        # Then we get the actual data for the needed tables of these schemas
-        feedback.pushInfo(tr('CREATE SCRIPT 02_data.sql'))
-        pstatus, pmessages = pg_dump(
-            feedback,
-            postgresql_binary_path,
-            connection_name_central,
-            sql_files['02_data.sql'],
-            schemas,
-            tables,
-            []
-        )
-        for pmessage in pmessages:
-            feedback.pushInfo(pmessage)
-        if not pstatus:
-            m = ' '.join(pmessages)
-            raise QgsProcessingException(m)
-        feedback.pushInfo(tr('File 02_data.sql created'))
-        feedback.pushInfo('')
-
-        # 3/ 03_after.sql
+        # 1/b) sync_id.txt
+        # Export a snapshot of the central database, used by all the dumps,
+        # and add the new sync history item in the same transaction
+        # so that its maximum event id matches the dumped data
         ####
-        feedback.pushInfo(tr('CREATE SCRIPT 03_after.sql'))
-        sql = ''
-
-        # Add audit trigger for these tables in given schemas
-        # only for needed tables
-        sql += '''
-            SELECT audit.audit_table((quote_ident(table_schema) || '.' || quote_ident(table_name))::text)
-            FROM information_schema.tables AS t
-            WHERE True
-            AND table_type = 'BASE TABLE'
-        '''
-        sql += " AND concat('\"', t.table_schema, '\".\"', t.table_name, '\"') IN ( "
-        sql += ', '.join(["'{}'".format(table) for table in tables])
-        sql += ")"
-        # feedback.pushInfo(sql)
-
-        # write content into temp file
-        with open(sql_files['03_after.sql'], 'w') as f:
-            f.write(sql)
-            feedback.pushInfo(tr('File 03_after.sql created'))
-
-        feedback.pushInfo('')
-
-        #  4/ 04_lizsync.sql
-        # Add lizsync schema structure
-        # We get it from central database to be sure everything will be compatible
-        feedback.pushInfo(tr('CREATE SCRIPT 04_lizsync.sql'))
-        pstatus, pmessages = pg_dump(
-            feedback,
-            postgresql_binary_path,
-            connection_name_central,
-            sql_files['04_lizsync.sql'],
-            ['lizsync'],
-            None,
-            ['--schema-only']
+        feedback.pushInfo(tr('EXPORT A SNAPSHOT OF THE CENTRAL DATABASE'))
+        snapshot_connection, snapshot, message = export_database_snapshot(
+            connection_name_central
         )
-        for pmessage in pmessages:
-            feedback.pushInfo(pmessage)
-        if not pstatus:
-            m = ' '.join(pmessages)
+        if not snapshot_connection:
+            m = tr('The snapshot of the central database could not be exported')
+            m += ' ' + message
             raise QgsProcessingException(m)
-
+        feedback.pushInfo(message)
         feedback.pushInfo('')
 
-        # 5/ sync_tables.txt
-        # Add tables into file
-        ####
-        # todo: write the list of tables instead
-        feedback.pushInfo(tr('ADD SYNCHRONIZED TABLES TO THE FILE sync_tables.txt'))
-        with open(sql_files['sync_tables.txt'], 'w') as f:
-            f.write(','.join(tables))
-            feedback.pushInfo(tr('File sync_tables.txt created'))
-
-        feedback.pushInfo('')
-
-        # 6/ sync_id.txt
-        # Add new sync history item in the central database
-        # and get sync_id
-        ####
         feedback.pushInfo(tr('ADD NEW SYNC HISTORY ITEM IN CENTRAL DATABASE'))
         sql = '''
             INSERT INTO lizsync.history
@@ -609,32 +698,277 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
             )
             RETURNING sync_id;
         '''
-        header, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
-            connection_name_central,
-            sql
-        )
-        if ok:
-            sync_id = ''
-            for a in data:
+        sync_id = ''
+        error_message = ''
+        try:
+            cur = snapshot_connection.cursor()
+            cur.execute(sql)
+            for a in cur.fetchall():
                 sync_id = a[0]
-            if sync_id:
-                msg = tr('New synchronization history item has been added in the central database')
-                msg += ' : syncid = {0}'.format(sync_id)
-                feedback.pushInfo(msg)
-                with open(sql_files['sync_id.txt'], 'w') as f:
-                    f.write(sync_id)
-                    feedback.pushInfo(tr('File sync_id.txt created'))
-            else:
-                m = tr('No synchronization item could be added !')
-                m += ' '
-                m += msg
-                m += ' '
-                m += error_message
-                raise QgsProcessingException(m)
+            cur.close()
+        except Exception as e:
+            error_message = str(e)
+        if sync_id:
+            msg = tr('New synchronization history item has been added in the central database')
+            msg += ' : syncid = {0}'.format(sync_id)
+            feedback.pushInfo(msg)
+            with open(sql_files['sync_id.txt'], 'w') as f:
+                f.write(sync_id)
+                feedback.pushInfo(tr('File sync_id.txt created'))
         else:
+            snapshot_connection.close()
             m = tr('No synchronization item could be added !')
             m += ' ' + error_message
             raise QgsProcessingException(m)
+        feedback.pushInfo('')
+
+        # The dumps read the data of the snapshot
+        # The history item is only committed if all the dumps succeed
+        try:
+            # 2/a) 02_predata.sql
+            ####
+            # First we get functions from the needed schemas
+            feedback.pushInfo(tr('CREATE SCRIPT 02_predata.sql'))
+            # compute the tables options: we need to exclude all tables from schema
+            # even if no data is fetched to allow pg_dump to create the needed related functions
+            # for example functions used in triggers
+            # ex: pg_dump service='test' -Fp --schema-only -n my_schema --no-acl --no-owner -T '"my_schema".*'
+            excluded_tables_params = []
+            for schema in schemas:
+                excluded_tables_params.append(
+                    '-T "{}".*'.format(schema)
+                )
+            predata_parameters = ['--schema-only'] + excluded_tables_params
+
+            # Reuse the file of a previous package if the structure of the schemas has not changed
+            cache_file = get_package_cache_file(
+                snapshot_connection,
+                postgresql_binary_path,
+                '02_predata.sql',
+                schemas,
+                predata_parameters
+            )
+            if get_cached_package_file(cache_file, sql_files['02_predata.sql']):
+                feedback.pushInfo(tr('The structure of the schemas has not changed since the previous package'))
+                feedback.pushInfo(tr('File 02_predata.sql reused from the cache'))
+            else:
+                pstatus, pmessages = pg_dump(
+                    feedback,
+                    postgresql_binary_path,
+                    connection_name_central,
+                    sql_files['02_predata.sql'] + '.tpl',
+                    schemas,
+                    None,
+                    predata_parameters + ['--snapshot={0}'.format(snapshot)]
+                )
+                for pmessage in pmessages:
+                    feedback.pushInfo(pmessage)
+                if not pstatus:
+                    m = ' '.join(pmessages)
+                    raise QgsProcessingException(m)
+
+                # We need to remove unwanted SQL statements
+                with open(sql_files['02_predata.sql'] + '.tpl', 'r') as input_file:
+                    filedata = input_file.read()
+                newdata = filedata
+                replacements = [
+                    ['CREATE SCHEMA ', 'CREATE SCHEMA IF NOT EXISTS '],
+                    ['CREATE FUNCTION ', 'CREATE OR REPLACE FUNCTION '],
+                ]
+                for item in replacements:
+                    newdata = newdata.replace(item[0], item[1])
+                with open(sql_files['02_predata.sql'], 'w') as output_file:
+                    output_file.write(newdata)
+                os.remove(sql_files['02_predata.sql'] + '.tpl')
+                store_cached_package_file(sql_files['02_predata.sql'], cache_file)
+                feedback.pushInfo(tr('File 02_predata.sql created'))
+            feedback.pushInfo('')
+
+            # 2/b) 02_data
+            ####
+            # Then we get the actual data for the needed tables of these schemas
+            # They are dumped in a directory, with one file per table
+            # and with parallel jobs, to be restored with pg_restore
+            feedback.pushInfo(tr('CREATE DIRECTORY 02_data'))
+            pstatus, pmessages = pg_dump(
+                feedback,
+                postgresql_binary_path,
+                connection_name_central,
+                sql_files['02_data'],
+                schemas,
+                tables,
+                ['--snapshot={0}'.format(snapshot)],
+                'd',
+                jobs
+            )
+            for pmessage in pmessages:
+                feedback.pushInfo(pmessage)
+            if not pstatus:
+                m = ' '.join(pmessages)
+                raise QgsProcessingException(m)
+            feedback.pushInfo(tr('Directory 02_data created'))
+            feedback.pushInfo('')
+
+            # Keep only the rows of the area of interest and the columns sent to the clone
+            # They are read in the snapshot, and replace the data dumped by pg_dump
+            if area or columns:
+                feedback.pushInfo(tr('FILTER THE DATA WITH THE AREA OF INTEREST AND THE COLUMNS'))
+                counts = filter_package_data(
+                    snapshot_connection,
+                    postgresql_binary_path,
+                    sql_files['02_data'],
+                    tables,
+                    area,
+                    columns
+                )
+                for table_schema, table_name, number_rows, excluded_columns in counts:
+                    if number_rows is not None:
+                        feedback.pushInfo(
+                            tr('Table {0}.{1}: {2} rows kept').format(
+                                table_schema, table_name, number_rows
+                            )
+                        )
+                    if excluded_columns:
+                        feedback.pushInfo(
+                            tr('Table {0}.{1}: columns not sent {2}').format(
+                                table_schema, table_name, ', '.join(excluded_columns)
+                            )
+                        )
+                feedback.pushInfo('')
+
+            # 3/ 03_after.sql
+            ####
+            feedback.pushInfo(tr('CREATE SCRIPT 03_after.sql'))
+            sql = ''
+
+            if audited_tables:
+                # Columns excluded from the audit logs of each table in the central database
+                # The clone must not log them either
+                cur = snapshot_connection.cursor()
+                cur.execute(
+                    '''
+                    SELECT format('(%%L, %%L)', t, lizsync.get_audit_excluded_columns(to_regclass(t)))
+                    FROM unnest(%s::text[]) AS t
+                    ''',
+                    (audited_tables, )
+                )
+                audit_excluded_columns = [a[0] for a in cur.fetchall()]
+                cur.close()
+
+                # Add audit trigger for these tables in given schemas
+                # only for needed tables
+                sql += '''
+                    SELECT audit.audit_table(
+                        (quote_ident(table_schema) || '.' || quote_ident(table_name))::regclass,
+                        True, True, e.excluded_columns::text[]
+                    )
+                    FROM information_schema.tables AS t
+                    INNER JOIN (
+                        VALUES
+                '''
+                sql += ', '.join(audit_excluded_columns)
+                sql += '''
+                    ) AS e (table_name, excluded_columns)
+                        ON e.table_name = concat('"', t.table_schema, '"."', t.table_name, '"')
+                    WHERE True
+                    AND table_type = 'BASE TABLE'
+                    ;
+                '''
+
+            # Remove the audit triggers of the central database restored with the data
+            # of the tables only synchronized from the central database
+            for table in read_only_tables:
+                for trigger in ('row', 'stm', 'ins', 'upd', 'del'):
+                    sql += 'DROP TRIGGER IF EXISTS audit_trigger_{0} ON {1};\n'.format(trigger, table)
+            # feedback.pushInfo(sql)
+
+            # write content into temp file
+            with open(sql_files['03_after.sql'], 'w') as f:
+                f.write(sql)
+                feedback.pushInfo(tr('File 03_after.sql created'))
+
+            feedback.pushInfo('')
+
+            #  4/ 04_lizsync.sql
+            # Add lizsync schema structure
+            # We get it from central database to be sure everything will be compatible
+            feedback.pushInfo(tr('CREATE SCRIPT 04_lizsync.sql'))
+            lizsync_parameters = ['--schema-only']
+            cache_file = get_package_cache_file(
+                snapshot_connection,
+                postgresql_binary_path,
+                '04_lizsync.sql',
+                ['lizsync'],
+                lizsync_parameters
+            )
+            if get_cached_package_file(cache_file, sql_files['04_lizsync.sql']):
+                feedback.pushInfo(tr('The structure of the schema lizsync has not changed since the previous package'))
+                feedback.pushInfo(tr('File 04_lizsync.sql reused from the cache'))
+            else:
+                pstatus, pmessages = pg_dump(
+                    feedback,
+                    postgresql_binary_path,
+                    connection_name_central,
+                    sql_files['04_lizsync.sql'],
+                    ['lizsync'],
+                    None,
+                    lizsync_parameters + ['--snapshot={0}'.format(snapshot)]
+                )
+                for pmessage in pmessages:
+                    feedback.pushInfo(pmessage)
+                if not pstatus:
+                    m = ' '.join(pmessages)
+                    raise QgsProcessingException(m)
+                store_cached_package_file(sql_files['04_lizsync.sql'], cache_file)
+
+            feedback.pushInfo('')
+        except Exception:
+            snapshot_connection.rollback()
+            snapshot_connection.close()
+            raise
+        snapshot_connection.commit()
+        snapshot_connection.close()
+
+        # 5/ sync_tables.txt
+        # Add tables into file
+        ####
+        # todo: write the list of tables instead
+        feedback.pushInfo(tr('ADD SYNCHRONIZED TABLES TO THE FILE sync_tables.txt'))
+        with open(sql_files['sync_tables.txt'], 'w') as f:
+            f.write(','.join(tables))
+            feedback.pushInfo(tr('File sync_tables.txt created'))
+
+        feedback.pushInfo('')
+
+        # 6/ area_of_interest.txt
+        # The area is used as the subscription filter of the clone
+        # when the package is deployed
+        if area:
+            sql_files['area_of_interest.txt'] = os.path.join(tmpdir, 'area_of_interest.txt')
+            with open(sql_files['area_of_interest.txt'], 'w') as f:
+                f.write(area)
+                feedback.pushInfo(tr('File area_of_interest.txt created'))
+            feedback.pushInfo('')
+
+        # 7/ synchronized_columns.txt
+        # The columns sent to the clone for each table, as JSON,
+        # are used as the subscription filter of the clone when the package is deployed
+        if columns:
+            sql_files['synchronized_columns.txt'] = os.path.join(tmpdir, 'synchronized_columns.txt')
+            with open(sql_files['synchronized_columns.txt'], 'w') as f:
+                f.write(json.dumps(columns))
+                feedback.pushInfo(tr('File synchronized_columns.txt created'))
+            feedback.pushInfo('')
+
+        # 8/ read_only_tables.txt
+        # The tables only synchronized from the central database to the clone
+        # are stored in the subscription filter of the clone when the package is deployed
+        if read_only_tables:
+            sql_files['read_only_tables.txt'] = os.path.join(tmpdir, 'read_only_tables.txt')
+            with open(sql_files['read_only_tables.txt'], 'w') as f:
+                f.write(','.join(read_only_tables))
+                feedback.pushInfo(tr('File read_only_tables.txt created'))
+            feedback.pushInfo('')
 
         # Additional SQL file to run
         if additional_sql_file and os.path.isfile(additional_sql_file):
@@ -651,19 +985,31 @@ class PackageCentralDatabase(BaseProcessingAlgorithm):
 
         with zipfile.ZipFile(zip_file, mode='w') as zf:
             for fname, fsource in sql_files.items():
-                try:
-                    zf.write(
-                        fsource,
-                        arcname=fname,
-                        compress_type=compression
-                    )
-                except Exception:
-                    msg += tr("Error while zipping file") + ': ' + fname
-                    raise QgsProcessingException(msg)
+                # The files of the data directory are added in a subfolder
+                # The data files are already compressed by pg_dump
+                if os.path.isdir(fsource):
+                    members = [
+                        (os.path.join(fsource, a), fname + '/' + a, zipfile.ZIP_STORED)
+                        for a in sorted(os.listdir(fsource))
+                    ]
+                else:
+                    members = [(fsource, fname, compression)]
+                for member_source, member_name, member_compression in members:
+                    try:
+                        zf.write(
+                            member_source,
+                            arcname=member_name,
+                            compress_type=member_compression
+                        )
+                    except Exception:
+                        msg += tr("Error while zipping file") + ': ' + member_name
+                        raise QgsProcessingException(msg)
 
         # Remove files
         for fname, fsource in sql_files.items():
-            if os.path.exists(fsource):
+            if os.path.isdir(fsource):
+                shutil.rmtree(fsource)
+            elif os.path.exists(fsource):
                 os.remove(fsource)
 
         msg = tr('Package has been successfully created !')
@@ -0,0 +1,253 @@
+__copyright__ = 'Copyright 2020, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+__revision__ = '$Format:%H$'
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+from qgis.core import (
+    Qgis,
+    QgsProcessingException,
+    QgsProcessingParameterString,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingOutputString,
+    QgsProcessingOutputNumber,
+)
+if Qgis.QGIS_VERSION_INT >= 31400:
+    from qgis.core import QgsProcessingParameterProviderConnection
+from .tools import (
+    lizsyncConfig,
+    getUriFromConnectionName,
+    export_delta_audit_logs,
+)
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.algorithm_processing import BaseProcessingAlgorithm
+
+
+class PackageCentralDatabaseDelta(BaseProcessingAlgorithm):
+    CONNECTION_NAME_CENTRAL = 'CONNECTION_NAME_CENTRAL'
+    CLONE_ID = 'CLONE_ID'
+    SYNC_ID = 'SYNC_ID'
+    ZIP_FILE = 'ZIP_FILE'
+
+    OUTPUT_STATUS = 'OUTPUT_STATUS'
+    OUTPUT_STRING = 'OUTPUT_STRING'
+
+    def name(self):
+        return 'package_central_database_delta'
+
+    def displayName(self):
+        return tr('Create a delta package with the central database modifications')
+
+    def group(self):
+        return tr('02 PostgreSQL synchronization')
+
+    def groupId(self):
+        return 'lizsync_postgresql_sync'
+
+    def shortHelpString(self):
+        short_help = tr(
+            ' Package the modifications made in the central database since a synchronization of a clone'
+            ' into a ZIP archive, named by default "central_database_delta.zip".'
+            '\n'
+            '\n'
+            ' Only the audit logs of the tables synchronized by the clone are exported,'
+            ' reduced to the net effect of the modifications of each object.'
+            ' The size of the package depends on the number of modifications, not on the size of the data.'
+            '\n'
+            '\n'
+            ' By default, the package follows the last synchronization of the clone known by the central database.'
+            ' The package can be replayed in the clone without connection to the central database'
+            ' with the algorithm "Deploy a delta package to the clone".'
+        )
+        return short_help
+
+    def initAlgorithm(self, config=None):
+        # LizSync config file from ini
+        ls = lizsyncConfig()
+
+        # INPUTS
+
+        # Central database connection name
+        connection_name_central = ls.variable('postgresql:central/name')
+        label = tr('PostgreSQL connection to the central database')
+        if Qgis.QGIS_VERSION_INT >= 31400:
+            param = QgsProcessingParameterProviderConnection(
+                self.CONNECTION_NAME_CENTRAL,
+                label,
+                "postgres",
+                defaultValue=connection_name_central,
+                optional=False,
+            )
+        else:
+            param = QgsProcessingParameterString(
+                self.CONNECTION_NAME_CENTRAL,
+                label,
+                defaultValue=connection_name_central,
+                optional=False
+            )
+            param.setMetadata({
+                'widget_wrapper': {
+                    'class': 'processing.gui.wrappers_postgis.ConnectionWidgetWrapper'
+                }
+            })
+        tooltip = tr(
+            'The PostgreSQL connection to the central database.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # Clone server id
+        param = QgsProcessingParameterString(
+            self.CLONE_ID,
+            tr('Clone server id'),
+            optional=False
+        )
+        tooltip = tr(
+            'The server id of the clone, stored in its table lizsync.server_metadata.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # Synchronization id
+        param = QgsProcessingParameterString(
+            self.SYNC_ID,
+            tr('Synchronization id of the last central modifications replayed in the clone'),
+            optional=True
+        )
+        tooltip = tr(
+            'The id of the synchronization, in the table lizsync.history, after which the central modifications'
+            ' are packaged: the deployment of a package, a synchronization or a previous delta package.'
+            ' If empty, the last synchronization of the clone known by the central database is used.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # Output zip file destination
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.ZIP_FILE,
+                tr('Output archive file (ZIP)'),
+                fileFilter='*.zip',
+                optional=False,
+                defaultValue=os.path.join(
+                    tempfile.gettempdir(),
+                    'central_database_delta.zip'
+                )
+            )
+        )
+
+        # OUTPUTS
+        # Add output for message
+        self.addOutput(
+            QgsProcessingOutputNumber(
+                self.OUTPUT_STATUS, tr('Output status')
+            )
+        )
+        self.addOutput(
+            QgsProcessingOutputString(
+                self.OUTPUT_STRING, tr('Output message')
+            )
+        )
+
+    def checkParameterValues(self, parameters, context):
+
+        # Check connection
+        connection_name_central = parameters[self.CONNECTION_NAME_CENTRAL]
+        ok, uri, msg = getUriFromConnectionName(connection_name_central, True)
+        if not ok:
+            return False, msg
+
+        return super(PackageCentralDatabaseDelta, self).checkParameterValues(parameters, context)
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        Package the central audit logs to replay in the clone
+        """
+        # Parameters
+        connection_name_central = parameters[self.CONNECTION_NAME_CENTRAL]
+        clone_id = self.parameterAsString(parameters, self.CLONE_ID, context).strip()
+        sync_id = self.parameterAsString(parameters, self.SYNC_ID, context).strip()
+        zip_file = self.parameterAsString(parameters, self.ZIP_FILE, context)
+
+        # store parameters
+        ls = lizsyncConfig()
+        ls.setVariable('postgresql:central/name', connection_name_central)
+        ls.save()
+
+        # Export the central audit logs
+        # and add the synchronization item in the central database
+        feedback.pushInfo(tr('EXPORT THE CENTRAL AUDIT LOGS'))
+        tmpdir = tempfile.mkdtemp()
+        files = {
+            'delta_audit_logs.csv': os.path.join(tmpdir, 'delta_audit_logs.csv'),
+            'delta_cursor.txt': os.path.join(tmpdir, 'delta_cursor.txt'),
+            'sync_id.txt': os.path.join(tmpdir, 'sync_id.txt'),
+        }
+        status, delta, message = export_delta_audit_logs(
+            connection_name_central,
+            clone_id,
+            sync_id,
+            files['delta_audit_logs.csv']
+        )
+        if not status:
+            shutil.rmtree(tmpdir)
+            m = tr('An error occured while exporting the central audit logs') + ' ' + message
+            raise QgsProcessingException(m)
+        feedback.pushInfo(message)
+        feedback.pushInfo(tr('* previous synchronization id') + ' = {0}'.format(delta['base_sync_id']))
+        feedback.pushInfo(tr('* new synchronization id') + ' = {0}'.format(delta['sync_id']))
+        feedback.pushInfo(tr('* central event ids') + ' = {0} - {1}'.format(
+            delta['min_event_id'] + 1, delta['max_event_id']
+        ))
+        feedback.pushInfo(tr('* number of logs') + ' = {0}'.format(delta['count']))
+
+        # The clone checks the package follows its last replayed central event
+        with open(files['delta_cursor.txt'], 'w') as f:
+            f.write('{0};{1};{2}'.format(
+                delta['min_event_id'],
+                delta['max_event_id'],
+                delta['max_action_tstamp_tx']
+            ))
+        with open(files['sync_id.txt'], 'w') as f:
+            f.write(delta['sync_id'])
+        feedback.pushInfo('')
+
+        # Create ZIP archive
+        try:
+            import zlib  # NOQA
+            compression = zipfile.ZIP_DEFLATED
+        except Exception:
+            compression = zipfile.ZIP_STORED
+
+        with zipfile.ZipFile(zip_file, mode='w') as zf:
+            for fname, fsource in files.items():
+                zf.write(
+                    fsource,
+                    arcname=fname,
+                    compress_type=compression
+                )
+
+        # Remove files
+        shutil.rmtree(tmpdir)
+
+        msg = tr('Delta package has been successfully created !')
+        feedback.pushInfo(msg)
+
+        output = {
+            self.OUTPUT_STATUS: 1,
+            self.OUTPUT_STRING: msg
+        }
+        return output
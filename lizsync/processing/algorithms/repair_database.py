@@ -0,0 +1,287 @@
+__copyright__ = 'Copyright 2020, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+__revision__ = '$Format:%H$'
+
+from qgis.core import (
+    Qgis,
+    QgsProcessingException,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterString,
+    QgsProcessingOutputString,
+    QgsProcessingOutputNumber,
+)
+if Qgis.QGIS_VERSION_INT >= 31400:
+    from qgis.core import QgsProcessingParameterProviderConnection
+from .tools import (
+    lizsyncConfig,
+    getUriFromConnectionName,
+    fetchDataFromSqlQuery,
+)
+from ...qgis_plugin_tools.tools.i18n import tr
+from ...qgis_plugin_tools.tools.algorithm_processing import BaseProcessingAlgorithm
+
+
+class RepairDatabase(BaseProcessingAlgorithm):
+    CONNECTION_NAME_CENTRAL = 'CONNECTION_NAME_CENTRAL'
+    CONNECTION_NAME_CLONE = 'CONNECTION_NAME_CLONE'
+    SOURCE = 'SOURCE'
+
+    OUTPUT_STATUS = 'OUTPUT_STATUS'
+    OUTPUT_STRING = 'OUTPUT_STRING'
+
+    def name(self):
+        return 'repair_database'
+
+    def displayName(self):
+        return tr('Repair the different rows of the clone and central databases')
+
+    def group(self):
+        return tr('02 PostgreSQL synchronization')
+
+    def groupId(self):
+        return 'lizsync_postgresql_sync'
+
+    def shortHelpString(self):
+        short_help = tr(
+            ' This scripts finds the rows of the synchronized tables'
+            ' which are different in the clone and in the central database,'
+            ' for example after a failed synchronization,'
+            ' and copies only these rows from one database to the other.'
+            '\n'
+            '\n'
+            ' The tables are compared with hashes of blocks of rows computed in each database,'
+            ' so that only the different rows are sent through the network.'
+            ' Only the rows and the columns sent to the clone by its subscription filters are compared.'
+            '\n'
+            '\n'
+            ' The triggers are disabled during the copy, so that no audit log is created.'
+            '\n'
+            '\n'
+            ' With the automatic source, the rows modified in the clone since the last synchronization'
+            ' are copied to the central database, and the other rows are copied from the central database.'
+            ' You should run a synchronization before repairing the databases.'
+        )
+        return short_help
+
+    def initAlgorithm(self, config=None):
+        # LizSync config file from ini
+        ls = lizsyncConfig()
+
+        # INPUTS
+
+        # Central database connection name
+        connection_name_central = ls.variable('postgresql:central/name')
+        label = tr('PostgreSQL connection to the central database')
+        if Qgis.QGIS_VERSION_INT >= 31400:
+            param = QgsProcessingParameterProviderConnection(
+                self.CONNECTION_NAME_CENTRAL,
+                label,
+                "postgres",
+                defaultValue=connection_name_central,
+                optional=False,
+            )
+        else:
+            param = QgsProcessingParameterString(
+                self.CONNECTION_NAME_CENTRAL,
+                label,
+                defaultValue=connection_name_central,
+                optional=False
+            )
+            param.setMetadata({
+                'widget_wrapper': {
+                    'class': 'processing.gui.wrappers_postgis.ConnectionWidgetWrapper'
+                }
+            })
+        tooltip = tr(
+            'The PostgreSQL connection to the central database.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # Clone database connection parameters
+        connection_name_clone = ls.variable('postgresql:clone/name')
+        label = tr('PostgreSQL connection to the clone database')
+        if Qgis.QGIS_VERSION_INT >= 31400:
+            param = QgsProcessingParameterProviderConnection(
+                self.CONNECTION_NAME_CLONE,
+                label,
+                "postgres",
+                defaultValue=connection_name_clone,
+                optional=False,
+            )
+        else:
+            param = QgsProcessingParameterString(
+                self.CONNECTION_NAME_CLONE,
+                label,
+                defaultValue=connection_name_clone,
+                optional=False
+            )
+            param.setMetadata({
+                'widget_wrapper': {
+                    'class': 'processing.gui.wrappers_postgis.ConnectionWidgetWrapper'
+                }
+            })
+        tooltip = tr(
+            'The PostgreSQL connection to the clone database.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # Source of the values
+        self.SOURCES = ['automatic', 'central', 'clone']
+        param = QgsProcessingParameterEnum(
+            self.SOURCE,
+            tr('Source of the values'),
+            options=[
+                tr('Automatic'),
+                tr('Central database'),
+                tr('Clone database'),
+            ],
+            defaultValue=0,
+            optional=False,
+        )
+        tooltip = tr(
+            'The database from which the different rows are copied.'
+            ' With the automatic source, the rows modified in the clone since the last synchronization'
+            ' are copied to the central database, and the other rows from the central database.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
+        # OUTPUTS
+        # Add output for message
+        self.addOutput(
+            QgsProcessingOutputNumber(
+                self.OUTPUT_STATUS, tr('Output status')
+            )
+        )
+        self.addOutput(
+            QgsProcessingOutputString(
+                self.OUTPUT_STRING, tr('Output message')
+            )
+        )
+
+    def checkParameterValues(self, parameters, context):
+
+        # Check connections
+        connection_name_central = parameters[self.CONNECTION_NAME_CENTRAL]
+        connection_name_clone = parameters[self.CONNECTION_NAME_CLONE]
+        ok, uri, msg = getUriFromConnectionName(connection_name_central, True)
+        if not ok:
+            return False, msg
+        ok, uri, msg = getUriFromConnectionName(connection_name_clone, True)
+        if not ok:
+            return False, msg
+
+        return super(RepairDatabase, self).checkParameterValues(parameters, context)
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        Repair the different rows of the synchronized tables
+        """
+        output = {
+            self.OUTPUT_STATUS: 1,
+            self.OUTPUT_STRING: ''
+        }
+
+        # Parameters
+        connection_name_central = parameters[self.CONNECTION_NAME_CENTRAL]
+        connection_name_clone = parameters[self.CONNECTION_NAME_CLONE]
+        source = self.SOURCES[self.parameterAsEnum(parameters, self.SOURCE, context)]
+
+        # store parameters
+        ls = lizsyncConfig()
+        ls.setVariable('postgresql:central/name', connection_name_central)
+        ls.setVariable('postgresql:clone/name', connection_name_clone)
+        ls.save()
+
+        # Get the tables synchronized by the clone
+        sql = '''
+            WITH a AS (
+                SELECT regexp_split_to_array(
+                    jsonb_array_elements_text(sync_tables), E'\\\\.'
+                ) AS sync_table_elements
+                FROM central_lizsync.synchronized_tables
+                WHERE server_id::text = (
+                    SELECT server_id::text
+                    FROM lizsync.server_metadata
+                    LIMIT 1
+                )
+            )
+            SELECT DISTINCT
+                trim(replace(sync_table_elements[1], '"', '')) AS table_schema,
+                trim(replace(sync_table_elements[2], '"', '')) AS table_name
+            FROM a
+            ORDER BY table_schema, table_name
+        '''
+        _, tables, _, ok, error_message = fetchDataFromSqlQuery(
+            connection_name_clone,
+            sql
+        )
+        if not ok:
+            m = tr('An error occured while getting the synchronized tables') + ' ' + error_message
+            raise QgsProcessingException(m)
+
+        # Run the database PostgreSQL function lizsync.repair_table()
+        # for each table. Each table is repaired in its own transaction
+        number_repaired_clone = 0
+        number_repaired_central = 0
+        for table_schema, table_name in tables:
+            if feedback.isCanceled():
+                m = tr('The repair has been canceled. The tables already repaired are kept.')
+                raise QgsProcessingException(m)
+
+            sql = '''
+                SELECT uid, status, repaired_server
+                FROM lizsync.repair_table('{0}', '{1}', {2})
+            '''.format(
+                table_schema,
+                table_name,
+                "'{}'".format(source) if source != 'automatic' else 'NULL'
+            )
+            _, data, _, ok, error_message = fetchDataFromSqlQuery(
+                connection_name_clone,
+                sql
+            )
+            if not ok:
+                m = tr('An error occured during the repair of the table')
+                m += ' {0}.{1} '.format(table_schema, table_name) + error_message
+                raise QgsProcessingException(m)
+
+            for line in data:
+                if line[2] == 'clone':
+                    number_repaired_clone += 1
+                else:
+                    number_repaired_central += 1
+            feedback.pushInfo(
+                tr('Table {0}.{1}: {2} different rows repaired').format(
+                    table_schema, table_name, len(data)
+                )
+            )
+
+        # Output messages
+        a = tr('Repair of the databases done')
+        b = tr('Number of rows copied from the central server')
+        b += ' = %s' % number_repaired_clone
+        c = tr('Number of rows copied to the central server')
+        c += ' = %s' % number_repaired_central
+        feedback.pushInfo(a)
+        feedback.pushInfo(b)
+        feedback.pushInfo(c)
+
+        msg = tr('Repair of the databases done.')
+        output = {
+            self.OUTPUT_STATUS: 1,
+            self.OUTPUT_STRING: msg + ' ' + ', '.join([b, c])
+        }
+        return output
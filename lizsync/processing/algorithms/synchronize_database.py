@@ -6,6 +6,7 @@ __revision__ = '$Format:%H$'
 from qgis.core import (
     Qgis,
     QgsProcessingException,
+    QgsProcessingParameterNumber,
     QgsProcessingParameterString,
     QgsProcessingOutputString,
     QgsProcessingOutputNumber,
@@ -24,6 +25,7 @@ from ...qgis_plugin_tools.tools.algorithm_processing import BaseProcessingAlgori
 class SynchronizeDatabase(BaseProcessingAlgorithm):
     CONNECTION_NAME_CENTRAL = 'CONNECTION_NAME_CENTRAL'
     CONNECTION_NAME_CLONE = 'CONNECTION_NAME_CLONE'
+    BATCH_SIZE = 'BATCH_SIZE'
 
     OUTPUT_STATUS = 'OUTPUT_STATUS'
     OUTPUT_STRING = 'OUTPUT_STRING'
@@ -53,13 +55,18 @@ class SynchronizeDatabase(BaseProcessingAlgorithm):
             ' This audit data are transformed into INSERT/UPDATE/DELETE SQL queries'
             ' which are played in the databases in this order:'
             '\n'
-            ' 1/ From the CENTRAL to the CLONE database'
+            ' 1/ From the CLONE to the CENTRAL database'
             '\n'
-            ' 2/ From the CLONE to the CENTRAL database'
+            ' 2/ From the CENTRAL to the CLONE database'
             '\n'
             '\n'
-            'The central database stores which clone has replayed which audited modification'
+            'The central database stores the last audited modification replayed by each clone'
             ', and keeps an history of synchronization items.'
+            '\n'
+            '\n'
+            'With a batch size, the modifications are replayed by chunks of this size'
+            ', first from the CENTRAL to the CLONE database, then from the CLONE to the CENTRAL database.'
+            ' Each chunk is committed, and an interrupted synchronization restarts after the last committed chunk.'
 
         )
         return short_help
@@ -134,6 +141,24 @@ class SynchronizeDatabase(BaseProcessingAlgorithm):
             param.tooltip_3liz = tooltip
         self.addParameter(param)
 
+        # Batch size
+        param = QgsProcessingParameterNumber(
+            self.BATCH_SIZE,
+            tr('Batch size'),
+            defaultValue=0,
+            minValue=0,
+            optional=False
+        )
+        tooltip = tr(
+            'Maximum number of audited modifications replayed in each step of the synchronization.'
+            ' Use 0 to synchronize all the modifications at once.'
+        )
+        if Qgis.QGIS_VERSION_INT >= 31600:
+            param.setHelp(tooltip)
+        else:
+            param.tooltip_3liz = tooltip
+        self.addParameter(param)
+
         # OUTPUTS
         # Add output for message
         self.addOutput(
@@ -173,6 +198,7 @@ class SynchronizeDatabase(BaseProcessingAlgorithm):
         # Parameters
         connection_name_central = parameters[self.CONNECTION_NAME_CENTRAL]
         connection_name_clone = parameters[self.CONNECTION_NAME_CLONE]
+        batch_size = self.parameterAsInt(parameters, self.BATCH_SIZE, context)
 
         # store parameters
         ls = lizsyncConfig()
@@ -181,28 +207,54 @@ class SynchronizeDatabase(BaseProcessingAlgorithm):
         ls.save()
 
         # Run the database PostgreSQL function lizsync.synchronize()
+        # or lizsync.synchronize_chunk() until all the chunks are replayed.
+        # Each call is committed in its own transaction
         feedback.pushInfo(
             tr('Run the bi-directionnal synchronization between the clone and central servers')
         )
-        sql = '''
-            SELECT *
-            FROM lizsync.synchronize()
-        '''
-        _, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
-            connection_name_clone,
-            sql
-        )
-        if not ok:
-            m = tr('An error occured during the database synchronization') + ' ' + error_message
-            raise QgsProcessingException(m)
-        if rowCount == 0:
-            m = tr('An unknown error has been raised during the database synchronization')
-            raise QgsProcessingException(m)
-
-        for line in data:
-            number_replayed_to_central = line[0]
-            number_replayed_to_clone = line[1]
-            number_conflicts = line[2]
+        if batch_size > 0:
+            sql = '''
+                SELECT *
+                FROM lizsync.synchronize_chunk({0})
+            '''.format(batch_size)
+        else:
+            sql = '''
+                SELECT *
+                FROM lizsync.synchronize()
+            '''
+        number_replayed_to_central = 0
+        number_replayed_to_clone = 0
+        number_conflicts = 0
+        is_complete = False
+        while not is_complete:
+            if feedback.isCanceled():
+                m = tr('The synchronization has been canceled. It will restart after the last replayed chunk.')
+                raise QgsProcessingException(m)
+
+            _, data, rowCount, ok, error_message = fetchDataFromSqlQuery(
+                connection_name_clone,
+                sql
+            )
+            if not ok:
+                m = tr('An error occured during the database synchronization') + ' ' + error_message
+                raise QgsProcessingException(m)
+            if rowCount == 0:
+                m = tr('An unknown error has been raised during the database synchronization')
+                raise QgsProcessingException(m)
+
+            for line in data:
+                number_replayed_to_central += line[0]
+                number_replayed_to_clone += line[1]
+                number_conflicts += line[2]
+                is_complete = line[3] if batch_size > 0 else True
+
+            if batch_size > 0:
+                feedback.pushInfo(
+                    tr(
+                        'Chunk replayed: {0} modifications from the central server'
+                        ', {1} modifications to the central server'
+                    ).format(line[0], line[1])
+                )
 
         # Output messages
         a = tr('Two-way database synchronization done')
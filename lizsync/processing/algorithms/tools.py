@@ -25,12 +25,19 @@ except ImportError:
     # Quick and dirty workaround
     print('Python module paramiko is not installed')
 
+import gzip
+import hashlib
+import json
 import os
 import netrc
 import psycopg2
 import re
+import shutil
 import subprocess
 import fileinput
+import tempfile
+import time
+import zipfile
 from platform import system as psys
 from db_manager.db_plugins.plugin import BaseError
 from db_manager.db_plugins.postgis.connector import PostGisDBConnector
@@ -254,6 +261,200 @@ def check_postgresql_connection(uri, timeout=5):
     return status, msg
 
 
+def get_database_connection(uri):
+    """
+    Open a psycopg2 connection to the database of the given URI
+    """
+    if uri.service():
+        return psycopg2.connect(
+            service=uri.service()
+        )
+    return psycopg2.connect(
+        host=uri.host(), port=uri.port(), database=uri.database(),
+        user=uri.username(), password=uri.password()
+    )
+
+
+def export_database_snapshot(connection_name):
+    """
+    Open a transaction in the database and export its snapshot.
+    Other sessions, like pg_dump with the --snapshot option, can then
+    read the same data. The returned connection must be kept open while
+    the snapshot is used, and committed or closed afterwards.
+    """
+    conn = None
+    snapshot = None
+
+    # Get URI
+    status, uri, error_message = getUriFromConnectionName(connection_name, True)
+    if not uri or not status:
+        return conn, snapshot, error_message
+
+    try:
+        conn = get_database_connection(uri)
+        # All the queries of the transaction must use the exported snapshot
+        conn.set_session(isolation_level='REPEATABLE READ')
+        cur = conn.cursor()
+        cur.execute('SELECT pg_export_snapshot()')
+        snapshot = cur.fetchone()[0]
+        cur.close()
+        msg = tr('Database snapshot exported') + ': {0}'.format(snapshot)
+    except (Exception, psycopg2.DatabaseError) as error:
+        msg = str(error)
+        if conn:
+            conn.close()
+            conn = None
+
+    return conn, snapshot, msg
+
+
+def get_package_cache_file(connection, postgresql_binary_path, component, schemas, parameters):
+    """
+    Get the path of the cached file of a package component dumped with pg_dump.
+    The file name contains a hash of the structure of the dumped schemas,
+    read with the given connection, of the PostgreSQL versions and of the
+    pg_dump parameters: a cached file can be reused as long as it is the same.
+    Return None if pg_dump cannot be found.
+    """
+    cur = connection.cursor()
+    cur.execute(
+        'SELECT lizsync.get_schema_fingerprint(%s), current_setting(%s)',
+        (list(schemas), 'server_version_num')
+    )
+    fingerprint, server_version = cur.fetchone()
+    cur.close()
+
+    pgbin = 'pg_dump'
+    if psys().lower().startswith('win'):
+        pgbin += '.exe'
+    pgbin = os.path.join(
+        postgresql_binary_path,
+        pgbin
+    )
+    if not os.path.isfile(pgbin):
+        return None
+    pgbin_stat = os.stat(pgbin)
+    key_items = [
+        component,
+        fingerprint,
+        server_version,
+        pgbin,
+        pgbin_stat.st_size,
+        pgbin_stat.st_mtime,
+    ] + list(schemas) + list(parameters)
+    key = hashlib.md5(
+        '\n'.join([str(a) for a in key_items]).encode('utf-8')
+    ).hexdigest()
+
+    # The cache is stored in a directory next to the LizSync configuration file
+    ls = lizsyncConfig()
+    cache_dir = os.path.join(
+        os.path.dirname(ls.config_file),
+        'LizSync_cache'
+    )
+    return os.path.join(cache_dir, '{0}.{1}'.format(key, component))
+
+
+def get_cached_package_file(cache_file, output_file):
+    """
+    Copy the cached file of a package component, if it exists
+    """
+    if not cache_file or not os.path.isfile(cache_file):
+        return False
+    try:
+        shutil.copyfile(cache_file, output_file)
+    except OSError:
+        return False
+    return True
+
+
+def store_cached_package_file(output_file, cache_file):
+    """
+    Store the file of a package component in the cache,
+    and remove the previous cached files of the same component
+    """
+    if not cache_file:
+        return False
+    cache_dir, cache_name = os.path.split(cache_file)
+    component = cache_name.split('.', 1)[1]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for f in os.listdir(cache_dir):
+            if f != cache_name and f.split('.', 1)[-1] == component:
+                os.remove(os.path.join(cache_dir, f))
+        shutil.copyfile(output_file, cache_file)
+    except OSError:
+        return False
+    return True
+
+
+def filter_package_data(connection, postgresql_binary_path, data_dir, tables, area, columns):
+    """
+    Replace the data files of the tables dumped by pg_dump in a directory
+    with the rows of the area of interest only, and with the columns
+    not sent to the clone emptied. The rows are read with the
+    connection of the snapshot used by pg_dump, in the format of pg_dump.
+    Return the number of rows kept and the emptied columns for each table,
+    the number of rows being None for the tables not filtered by the area
+    """
+    # Check binary
+    pgbin = 'pg_restore'
+    if psys().lower().startswith('win'):
+        pgbin += '.exe'
+    pgbin = os.path.join(
+        postgresql_binary_path,
+        pgbin
+    )
+    if not os.path.isfile(pgbin):
+        raise Exception(tr('PostgreSQL pg_restore tool cannot be found in specified path'))
+
+    # Get the data files of the tables
+    output = subprocess.run(
+        [pgbin, '-l', data_dir],
+        stdout=subprocess.PIPE, check=True
+    ).stdout.decode('utf-8')
+    table_data = []
+    for line in output.splitlines():
+        m = re.match(r'^(\d+); \d+ \d+ TABLE DATA (.+)$', line)
+        if m:
+            table_data.append((m.group(1), m.group(2)))
+
+    counts = []
+    cur = connection.cursor()
+    # Same output settings as pg_dump
+    cur.execute('''
+        SELECT set_config('client_encoding', pg_encoding_to_char(encoding), True)
+        FROM pg_database
+        WHERE datname = current_database()
+    ''')
+    cur.execute("SET LOCAL DateStyle = ISO")
+    cur.execute("SET LOCAL IntervalStyle = postgres")
+    cur.execute("SET LOCAL extra_float_digits = 3")
+    cur.execute(
+        '''
+        SELECT table_schema, table_name, number_rows, data_query, excluded_columns
+        FROM lizsync.get_package_data_queries(%s, %s, %s)
+        ''',
+        (tables, area, json.dumps(columns) if columns else None)
+    )
+    for table_schema, table_name, number_rows, data_query, excluded_columns in cur.fetchall():
+        for dump_id, item in table_data:
+            if not item.startswith('{0} {1} '.format(table_schema, table_name)):
+                continue
+            data_file = os.path.join(data_dir, '{0}.dat'.format(dump_id))
+            if os.path.isfile(data_file + '.gz'):
+                f = gzip.open(data_file + '.gz', 'wb')
+            else:
+                f = open(data_file, 'wb')
+            with f:
+                cur.copy_expert('COPY ({0}) TO STDOUT'.format(data_query), f)
+                f.write(b'\\.\n\n\n')
+            counts.append((table_schema, table_name, number_rows, excluded_columns))
+    cur.close()
+
+    return counts
+
+
 def getUriFromConnectionName(connection_name, must_connect=True):
 
     # Check QGIS QGIS3.ini settings for connection name
@@ -347,6 +548,34 @@ def run_command(cmd, myenv, feedback):
     return returncode, stdout
 
 
+def get_newer_synchronization_sql(sync_id, clone_id):
+    """
+    Get the query of the synchronizations made by the central database
+    with the given clone since the given synchronization.
+    It is used before deploying a package and by the tests of the query plans
+    """
+    sql = '''
+        SELECT sync_id
+        FROM lizsync.history
+        WHERE TRUE
+        AND sync_time > (
+            SELECT sync_time
+            FROM lizsync.history
+            WHERE sync_id = '{sync_id}'::uuid
+        )
+        AND server_from = (
+            SELECT server_id::text
+            FROM lizsync.server_metadata
+            LIMIT 1
+        )
+        AND '{clone_id}' = ANY (server_to)
+    '''.format(
+        sync_id=sync_id,
+        clone_id=clone_id
+    )
+    return sql
+
+
 def check_database_structure(connection_name):
     """
     Check if database structure contains lizsync tables
@@ -418,6 +647,21 @@ def convert_textual_schema_list_to_sql(schemas):
     return schemas_sql
 
 
+def convert_textual_column_list_to_sql(columns):
+    """
+    Parse textual list of excluded columns and return SQL text array
+    The uid column is never excluded, since it is used to replay the logs
+    """
+    columns = [
+        "'{0}'".format(a.strip().replace("'", "''"))
+        for a in (columns or '').split(',')
+        if a.strip() and a.strip() != 'uid'
+    ]
+    columns_sql = 'ARRAY[{0}]::text[]'.format(', '.join(columns))
+
+    return columns_sql
+
+
 def check_database_uid_columns(connection_name, schemas=None, tables=None):
     """
     Check if tables contains uid columns
@@ -595,14 +839,19 @@ def get_database_audit_triggers(connection_name, schemas=None, tables=None):
     return ok, message, tables
 
 
-def add_database_audit_triggers(connection_name, schemas=None, tables=None):
+def add_database_audit_triggers(connection_name, schemas=None, tables=None, excluded_columns=None):
     """
     Add the audit triggers for given schemas and tables
+    * excluded_columns: text list of columns separated by comma,
+      not logged by the audit triggers. Ex: last_modified, area
     """
     status = False
     sql = ""
     sql += " SELECT t.table_schema, t.table_name,"
-    sql += " audit.audit_table((quote_ident(t.table_schema) || '.' || quote_ident(t.table_name))::text)"
+    sql += " audit.audit_table("
+    sql += "     (quote_ident(t.table_schema) || '.' || quote_ident(t.table_name))::regclass,"
+    sql += "     True, True, {0}".format(convert_textual_column_list_to_sql(excluded_columns))
+    sql += " )"
     sql += " FROM information_schema.tables AS t"
     sql += " WHERE True"
     if schemas:
@@ -852,7 +1101,7 @@ def ftp_sync(ftpprotocol, ftphost, ftpport, ftpuser, ftppass, localdir, ftpdir,
     return True, 'Success'
 
 
-def pg_dump(feedback, postgresql_binary_path, connection_name, output_file_name, schemas, tables=None, additional_parameters=[]):
+def pg_dump(feedback, postgresql_binary_path, connection_name, output_file_name, schemas, tables=None, additional_parameters=[], output_format='p', jobs=1):
     messages = []
     status = False
 
@@ -899,10 +1148,15 @@ def pg_dump(feedback, postgresql_binary_path, connection_name, output_file_name,
               '--verbose',
               '--no-acl',
               '--no-owner',
-              '-Fp',
+              '-F{0}'.format(output_format),
               '-f "{0}"'.format(output_file_name)
           ]
 
+    # Dump the tables with parallel jobs
+    # Only available with the directory format
+    if output_format == 'd' and jobs > 1:
+        cmd.append('-j {0}'.format(jobs))
+
     # Add given schemas
     for s in schemas:
         cmd.append('-n {0}'.format(s))
@@ -938,6 +1192,499 @@ def pg_dump(feedback, postgresql_binary_path, connection_name, output_file_name,
     return status, messages
 
 
+def pg_restore(feedback, postgresql_binary_path, connection_name, input_path, jobs=1, additional_parameters=[]):
+    messages = []
+    status = False
+
+    # Check binary
+    pgbin = 'pg_restore'
+    if psys().lower().startswith('win'):
+        pgbin += '.exe'
+    pgbin = os.path.join(
+        postgresql_binary_path,
+        pgbin
+    )
+    if not os.path.isfile(pgbin):
+        messages.append(tr('PostgreSQL pg_restore tool cannot be found in specified path'))
+        return False, messages
+
+    # Get connection parameters
+    # And check we can connect
+    status, uri, error_message = getUriFromConnectionName(connection_name, True)
+    if not uri or not status:
+        messages.append(tr('Error getting database connection information'))
+        messages.append(error_message)
+        return status, messages
+
+    # Create pg_restore command
+    if uri.service():
+        cmdo = [
+            '-d "service={0}"'.format(uri.service())
+        ]
+    else:
+        cmdo = [
+            '-h {0}'.format(uri.host()),
+            '-p {0}'.format(uri.port()),
+            '-d {0}'.format(uri.database()),
+            '-U {0}'.format(uri.username()),
+        ]
+    # Escape pgbin for Windows
+    if psys().lower().startswith('win'):
+        pgbin = '"' + pgbin + '"'
+
+    # Build pg_restore command. Add needed options
+    # The data of the tables and the indexes are loaded with parallel jobs
+    cmd = [
+              pgbin
+          ] + cmdo + [
+              '--verbose',
+              '--no-acl',
+              '--no-owner',
+              '--no-password',
+              '--exit-on-error',
+          ]
+    if jobs > 1:
+        cmd.append('-j {0}'.format(jobs))
+
+    # Add additional parameters
+    if additional_parameters:
+        cmd = cmd + additional_parameters
+
+    cmd.append('"{0}"'.format(input_path))
+
+    # Run command
+    try:
+        # Add password if needed
+        myenv = {**os.environ}
+        if not uri.service():
+            if not uri.password():
+                password = get_connection_password_from_ini(uri)
+                uri.setPassword(password)
+            myenv = {**{'PGPASSWORD': uri.password()}, **os.environ}
+        returncode, stdout = run_command(cmd, myenv, feedback)
+
+        if returncode == 0:
+            messages.append(tr('Database dump has been successfully restored') + ' from {0}'.format(input_path))
+        else:
+            messages.append(tr('Error restoring database dump') + ' from {0}'.format(input_path))
+            messages.append(stdout[-1])
+            status = False
+    except Exception:
+        status = False
+        messages.append(tr('Error restoring database dump') + ' from {0}'.format(input_path))
+
+    return status, messages
+
+
+class CopyDataReader:
+    """
+    File-like object giving the COPY data lines of a SQL script
+    up to the end of data marker, for the copy_expert method of psycopg2
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.buffer = b''
+        self.done = False
+
+    def read(self, size=-1):
+        while not self.done and (size < 0 or len(self.buffer) < size):
+            line = next(self.lines, None)
+            if line is None or line.rstrip(b'\r\n') == b'\\.':
+                self.done = True
+            else:
+                self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return data
+
+
+def run_sql_script_lines(cursor, lines):
+    """
+    Run the lines of a SQL script written by pg_dump or by the package,
+    with the COPY data given inline, and return the number of bytes read.
+    The psql meta-commands are ignored, and so are the BEGIN and COMMIT
+    surrounding the whole script, since it is run in the current transaction
+    """
+    size = 0
+    sql = []
+    has_sql = False
+    pending_commit = None
+    has_statement = False
+
+    def counted(lines):
+        nonlocal size
+        for line in lines:
+            size += len(line)
+            yield line
+
+    lines = counted(lines)
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            sql.append(line)
+            continue
+        # The COMMIT is only ignored if it is the last statement of the script
+        if pending_commit:
+            sql.append(pending_commit)
+            pending_commit = None
+        if stripped.upper() == b'BEGIN;' and not has_statement:
+            has_statement = True
+            continue
+        if stripped.upper() == b'COMMIT;':
+            pending_commit = line
+            continue
+        has_statement = True
+        if re.match(br'^\\(connect|restrict|unrestrict)\b', stripped):
+            continue
+        if stripped.startswith(b'COPY ') and stripped.endswith(b'FROM stdin;'):
+            if has_sql:
+                cursor.execute(b''.join(sql))
+            sql = []
+            has_sql = False
+            cursor.copy_expert(stripped.decode('utf-8'), CopyDataReader(lines))
+            continue
+        sql.append(line)
+        # Only comments cannot be run
+        has_sql = has_sql or not stripped.startswith(b'--')
+    if has_sql:
+        cursor.execute(b''.join(sql))
+
+    return size
+
+
+def run_pg_restore_lines(cursor, pgbin, parameters):
+    """
+    Run in the current transaction the SQL script written by pg_restore
+    with the given parameters, and return the number of bytes read.
+    An exception is raised with the error messages of pg_restore if it fails,
+    so that the transaction is not committed with a partial script
+    """
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(
+            [pgbin] + parameters,
+            stdout=subprocess.PIPE,
+            stderr=stderr
+        )
+        try:
+            size = run_sql_script_lines(cursor, proc.stdout)
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if proc.returncode != 0:
+            stderr.seek(0)
+            raise Exception(
+                tr('Error restoring database dump') + ' (pg_restore {0}): {1}'.format(
+                    proc.returncode,
+                    stderr.read().decode('utf-8', 'replace').strip()
+                )
+            )
+
+    return size
+
+
+def load_zip_archive(feedback, postgresql_binary_path, connection_name, zip_file, members, tables):
+    """
+    Load the given SQL files of a ZIP archive into the database,
+    in one session and one transaction, without extracting them.
+    The data directory dumped by pg_dump is loaded with COPY:
+    only its table of contents is extracted to get the SQL of the tables with pg_restore
+    """
+    messages = []
+
+    # Check binary
+    pgbin = 'pg_restore'
+    if psys().lower().startswith('win'):
+        pgbin += '.exe'
+    pgbin = os.path.join(
+        postgresql_binary_path,
+        pgbin
+    )
+
+    # Get connection parameters
+    status, uri, error_message = getUriFromConnectionName(connection_name, True)
+    if not uri or not status:
+        messages.append(tr('Error getting database connection information'))
+        messages.append(error_message)
+        return False, messages
+
+    conn = None
+    tmpdir = tempfile.mkdtemp()
+    try:
+        conn = get_database_connection(uri)
+        cursor = conn.cursor()
+        with zipfile.ZipFile(zip_file) as zf:
+            for member in members:
+                start = time.time()
+                # Each file is run with the default settings, as with psql
+                cursor.execute('RESET ALL')
+
+                if member.endswith('.sql'):
+                    with zf.open(member) as f:
+                        size = run_sql_script_lines(cursor, f)
+                else:
+                    if not os.path.isfile(pgbin):
+                        raise Exception(tr('PostgreSQL pg_restore tool cannot be found in specified path'))
+                    with open(os.path.join(tmpdir, 'toc.dat'), 'wb') as f:
+                        f.write(zf.read(member + '/toc.dat'))
+
+                    # List the table data, to load them with COPY,
+                    # and the other items of the data section, like sequence values
+                    proc = subprocess.run(
+                        [pgbin, '-l', tmpdir],
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                    )
+                    if proc.returncode != 0:
+                        raise Exception(
+                            tr('Error restoring database dump') + ' (pg_restore {0}): {1}'.format(
+                                proc.returncode,
+                                proc.stderr.decode('utf-8', 'replace').strip()
+                            )
+                        )
+                    output = proc.stdout.decode('utf-8')
+                    items = []
+                    table_data = []
+                    for line in output.splitlines():
+                        m = re.match(r'^(\d+); \d+ \d+ TABLE DATA (.+)$', line)
+                        if m:
+                            for schema, table in tables:
+                                if m.group(2).startswith('{0} {1} '.format(schema, table)):
+                                    table_data.append((m.group(1), schema, table))
+                            line = ';' + line
+                        items.append(line)
+                    list_file = os.path.join(tmpdir, 'list.txt')
+                    with open(list_file, 'w') as f:
+                        f.write('\n'.join(items))
+
+                    # Tables, then data, then indexes, constraints and triggers
+                    size = run_pg_restore_lines(
+                        cursor, pgbin,
+                        ['--section=pre-data', '-f', '-', tmpdir]
+                    )
+                    for dump_id, schema, table in table_data:
+                        data_file = '{0}/{1}.dat'.format(member, dump_id)
+                        compressed = data_file + '.gz' in zf.namelist()
+                        if compressed:
+                            data_file += '.gz'
+                        with zf.open(data_file) as zdata:
+                            data = gzip.GzipFile(fileobj=zdata) if compressed else zdata
+                            cursor.copy_expert(
+                                'COPY "{0}"."{1}" FROM STDIN'.format(schema, table),
+                                data
+                            )
+                            size += data.tell()
+                    size += run_pg_restore_lines(
+                        cursor, pgbin,
+                        ['-L', list_file, '--section=data', '--section=post-data', '-f', '-', tmpdir]
+                    )
+
+                duration = time.time() - start
+                msg = tr('File {0} loaded: {1:.1f} MB in {2:.1f} s ({3:.1f} MB/s)').format(
+                    member,
+                    size / 1048576,
+                    duration,
+                    size / 1048576 / max(duration, 0.001)
+                )
+                feedback.pushInfo(msg)
+                messages.append(msg)
+
+        conn.commit()
+        status = True
+    except (Exception, psycopg2.DatabaseError) as error:
+        status = False
+        messages.append(tr('Error loading the ZIP archive') + ' ' + str(error))
+        if conn:
+            conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+        shutil.rmtree(tmpdir)
+
+    return status, messages
+
+
+DELTA_AUDIT_COLUMNS = [
+    'event_id', 'action_tstamp_tx', 'action_tstamp_epoch',
+    'ident', 'action_type', 'origine', 'action', 'updated_field',
+    'uid', 'original_action_tstamp_tx', 'action_data',
+]
+
+
+def export_delta_audit_logs(connection_name, clone_id, sync_id, output_file):
+    """
+    Export into a CSV file the central audit logs to replay in the clone
+    since the given synchronization, or since the last synchronization of the clone,
+    and add the corresponding synchronization item in the history table.
+    Returns the status, the delta package information and a message
+    """
+    delta = None
+
+    # Get URI
+    status, uri, error_message = getUriFromConnectionName(connection_name, True)
+    if not uri or not status:
+        return False, delta, error_message
+
+    conn = None
+    try:
+        conn = get_database_connection(uri)
+        # The maximum event id and the exported logs must be read in the same snapshot
+        conn.set_session(isolation_level='REPEATABLE READ')
+        conn.set_client_encoding('UTF8')
+        cur = conn.cursor()
+        cur.execute("SET DateStyle = 'ISO'")
+
+        cur.execute('''
+            SELECT count(*)
+            FROM lizsync.synchronized_tables
+            WHERE server_id = %s::uuid
+        ''', (clone_id, ))
+        if cur.fetchone()[0] == 0:
+            raise Exception(tr('No synchronized tables have been found for this clone'))
+
+        # Last central event replayed in the clone
+        if sync_id:
+            cur.execute('''
+                SELECT sync_id::text, max_event_id
+                FROM lizsync.history
+                WHERE sync_id = %s::uuid
+                AND %s = ANY (server_to)
+                AND max_event_id IS NOT NULL
+            ''', (sync_id, clone_id))
+        else:
+            cur.execute('''
+                SELECT last_sync_id::text, last_event_id
+                FROM lizsync.clone_cursors
+                WHERE clone_id = %s::uuid
+            ''', (clone_id, ))
+        row = cur.fetchone()
+        if not row:
+            raise Exception(tr('No synchronization of the central logs to this clone has been found'))
+        base_sync_id, min_event_id = row
+
+        # The central audit logs following this synchronization must not have been purged
+        cur.execute('''
+            SELECT max(max_event_id)
+            FROM lizsync.history
+            WHERE sync_type = 'purge'
+        ''')
+        purged_event_id = cur.fetchone()[0]
+        if purged_event_id and purged_event_id > min_event_id:
+            raise Exception(tr(
+                'The central audit logs have been purged since this synchronization.'
+                ' Please create a full package.'
+            ))
+
+        cur.execute('''
+            SELECT max(event_id), max(action_tstamp_tx)
+            FROM audit.logged_actions
+            WHERE event_id > %s
+        ''', (min_event_id, ))
+        max_event_id, max_action_tstamp_tx = cur.fetchone()
+        if max_event_id is None:
+            raise Exception(tr('No modification has been made in the central database since this synchronization'))
+
+        cur.execute('''
+            INSERT INTO lizsync.history
+            (
+                server_from, server_to, min_event_id, max_event_id,
+                max_action_tstamp_tx, sync_type, sync_status
+            ) VALUES (
+                (SELECT server_id FROM lizsync.server_metadata LIMIT 1),
+                ARRAY[%s],
+                %s, %s, %s,
+                'delta',
+                'done'
+            )
+            RETURNING sync_id::text;
+        ''', (clone_id, min_event_id + 1, max_event_id, max_action_tstamp_tx))
+        delta_sync_id = cur.fetchone()[0]
+
+        # Compacted logs
+        sql = cur.mogrify('''
+            COPY (
+                SELECT {0}
+                FROM lizsync.get_delta_audit_logs(%s::uuid, %s, %s)
+            ) TO STDOUT WITH (FORMAT csv)
+        '''.format(', '.join(DELTA_AUDIT_COLUMNS)), (clone_id, min_event_id, max_event_id))
+        with open(output_file, 'wb') as f:
+            cur.copy_expert(sql.decode('utf-8'), f)
+        count = cur.rowcount
+        cur.close()
+        conn.commit()
+
+        delta = {
+            'base_sync_id': base_sync_id,
+            'sync_id': delta_sync_id,
+            'min_event_id': min_event_id,
+            'max_event_id': max_event_id,
+            'max_action_tstamp_tx': max_action_tstamp_tx.isoformat(),
+            'count': count,
+        }
+        status = True
+        msg = tr('Central audit logs exported')
+    except (Exception, psycopg2.DatabaseError) as error:
+        status = False
+        msg = str(error)
+        if conn:
+            conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+
+    return status, delta, msg
+
+
+def replay_delta_audit_logs(connection_name, zip_file, member, sync_id, min_event_id, max_event_id, max_action_tstamp_tx):
+    """
+    Replay in the clone the central audit logs of the CSV file of a delta package,
+    without extracting it, and without connection to the central database.
+    Returns the status, the number of replayed logs and conflicts, and a message
+    """
+    counts = None
+
+    # Get URI
+    status, uri, error_message = getUriFromConnectionName(connection_name, True)
+    if not uri or not status:
+        return False, counts, error_message
+
+    conn = None
+    try:
+        conn = get_database_connection(uri)
+        conn.set_client_encoding('UTF8')
+        cur = conn.cursor()
+        cur.execute("SET DateStyle = 'ISO'")
+        cur.execute("SELECT lizsync.create_temporary_table('temp_central_audit', 'audit')")
+        with zipfile.ZipFile(zip_file) as zf:
+            with zf.open(member) as f:
+                cur.copy_expert(
+                    'COPY temp_central_audit ({0}) FROM STDIN WITH (FORMAT csv)'.format(
+                        ', '.join(DELTA_AUDIT_COLUMNS)
+                    ),
+                    f
+                )
+        cur.execute('''
+            SELECT number_replayed_to_clone, number_conflicts
+            FROM lizsync.replay_delta_audit_logs(%s::uuid, %s, %s, %s::timestamp with time zone)
+        ''', (sync_id, min_event_id, max_event_id, max_action_tstamp_tx))
+        counts = cur.fetchone()
+        cur.close()
+        conn.commit()
+        status = True
+        msg = tr('Central audit logs of the delta package replayed')
+    except (Exception, psycopg2.DatabaseError) as error:
+        status = False
+        msg = str(error)
+        if conn:
+            conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+
+    return status, counts, msg
+
+
 def setQgisProjectOffline(qgis_directory, connection_name_central, feedback):
     # Get uri from connection names
     status_central, uri_central, error_message_central = getUriFromConnectionName(connection_name_central, False)
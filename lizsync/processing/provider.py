@@ -27,7 +27,10 @@ from .algorithms.upgrade_database_structure import UpgradeDatabaseStructure
 from .algorithms.initialize_central_database import InitializeCentralDatabase
 from .algorithms.package_central_database import PackageCentralDatabase
 from .algorithms.deploy_database_server_package import DeployDatabaseServerPackage
+from .algorithms.package_central_database_delta import PackageCentralDatabaseDelta
+from .algorithms.deploy_delta_package import DeployDeltaPackage
 from .algorithms.synchronize_database import SynchronizeDatabase
+from .algorithms.repair_database import RepairDatabase
 from .algorithms.send_projects_and_files_to_clone_ftp import SendProjectsAndFilesToCloneFtp
 from .algorithms.build_mobile_project import BuildMobileProject
 
@@ -40,7 +43,10 @@ class LizsyncProvider(QgsProcessingProvider):
     def loadAlgorithms(self):
         self.addAlgorithm(PackageCentralDatabase())
         self.addAlgorithm(DeployDatabaseServerPackage())
+        self.addAlgorithm(PackageCentralDatabaseDelta())
+        self.addAlgorithm(DeployDeltaPackage())
         self.addAlgorithm(SynchronizeDatabase())
+        self.addAlgorithm(RepairDatabase())
 
         self.addAlgorithm(CreateDatabaseStructure())
         self.addAlgorithm(UpgradeDatabaseStructure())
@@ -1,6 +1,17 @@
-"""Tests for load structure with an empty database."""
+"""Tests for the structure and the functions of the database."""
 
-from .base_test_database import DatabaseTestCase
+import os
+import subprocess
+import tempfile
+
+import psycopg2
+
+from ..processing.algorithms.tools import (
+    export_database_snapshot,
+    filter_package_data,
+    pg_dump,
+)
+from .base_test_database import CentralDatabaseTestCase, DatabaseTestCase
 
 __copyright__ = "Copyright 2019, 3Liz"
 __license__ = "GPL version 3"
@@ -21,10 +32,266 @@ class TestLoadStructureEmptyDatabase(DatabaseTestCase):
         records = self.cursor.fetchall()
         result = [r[0] for r in records]
         expected = [
+            "clone_cursors",
             "history",
             "server_metadata",
             "conflicts",
+            "subscription_filters",
             "synchronized_tables",
             "sys_structure_metadonnee",
         ]
         self.assertCountEqual(expected, result)
+
+
+class TestAreaOfInterest(CentralDatabaseTestCase):
+
+    """Test the selection of the rows of the area of interest of a package,
+    with the tables referencing the kept features and the tables they reference."""
+
+    # Square of 10 meters around the pluviometer 0
+    AREA = (
+        'SRID=2154;POLYGON(('
+        '769440 6281770, 769450 6281770, 769450 6281780, 769440 6281780, 769440 6281770'
+        '))'
+    )
+    TABLES = [
+        '"test"."measures"',
+        '"test"."pluviometers"',
+        '"test"."stations"',
+    ]
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # A spatial table referenced by the pluviometers, with a station outside the area,
+        # and a non spatial table referencing the pluviometers
+        self.central_cursor.execute(
+            """
+            CREATE TABLE test.stations (
+                id serial PRIMARY KEY,
+                uid uuid DEFAULT md5(random()::text || clock_timestamp()::text)::uuid UNIQUE NOT NULL,
+                name text,
+                geom geometry(Point, 2154)
+            );
+            INSERT INTO test.stations (name, geom)
+            VALUES
+                ('near', ST_SetSRID(ST_MakePoint(769446.57, 6281774.14), 2154)),
+                ('far', ST_SetSRID(ST_MakePoint(700000, 6200000), 2154));
+
+            ALTER TABLE test.pluviometers ADD COLUMN station_uid uuid REFERENCES test.stations (uid);
+            UPDATE test.pluviometers
+            SET station_uid = (SELECT uid FROM test.stations WHERE name = 'far')
+            WHERE id = 0;
+
+            CREATE TABLE test.measures (
+                id serial PRIMARY KEY,
+                uid uuid DEFAULT md5(random()::text || clock_timestamp()::text)::uuid UNIQUE NOT NULL,
+                pluviometer_uid uuid REFERENCES test.pluviometers (uid),
+                value real
+            );
+            INSERT INTO test.measures (pluviometer_uid, value)
+            SELECT uid, id
+            FROM test.pluviometers
+            WHERE id IN (0, 1);
+            INSERT INTO test.measures (pluviometer_uid, value)
+            VALUES (NULL, -1);
+            """
+        )
+        self.central_server.commit()
+
+    def test_area_of_interest_condition(self):
+        """Test the condition of the area selects the features intersecting it."""
+        self.central_cursor.execute(
+            "SELECT lizsync.get_area_of_interest_condition('test', 'pluviometers', %s, 't')",
+            (self.AREA, )
+        )
+        condition = self.central_cursor.fetchone()[0]
+        self.assertIn('ST_Intersects(t.geom, ST_Transform(', condition)
+
+        self.central_cursor.execute(
+            "SELECT array_agg(t.id) FROM test.pluviometers AS t WHERE {}".format(condition)
+        )
+        self.assertEqual([0], self.central_cursor.fetchone()[0])
+
+        # No condition for a table without geometry column
+        self.central_cursor.execute(
+            "SELECT lizsync.get_area_of_interest_condition('test', 'measures', %s, 't')",
+            (self.AREA, )
+        )
+        self.assertIsNone(self.central_cursor.fetchone()[0])
+        self.central_server.rollback()
+
+    def test_package_data_queries(self):
+        """Test the rows kept in the area, the rows referencing them and the rows they reference."""
+        self.central_cursor.execute(
+            """
+            SELECT table_name, number_rows, data_query
+            FROM lizsync.get_package_data_queries(%s, %s, NULL)
+            """,
+            (self.TABLES, self.AREA)
+        )
+        queries = {r[0]: (r[1], r[2]) for r in self.central_cursor.fetchall()}
+        self.assertCountEqual(['measures', 'pluviometers', 'stations'], queries.keys())
+
+        kept = {}
+        for table_name, (number_rows, data_query) in queries.items():
+            self.central_cursor.execute("SELECT q.id FROM ({}) AS q".format(data_query))
+            kept[table_name] = [r[0] for r in self.central_cursor.fetchall()]
+            self.assertEqual(number_rows, len(kept[table_name]))
+
+        # The pluviometer of the area
+        self.assertEqual([0], kept['pluviometers'])
+
+        # Its measure, and the measure which does not reference any pluviometer
+        self.central_cursor.execute(
+            "SELECT array_agg(id ORDER BY id) FROM test.measures WHERE value IN (0, -1)"
+        )
+        self.assertCountEqual(self.central_cursor.fetchone()[0], kept['measures'])
+
+        # The station of the area, and the station outside the area referenced by the pluviometer
+        self.central_cursor.execute(
+            """
+            SELECT s.name, k.from_area
+            FROM temp_area_of_interest AS k
+            INNER JOIN test.stations AS s
+                ON s.uid = k.uid
+            ORDER BY s.name
+            """
+        )
+        self.assertEqual([('far', False), ('near', True)], self.central_cursor.fetchall())
+        self.assertEqual(2, len(kept['stations']))
+        self.central_server.rollback()
+
+        # Without area nor columns, the tables are sent entirely
+        self.central_cursor.execute(
+            "SELECT count(*) FROM lizsync.get_package_data_queries(%s, NULL, NULL)",
+            (self.TABLES, )
+        )
+        self.assertEqual(0, self.central_cursor.fetchone()[0])
+        self.central_server.rollback()
+
+    def test_subscription_area_rows(self):
+        """Test the rows of the area of a clone are the ones of its package."""
+        self.central_cursor.execute(
+            """
+            INSERT INTO lizsync.subscription_filters (server_id, table_schema, table_name, area)
+            SELECT md5('clone')::uuid, (parse_ident(t))[1], (parse_ident(t))[2], %s
+            FROM unnest(%s::text[]) AS t
+            """,
+            (self.AREA, self.TABLES)
+        )
+        self.central_cursor.execute(
+            """
+            SELECT r.table_name, array_agg(k.uid::text)
+            FROM lizsync.fill_subscription_area(md5('clone')::uuid) AS r
+            INNER JOIN temp_subscription_area AS k
+                ON k.ident = format('%I.%I', r.table_schema, r.table_name)
+            GROUP BY r.table_name
+            """
+        )
+        uids = {r[0]: r[1] for r in self.central_cursor.fetchall()}
+
+        self.central_cursor.execute(
+            """
+            SELECT t.table_name, array_agg(t.uid::text)
+            FROM (
+                SELECT 'pluviometers' AS table_name, uid FROM test.pluviometers WHERE id = 0
+                UNION ALL
+                SELECT 'measures', uid FROM test.measures WHERE value IN (0, -1)
+                UNION ALL
+                SELECT 'stations', uid FROM test.stations
+            ) AS t
+            GROUP BY t.table_name
+            """
+        )
+        expected = {r[0]: r[1] for r in self.central_cursor.fetchall()}
+        self.assertCountEqual(expected.keys(), uids.keys())
+        for table_name, table_uids in expected.items():
+            self.assertCountEqual(table_uids, uids[table_name])
+        self.central_server.rollback()
+
+    def test_filter_package_data(self):
+        """Test the data files dumped by pg_dump are replaced by the rows of the area."""
+        data_dir = os.path.join(tempfile.mkdtemp(), '02_data')
+        snapshot_connection, snapshot, message = export_database_snapshot('test')
+        self.assertIsNotNone(snapshot, message)
+
+        status, messages = pg_dump(
+            self.feedback, '/usr/bin/', 'test', data_dir, ['test'], self.TABLES,
+            ['--snapshot={0}'.format(snapshot)], 'd'
+        )
+        self.assertTrue(status, messages)
+
+        counts = filter_package_data(
+            snapshot_connection, '/usr/bin/', data_dir, self.TABLES, self.AREA,
+            {'"test"."pluviometers"': ['nom']}
+        )
+        snapshot_connection.commit()
+        snapshot_connection.close()
+        counts = {c[1]: (c[2], c[3]) for c in counts}
+        self.assertEqual(2, counts['measures'][0])
+        self.assertEqual(1, counts['pluviometers'][0])
+        self.assertEqual(2, counts['stations'][0])
+        self.assertIn('photo', counts['pluviometers'][1])
+
+        # The data files read by pg_restore only contain the kept rows
+        for table_name, number_rows in (('measures', 2), ('pluviometers', 1), ('stations', 2)):
+            output = subprocess.run(
+                ['/usr/bin/pg_restore', '-f', '-', '-a', '-n', 'test', '-t', table_name, data_dir],
+                stdout=subprocess.PIPE, check=True
+            ).stdout.decode('utf-8')
+            header, data = output.split(' FROM stdin;\n', 1)
+            lines = data.split('\\.\n', 1)[0].splitlines()
+            self.assertEqual(number_rows, len(lines), output)
+
+            # The columns not sent to the clone are empty
+            if table_name == 'pluviometers':
+                columns = header.rsplit('(', 1)[1].rstrip(')').split(', ')
+                values = dict(zip(columns, lines[0].split('\t')))
+                self.assertEqual('\\N', values['photo'])
+                self.assertEqual('pluvio0', values['nom'])
+
+
+class TestSubscriptionFilters(CentralDatabaseTestCase):
+
+    """Test the subscription filters are consistent with the audit logs of the tables."""
+
+    def test_attribute_filter_of_compact_audit_logs(self):
+        """Test the attribute filters are refused on the tables with compact audit logs."""
+        self.central_cursor.execute(
+            "SELECT audit.audit_table('test.pluviometers'::regclass, True, True, NULL, 'row', ARRAY['uid'])"
+        )
+        self.central_cursor.execute("SELECT lizsync.get_audit_compact_columns('test.pluviometers'::regclass)")
+        self.assertCountEqual(['ogc_fid', 'uid'], self.central_cursor.fetchone()[0])
+
+        with self.assertRaises(psycopg2.Error) as context:
+            self.central_cursor.execute(
+                """
+                INSERT INTO lizsync.subscription_filters (server_id, table_schema, table_name, attribute_filter)
+                VALUES (md5('clone')::uuid, 'test', 'pluviometers', 'id < 5')
+                """
+            )
+        self.assertIn('compact audit logs', str(context.exception))
+        self.central_server.rollback()
+
+        # The area filters only need the uid of the rows
+        self.central_cursor.execute(
+            """
+            INSERT INTO lizsync.subscription_filters (server_id, table_schema, table_name, area)
+            VALUES (md5('clone')::uuid, 'test', 'pluviometers', 'SRID=2154;POINT(769445 6281775)')
+            """
+        )
+
+        # The logs of a table with an attribute filter cannot become compact
+        self.central_cursor.execute(
+            """
+            INSERT INTO lizsync.subscription_filters (server_id, table_schema, table_name, attribute_filter)
+            VALUES (md5('clone')::uuid, 'test', 'montpellier_districts', 'quartmno IS NOT NULL')
+            """
+        )
+        with self.assertRaises(psycopg2.Error) as context:
+            self.central_cursor.execute(
+                "SELECT audit.audit_table('test.montpellier_districts'::regclass, True, True, NULL, 'row', ARRAY['uid'])"
+            )
+        self.assertIn('cannot be compact', str(context.exception))
+        self.central_server.rollback()
@@ -0,0 +1,124 @@
+"""Tests for the access paths of the synchronization queries."""
+
+from ..processing.algorithms.tools import get_newer_synchronization_sql
+from .base_test_database import SyncDatabaseTestCase
+
+__copyright__ = "Copyright 2020, 3Liz"
+__license__ = "GPL version 3"
+__email__ = "info@3liz.org"
+__revision__ = "$Format:%H$"
+
+
+class TestDatabaseIndexes(SyncDatabaseTestCase):
+
+    """Check with EXPLAIN that the queries run against the central database
+    are served by an index.
+
+    The queries are the ones built by the synchronization functions, read from
+    their debug messages, and the central tables are filled with enough rows
+    for the planner to prefer an index over a sequential scan."""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # Central audit logs already replayed by the clone A
+        self.central_cursor.execute(
+            """
+            DO $$
+            BEGIN
+                FOR i IN 1..700 LOOP
+                    UPDATE test.pluviometers SET nom = concat('pluviometer ', id, ' #', i);
+                END LOOP;
+            END
+            $$;
+            """
+        )
+        self.central_server.commit()
+        self.clone_a_cursor.execute("SELECT * FROM lizsync.synchronize()")
+        self.clone_a_server.commit()
+
+        # New central audit logs, and the history of the synchronizations of other clones
+        self.central_cursor.execute(
+            """
+            UPDATE test.pluviometers SET nom = 'pluviometer' WHERE id = 1;
+            INSERT INTO lizsync.history (sync_time, server_from, server_to, sync_type, sync_status)
+            SELECT
+                now() - (i || ' minutes')::interval,
+                CASE
+                    WHEN i % 2 = 0 THEN (SELECT server_id::text FROM lizsync.server_metadata LIMIT 1)
+                    ELSE md5((i % 20)::text)::uuid::text
+                END,
+                ARRAY[md5((i % 20)::text)::uuid::text],
+                'partial', 'done'
+            FROM generate_series(1, 20000) AS i;
+            ANALYZE audit.logged_actions;
+            ANALYZE lizsync.history;
+            """
+        )
+        self.central_server.commit()
+
+    def built_query(self, server, cursor, sql):
+        """Return the central query built by the given function call in the clone."""
+        del server.notices[:]
+        cursor.execute("SET client_min_messages = debug1")
+        cursor.execute(sql)
+        server.rollback()
+
+        queries = [
+            n.split('DEBUG:', 1)[1].strip()
+            for n in server.notices
+            if n.startswith('DEBUG:') and 'audit.logged_actions' in n
+        ]
+        self.assertEqual(1, len(queries), server.notices)
+        return queries[0]
+
+    def index_names(self, sql):
+        """Return the names of the indexes used by the plan of the given query in the central database."""
+        self.central_cursor.execute("EXPLAIN (FORMAT JSON) " + sql.rstrip().rstrip(';'))
+        plan = self.central_cursor.fetchone()[0]
+        self.central_server.rollback()
+
+        names = []
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if "Index Name" in node:
+                names.append(node["Index Name"])
+            nodes.extend(node.get("Plans", []))
+        return names
+
+    def test_central_audit_logs_use_event_id_index(self):
+        """Test the central audit logs are fetched by an event id range."""
+        sql = self.built_query(
+            self.clone_a_server, self.clone_a_cursor,
+            "SELECT count(*) FROM lizsync.get_central_audit_logs('uid', NULL, NULL)"
+        )
+        names = self.index_names(sql)
+        self.assertIn("logged_actions_pkey", names)
+        self.assertIn("clone_cursors_pkey", names)
+        self.assertIn("synchronized_tables_pkey", names)
+
+    def test_clone_cursor_uses_event_id_index(self):
+        """Test the next central logs of a chunk are fetched by an event id range."""
+        sql = self.built_query(
+            self.clone_a_server, self.clone_a_cursor,
+            "SELECT * FROM lizsync.get_clone_cursor(100)"
+        )
+        names = self.index_names(sql)
+        self.assertIn("logged_actions_pkey", names)
+        self.assertIn("clone_cursors_pkey", names)
+
+    def test_newer_synchronization_check_uses_history_index(self):
+        """Test the check made before deploying a package uses the history index."""
+        self.central_cursor.execute(
+            "SELECT sync_id FROM lizsync.history WHERE sync_type = 'full' ORDER BY sync_time DESC LIMIT 1"
+        )
+        sync_id = self.central_cursor.fetchone()[0]
+        self.clone_a_cursor.execute("SELECT server_id FROM lizsync.server_metadata LIMIT 1")
+        clone_id = self.clone_a_cursor.fetchone()[0]
+        self.central_server.rollback()
+        self.clone_a_server.rollback()
+
+        names = self.index_names(get_newer_synchronization_sql(sync_id, clone_id))
+        self.assertIn("history_pkey", names)
+        self.assertIn("history_server_from_sync_time_idx", names)
@@ -133,9 +133,11 @@ class TestProcessing(unittest.TestCase):
         records = self.cursor.fetchall()
         result = [r[0] for r in records]
         expected = [
+            "clone_cursors",
             "history",
             "server_metadata",
             "conflicts",
+            "subscription_filters",
             "synchronized_tables",
             "sys_structure_metadonnee",
         ]
@@ -186,9 +188,11 @@ class TestProcessing(unittest.TestCase):
         records = self.cursor.fetchall()
         result = [r[0] for r in records]
         expected = [
+            "clone_cursors",
             "history",
             "server_metadata",
             "conflicts",
+            "subscription_filters",
             "synchronized_tables",
             "sys_structure_metadonnee",
         ]
@@ -0,0 +1,108 @@
+"""Tests for the SQL script reader used to load the packages."""
+
+from qgis.testing import unittest
+
+from ..processing.algorithms.tools import (
+    CopyDataReader,
+    run_sql_script_lines,
+)
+
+__copyright__ = "Copyright 2020, 3Liz"
+__license__ = "GPL version 3"
+__email__ = "info@3liz.org"
+__revision__ = "$Format:%H$"
+
+
+class FakeCursor:
+
+    """Cursor keeping the queries and the COPY data it receives."""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql):
+        self.calls.append(('execute', sql))
+
+    def copy_expert(self, sql, file):
+        data = b''
+        chunk = file.read(4)
+        while chunk:
+            data += chunk
+            chunk = file.read(4)
+        self.calls.append(('copy', sql, data))
+
+
+class TestRunSqlScriptLines(unittest.TestCase):
+
+    """Test the SQL scripts of pg_dump and pg_restore are run line by line in one transaction."""
+
+    def test_begin_and_commit_of_the_script_are_ignored(self):
+        """Test the BEGIN and COMMIT surrounding the script are not run."""
+        cursor = FakeCursor()
+        lines = [
+            b'BEGIN;\n',
+            b'CREATE TABLE t (a integer);\n',
+            b'\n',
+            b'COMMIT;\n',
+        ]
+        run_sql_script_lines(cursor, iter(lines))
+        self.assertEqual([('execute', b'CREATE TABLE t (a integer);\n\n')], cursor.calls)
+
+    def test_commit_in_the_script_is_kept(self):
+        """Test a COMMIT followed by other statements is run."""
+        cursor = FakeCursor()
+        lines = [
+            b'SELECT 1;\n',
+            b'COMMIT;\n',
+            b'SELECT 2;\n',
+        ]
+        run_sql_script_lines(cursor, iter(lines))
+        self.assertEqual([('execute', b'SELECT 1;\nCOMMIT;\nSELECT 2;\n')], cursor.calls)
+
+    def test_psql_meta_commands_are_ignored(self):
+        """Test the \\connect meta-command of pg_dump is not run."""
+        cursor = FakeCursor()
+        lines = [
+            b'\\connect test\n',
+            b'SELECT 1;\n',
+            b'\\unrestrict abc\n',
+        ]
+        run_sql_script_lines(cursor, iter(lines))
+        self.assertEqual([('execute', b'SELECT 1;\n')], cursor.calls)
+
+    def test_inline_copy_data(self):
+        """Test the COPY data given inline are loaded, and the script goes on after them."""
+        cursor = FakeCursor()
+        lines = [
+            b'SET client_encoding = \'UTF8\';\n',
+            b'-- Data\n',
+            b'COPY test.t (a, b) FROM stdin;\n',
+            b'1\tone\n',
+            b'2\ttwo\n',
+            b'\\.\n',
+            b'\n',
+            b'SELECT 2;\n',
+        ]
+        size = run_sql_script_lines(cursor, iter(lines))
+        self.assertEqual(
+            [
+                ('execute', b'SET client_encoding = \'UTF8\';\n-- Data\n'),
+                ('copy', 'COPY test.t (a, b) FROM stdin;', b'1\tone\n2\ttwo\n'),
+                ('execute', b'\nSELECT 2;\n'),
+            ],
+            cursor.calls
+        )
+        self.assertEqual(sum(len(line) for line in lines), size)
+
+    def test_copy_data_reader_stops_at_end_of_data(self):
+        """Test the COPY data reader does not read the lines after the end of data marker."""
+        lines = iter([
+            b'1\tone\n',
+            b'\\.\r\n',
+            b'SELECT 1;\n',
+        ])
+        reader = CopyDataReader(lines)
+        self.assertEqual(b'1\to', reader.read(3))
+        self.assertEqual(b'ne\n', reader.read())
+        self.assertEqual(b'', reader.read(3))
+        self.assertEqual(b'SELECT 1;\n', next(lines))